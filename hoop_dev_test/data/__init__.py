@@ -1,3 +1,4 @@
 """
 The data app holds only the business objects for our service - see models.py
-"""
\ No newline at end of file
+"""
+default_app_config = 'hoop_dev_test.data.apps.DataConfig'
\ No newline at end of file
@@ -0,0 +1,27 @@
+from django.apps import AppConfig
+from django.core.signals import request_finished, request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+
+
+class DataConfig(AppConfig):
+    name = 'hoop_dev_test.data'
+    label = 'data'
+
+    def ready(self):
+        """
+        Keep the name caches in step with locations and categories, tell the
+        broadcaster about writes, and look after database connections.
+        """
+        from hoop_dev_test.data import broadcast, bulk, connections, names
+        from hoop_dev_test.data.models import Event, Location, Category
+        for model in Location, Category:
+            post_save.connect(names.invalidate_on_change, sender=model)
+            post_delete.connect(names.invalidate_on_change, sender=model)
+        for model in Event, Location, Category:
+            post_save.connect(broadcast.notify, sender=model)
+            post_delete.connect(broadcast.notify, sender=model)
+        bulk.ingested.connect(broadcast.notify)
+        request_started.connect(connections.check_health)
+        request_finished.connect(connections.mark_idle)
+        connection_created.connect(connections.tune_sqlite)
@@ -0,0 +1,71 @@
+"""
+Postgres, with a pool of connections shared by every thread (or greenlet) in
+the process. To use it, set a database's ENGINE to this package:
+
+    'hoop_dev_test.data.backends.pooled_postgresql'
+
+and its POOL_SIZE to the most connections the process should open.
+
+When Django closes a connection it goes back to the pool (reset, so that no
+session state leaks from one request into the next) rather than being closed,
+and the next connection Django opens is taken from the pool - so a request
+doesn't wait for Postgres to start a new backend. If all of them are in use,
+the request waits for one to be returned, which also stops a process with
+many greenlets (see hoop_dev_test/green.py) opening more connections than the
+database allows - for up to POOL_TIMEOUT seconds, after which it fails with an
+OperationalError rather than tie up the worker. With CONN_HEALTH_CHECKS, a
+connection which has sat in the pool for a while is checked before it's handed
+out (see pool.py and hoop_dev_test/data/connections.py).
+
+The pool replaces CONN_MAX_AGE - with it, connections can go back to the pool
+at the end of every request (CONN_MAX_AGE = 0).
+"""
+from threading import Lock
+
+from django.db.backends.postgresql_psycopg2 import base
+from django.db.backends.postgresql_psycopg2.base import Database
+
+from hoop_dev_test.data.connections import health_check_after
+from .pool import ConnectionPool, DEFAULT_TIMEOUT
+
+DEFAULT_POOL_SIZE = 10
+
+_pools = {}
+_pools_lock = Lock()
+
+
+def _pool(settings_dict, params):
+    """ The pool for `params`, made according to `settings_dict` """
+    key = repr(sorted(params.items()))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                settings_dict.get('POOL_SIZE', DEFAULT_POOL_SIZE),
+                lambda: Database.connect(**params), Database.Error,
+                settings_dict.get('POOL_TIMEOUT', DEFAULT_TIMEOUT),
+                health_check_after(settings_dict))
+        return _pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        self.pool = _pool(self.settings_dict, conn_params)
+        connection = self.pool.get()
+
+        # As for a new connection (see the superclass) - the pool has reset it
+        # to the database's default isolation level, so set ours if need be.
+        try:
+            self.isolation_level = self.settings_dict['OPTIONS'][
+                'isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.put(self.connection)
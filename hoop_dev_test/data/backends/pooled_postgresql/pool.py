@@ -0,0 +1,101 @@
+"""
+The pool itself, which knows nothing of Postgres beyond the DB-API - it's
+given a function to make connections with, and the DB-API's Error class.
+"""
+from threading import Condition, Lock
+from time import time
+
+from django.db import OperationalError
+
+DEFAULT_TIMEOUT = 10
+
+
+class ConnectionPool(object):
+    """
+    Up to `size` connections made with `connect()`. Waiting for one gives up
+    after `timeout` seconds, and idle connections are checked before they're
+    used again if they've been idle for more than `check_after` seconds
+    (None never checks them).
+    """
+
+    def __init__(self, size, connect, error, timeout=DEFAULT_TIMEOUT,
+                 check_after=None):
+        self.size = size
+        self.connect = connect
+        self.error = error
+        self.timeout = timeout
+        self.check_after = check_after
+        self._idle = []  # (connection, when it was given back)
+        self._in_use = 0
+        self._returned = Condition(Lock())
+
+    def get(self):
+        """
+        An idle connection, or a new one - waiting for one to be given back
+        if they're all in use, and raising OperationalError if none is.
+        """
+        deadline = time() + self.timeout
+        with self._returned:
+            while self._in_use >= self.size:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    raise OperationalError(
+                        "All {0} pooled connections are in use".format(
+                            self.size))
+                self._returned.wait(remaining)
+            self._in_use += 1
+        try:
+            while True:
+                with self._returned:
+                    if not self._idle:
+                        break
+                    connection, since = self._idle.pop()
+                if self._usable(connection, since):
+                    return connection
+            return self.connect()
+        except Exception:
+            self._release()
+            raise
+
+    def put(self, connection):
+        """ Give back a connection from `get` """
+        try:
+            if not connection.closed:
+                connection.reset()  # Rolls back, and RESETs session settings
+                with self._returned:
+                    self._idle.append((connection, time()))
+        except self.error:  # It's no good to anyone now
+            self._discard(connection)
+        finally:
+            self._release()
+
+    def _usable(self, connection, since):
+        """
+        Whether an idle `connection` still works - it can die while it sits
+        there (if the database is restarted, say), but checking costs a round
+        trip, so only those which have been idle for a while are checked.
+        """
+        if connection.closed:
+            return False
+        if self.check_after is None or time() - since < self.check_after:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            connection.rollback()
+            return True
+        except self.error:
+            self._discard(connection)
+            return False
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except self.error:  # It's already as closed as it'll get
+            pass
+
+    def _release(self):
+        with self._returned:
+            self._in_use -= 1
+            self._returned.notify()
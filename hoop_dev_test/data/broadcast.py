@@ -0,0 +1,217 @@
+"""
+Telling whoever is listening (see `EntryViewSet.stream`) about changes to
+events as they happen, rather than leaving them to poll for them.
+
+Each process has one `Broadcaster`, which reads new changes from the change log
+(see changes.py) - once, however many are listening - and hands them to every
+`Subscription`. A subscription buffers at most EVENT_BROADCAST_BUFFER changes:
+one which falls further behind than that (a slow client, say) is dropped and
+its buffer emptied, rather than being allowed to grow, and it's left to catch
+up from the change log itself - which is why only the changes' tokens, actions
+and event ids are passed around.
+
+The broadcaster reads the log when EVENT_BROADCAST_BACKEND says there might be
+something new:
+
+ - `MemoryBackend` is woken by this process's own writes (see apps.py), and
+   otherwise looks every EVENT_BROADCAST_POLL seconds, to catch anyone else's
+   - fine for SQLite, where there's only one machine writing anyway.
+ - `PostgresBackend` LISTENs for the NOTIFY which the change log's triggers
+   send when changes are committed, by whichever process.
+"""
+import logging
+import select
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connection, connections, DatabaseError
+from django.utils.module_loading import import_string
+
+from hoop_dev_test.data import changes
+
+logger = logging.getLogger(__name__)
+
+
+def _poll_interval():
+    return getattr(settings, 'EVENT_BROADCAST_POLL', 1.0)
+
+
+class MemoryBackend(object):
+    """ Woken up by `notify`, or else after a while """
+
+    def __init__(self):
+        self._woken = threading.Event()
+
+    def notify(self, **kwargs):
+        """ Something has changed - this doubles as a signal receiver """
+        self._woken.set()
+
+    def wait(self):
+        self._woken.wait(_poll_interval())
+        self._woken.clear()
+
+
+class PostgresBackend(object):
+    """
+    Woken up by Postgres NOTIFYing changes.CHANNEL - on a connection of its
+    own, as it sits LISTENing for as long as the process runs.
+    """
+
+    def __init__(self):
+        self._connection = None
+
+    def notify(self, **kwargs):
+        pass  # The triggers do this, once the changes are committed
+
+    def _listen(self):
+        from django.db.backends.postgresql_psycopg2.base import Database
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+        listener = Database.connect(
+            **connections['default'].get_connection_params())
+        listener.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        listener.cursor().execute('LISTEN ' + changes.CHANNEL)
+        return listener
+
+    def wait(self):
+        from django.db.backends.postgresql_psycopg2.base import Database
+        try:
+            if self._connection is None:
+                self._connection = self._listen()
+            readable, _, _ = select.select([self._connection], [], [],
+                                           _poll_interval())
+            if readable:
+                self._connection.poll()
+                del self._connection.notifies[:]
+        except (Database.Error, select.error):
+            logger.exception("Lost the connection listening for changes")
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            time.sleep(_poll_interval())  # Before trying again
+
+
+class Subscription(object):
+    """ Someone's buffer of changes, from the `Broadcaster` """
+
+    def __init__(self, size):
+        self.size = size
+        self.dropped = False
+        self._changes = deque()
+        self._ready = threading.Condition()
+
+    def put(self, batch):
+        with self._ready:
+            if self.dropped:
+                return
+            if len(self._changes) + len(batch) > self.size:
+                self._changes.clear()
+                self.dropped = True
+            else:
+                self._changes.extend(batch)
+            self._ready.notify()
+
+    def get(self, timeout):
+        """
+        Everything in the buffer, waiting up to `timeout` seconds for something
+        to arrive if it's empty - or None if this has been dropped.
+        """
+        with self._ready:
+            if not self._changes and not self.dropped:
+                self._ready.wait(timeout)
+            if self.dropped:
+                return None
+            batch = list(self._changes)
+            self._changes.clear()
+            return batch
+
+
+class Broadcaster(object):
+    """
+    Reads new changes from the log and passes them - as (token, action,
+    event_id) - to every subscription. `subscribe` starts a thread to do so,
+    if `threaded`; otherwise `poll` has to be called.
+    """
+    batch_size = 500
+
+    def __init__(self, backend, buffer_size, threaded=True):
+        self.backend = backend
+        self.buffer_size = buffer_size
+        self.threaded = threaded
+        self.token = None  # The last change we've passed on
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self):
+        subscription = Subscription(self.buffer_size)
+        with self._lock:
+            if self.token is None:  # Pass on everything from now on
+                self.token = changes.latest()
+            self._subscriptions.add(subscription)
+            if self.threaded and self._thread is None:
+                self._thread = threading.Thread(target=self.run,
+                                                name='event broadcaster')
+                self._thread.daemon = True
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def run(self):
+        while True:
+            self.backend.wait()
+            try:
+                self.poll()
+            except DatabaseError:
+                logger.exception("Couldn't read the change log")
+                connection.close()
+
+    def poll(self):
+        """ Pass on any changes since the last time """
+        with self._lock:
+            if not self._subscriptions:
+                self.token = None  # Nobody needs what happens meanwhile
+                return
+            token = self.token
+        while True:
+            batch = changes.after(token, self.batch_size)
+            if not batch:
+                return
+            # Whoever subscribed before I read the batch needs it - anyone
+            # subscribing later reads it from the log themselves.
+            with self._lock:
+                for subscription in self._subscriptions:
+                    subscription.put(batch)
+                token = batch[-1][0]
+                if self.token is not None:
+                    self.token = token
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def broadcaster():
+    """ This process's Broadcaster, using EVENT_BROADCAST_BACKEND """
+    global _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            backend = import_string(getattr(
+                settings, 'EVENT_BROADCAST_BACKEND',
+                'hoop_dev_test.data.broadcast.MemoryBackend'))()
+            _broadcaster = Broadcaster(
+                backend, getattr(settings, 'EVENT_BROADCAST_BUFFER', 1000))
+        return _broadcaster
+
+
+def notify(**kwargs):
+    """
+    Connected to signals of writes - wakes the broadcaster, if anyone has
+    subscribed yet.
+    """
+    if _broadcaster is not None:
+        _broadcaster.backend.notify()
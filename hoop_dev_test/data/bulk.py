@@ -0,0 +1,157 @@
+"""
+Loading events one at a time costs a few queries each - looking up (or
+creating) the location and category, then inserting the event - which adds up
+to hours for a feed of tens of thousands of events.
+
+`ingest` instead works through the events a batch at a time: the locations and
+categories named by a batch are looked up with one query per model, any which
+are missing are created together, and the events are inserted with a single
+bulk INSERT. The whole import happens in one transaction; rows which can't be
+imported are reported back rather than stopping the import.
+
+Bulk inserts don't send post_save, so once an import has created anything it
+sends `ingested` instead - whatever keeps copies of the events (the response
+cache, the broadcaster) listens for that, whoever did the import.
+"""
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.dispatch import Signal
+from django.utils import six
+
+from hoop_dev_test.data.models import Event, Location, Category, normalize
+
+DEFAULT_BATCH_SIZE = 500
+# Each batch looks its event, location and category names up with a single
+# IN, and SQLite won't take more than 999 parameters in a query
+MAX_BATCH_SIZE = 900
+
+ingested = Signal(providing_args=['result'])
+
+
+class NameResolver(object):
+    """
+    Maps names to ids for Location or Category, remembering what it has seen
+    so that each name is only looked up once per import.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = {}
+
+    def _fetch(self, names):
+        return self.model.objects.filter(name__in=names).values_list('name',
+                                                                     'id')
+
+    def resolve(self, names):
+        """ Make sure every one of `names` exists, and that we know its id """
+        missing = set(names).difference(self.ids)
+        if not missing:
+            return
+        self.ids.update(self._fetch(missing))
+        missing.difference_update(self.ids)
+        if not missing:
+            return
+        try:
+            with transaction.atomic():
+                self._create(missing)
+        except IntegrityError:
+            # Another import created some of them since we looked - whatever
+            # is still missing afterwards really is.
+            self.ids.update(self._fetch(missing))
+            missing.difference_update(self.ids)
+            self._create(missing)
+        self.ids.update(self._fetch(missing))
+
+    def _create(self, names):
+        self.model.objects.bulk_create([
+            self.model(name=name, normalized_name=normalize(name))
+            for name in names])
+
+    def __getitem__(self, name):
+        return self.ids[name]
+
+
+class IngestResult(object):
+    """ How many events an import created, and what was wrong with the rest """
+
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def error(self, row, message):
+        """ `row` counts from 0, ignoring any blank lines """
+        self.errors.append({'row': row, 'error': message})
+
+    @property
+    def to_dict(self):
+        return {'created': self.created, 'errors': self.errors}
+
+
+def _validate(row):
+    """ Return an error message for `row`, or None if it looks like an event """
+    if not isinstance(row, dict):
+        return "Expected a JSON object"
+    for field in 'name', 'location', 'category':
+        value = row.get(field, None)
+        if not isinstance(value, six.string_types) or not value.strip():
+            return "'{0}' must be a non-empty string".format(field)
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _ingest_batch(batch, locations, categories, seen, result):
+    rows = []
+    for i, row in batch:
+        error = _validate(row)
+        if error is None and row['name'] in seen:
+            error = "Duplicate event name"
+        if error is not None:
+            result.error(i, error)
+            continue
+        seen.add(row['name'])
+        rows.append((i, row))
+
+    names = [row['name'] for _, row in rows]
+    existing = set(Event.objects.filter(name__in=names).values_list('name',
+                                                                    flat=True))
+    events = []
+    for i, row in rows:
+        if row['name'] in existing:
+            result.error(i, "An event with this name already exists")
+        else:
+            events.append(row)
+
+    locations.resolve(row['location'] for row in events)
+    categories.resolve(row['category'] for row in events)
+    Event.objects.bulk_create([Event(name=row['name'],
+                                     location_id=locations[row['location']],
+                                     category_id=categories[row['category']])
+                               for row in events])
+    result.created += len(events)
+
+
+def ingest(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Create an event for each dict in `rows` (with 'name', 'location' and
+    'category', as you'd POST to the event list), `batch_size` (at most
+    MAX_BATCH_SIZE) at a time.
+    """
+    batch_size = min(batch_size, MAX_BATCH_SIZE)
+    result = IngestResult()
+    locations, categories = NameResolver(Location), NameResolver(Category)
+    seen = set()
+    with transaction.atomic():
+        for batch in _batches(enumerate(rows), batch_size):
+            _ingest_batch(batch, locations, categories, seen, result)
+    result.errors.sort(key=lambda error: error['row'])
+    if result.created:
+        ingested.send(sender=Event, result=result)
+    return result
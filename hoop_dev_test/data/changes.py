@@ -0,0 +1,164 @@
+"""
+A log of every change to events, so that anything keeping its own copy of the
+catalogue (a search index, say) can catch up by reading what has changed since
+it last looked rather than reading everything again.
+
+Each insert, update or delete of an event adds an EventChange to
+`data_eventchange` - as with the counts, this is done by triggers, so bulk
+inserts and QuerySet.update() are logged too. How an event looks includes its
+location's and category's names, so renaming one of those logs an update of
+each of its events. Rows are only ever added, and the id of each is its token.
+
+Tokens only help if a change with a smaller token can't turn up after one with
+a larger token has been read. On Postgres ids are handed out as rows are
+inserted, but the rows only become visible once their transactions commit,
+which needn't happen in the same order - so the triggers are deferred until
+commit, and first take an advisory lock which is held until the commit is
+done. Transactions which change events only take turns for that last moment,
+while they write their changes to the log, rather than for as long as they
+run. (It does mean a transaction can't see its own changes in the log before
+it commits.) SQLite only ever has one writer anyway.
+
+On Postgres the triggers also NOTIFY `CHANNEL` - which is only delivered once
+the changes are committed - so that anything waiting for changes (see
+broadcast.py) hears about them straight away.
+
+As for counts.py, migrations rebuilding `data_event`, `data_location` or
+`data_category` should run UNINSTALL first and INSTALL afterwards.
+"""
+from hoop_dev_test.data import sql
+from hoop_dev_test.data.models import Event, EventChange
+
+CHANNEL = 'data_eventchange'
+
+
+def _log(event_id, action):
+    return ("INSERT INTO data_eventchange (event_id, action) "
+            "VALUES ({0}, '{1}');".format(event_id, action))
+
+
+def _log_events(table, row):
+    """ Log an update of every event in the location or category `row` """
+    column = table.replace('data_', '') + '_id'
+    return ("INSERT INTO data_eventchange (event_id, action) "
+            "SELECT id, '{0}' FROM data_event WHERE {1} = {2}.id "
+            "ORDER BY id;".format(EventChange.UPDATED, column, row))
+
+
+_EVENT_CHANGED = ' OR '.join(
+    'old.{0} IS {1} new.{0}'.format(column, '{0}')
+    for column in ('name', 'location_id', 'category_id'))
+
+_TABLES = ('data_location', 'data_category')
+
+INSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS data_event_change_insert",
+        "CREATE TRIGGER data_event_change_insert AFTER INSERT ON data_event "
+        "BEGIN {0} END".format(_log('new.id', EventChange.CREATED)),
+        "DROP TRIGGER IF EXISTS data_event_change_delete",
+        "CREATE TRIGGER data_event_change_delete AFTER DELETE ON data_event "
+        "BEGIN {0} END".format(_log('old.id', EventChange.DELETED)),
+        "DROP TRIGGER IF EXISTS data_event_change_update",
+        "CREATE TRIGGER data_event_change_update AFTER UPDATE ON data_event "
+        "WHEN {0} BEGIN {1} END".format(_EVENT_CHANGED.format('NOT'),
+                                        _log('new.id', EventChange.UPDATED)),
+    ] + [
+        statement for table in _TABLES for statement in (
+            "DROP TRIGGER IF EXISTS {0}_change_rename".format(table),
+            "CREATE TRIGGER {0}_change_rename AFTER UPDATE OF name ON {0} "
+            "WHEN old.name IS NOT new.name BEGIN {1} END".format(
+                table, _log_events(table, 'new')))
+    ],
+    'postgresql': [
+        "CREATE OR REPLACE FUNCTION data_event_change() RETURNS trigger AS $$ "
+        "BEGIN "
+        "PERFORM pg_advisory_xact_lock(hashtext('data_eventchange')); "
+        "PERFORM pg_notify('{4}', ''); "
+        "IF TG_OP = 'INSERT' THEN {0} "
+        "ELSIF TG_OP = 'DELETE' THEN {1} "
+        "ELSIF {2} THEN {3} "
+        "END IF; "
+        "RETURN NULL; "
+        "END $$ LANGUAGE plpgsql".format(
+            _log('NEW.id', EventChange.CREATED),
+            _log('OLD.id', EventChange.DELETED),
+            _EVENT_CHANGED.format('DISTINCT FROM'),
+            _log('NEW.id', EventChange.UPDATED), CHANNEL),
+        "DROP TRIGGER IF EXISTS data_event_change ON data_event",
+        "CREATE CONSTRAINT TRIGGER data_event_change "
+        "AFTER INSERT OR DELETE OR UPDATE ON data_event "
+        "DEFERRABLE INITIALLY DEFERRED "
+        "FOR EACH ROW EXECUTE PROCEDURE data_event_change()",
+    ] + [
+        statement for table in _TABLES for statement in (
+            "CREATE OR REPLACE FUNCTION {0}_change() RETURNS trigger AS $$ "
+            "BEGIN "
+            "IF NEW.name IS DISTINCT FROM OLD.name THEN "
+            "PERFORM pg_advisory_xact_lock(hashtext('data_eventchange')); "
+            "PERFORM pg_notify('{2}', ''); "
+            "{1} "
+            "END IF; "
+            "RETURN NULL; "
+            "END $$ LANGUAGE plpgsql".format(table, _log_events(table, 'NEW'),
+                                             CHANNEL),
+            "DROP TRIGGER IF EXISTS {0}_change ON {0}".format(table),
+            "CREATE CONSTRAINT TRIGGER {0}_change "
+            "AFTER UPDATE OF name ON {0} DEFERRABLE INITIALLY DEFERRED "
+            "FOR EACH ROW EXECUTE PROCEDURE {0}_change()".format(table))
+    ],
+}
+
+UNINSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS data_event_change_insert",
+        "DROP TRIGGER IF EXISTS data_event_change_delete",
+        "DROP TRIGGER IF EXISTS data_event_change_update",
+    ] + ["DROP TRIGGER IF EXISTS {0}_change_rename".format(table)
+         for table in _TABLES],
+    'postgresql': [
+        "DROP TRIGGER IF EXISTS data_event_change ON data_event",
+        "DROP FUNCTION IF EXISTS data_event_change()",
+    ] + [statement for table in _TABLES for statement in (
+        "DROP TRIGGER IF EXISTS {0}_change ON {0}".format(table),
+        "DROP FUNCTION IF EXISTS {0}_change()".format(table))],
+}
+
+
+def install(connection):
+    """ Create (or re-create) the triggers """
+    sql.execute(INSTALL, connection)
+
+
+def uninstall(connection):
+    sql.execute(UNINSTALL, connection)
+
+
+def latest():
+    """ The token of the latest change, or 0 if there are none """
+    tokens = EventChange.objects.order_by('-id').values_list('id', flat=True)
+    return tokens[0] if tokens else 0
+
+
+def after(token, limit):
+    """ Up to `limit` (token, action, event_id) of the changes after `token` """
+    return list(EventChange.objects.filter(id__gt=token).order_by('id')
+                .values_list('id', 'action', 'event_id')[:limit])
+
+
+def since(token, limit, values):
+    """
+    Up to `limit` changes after `token`, oldest first - each with its `event`
+    as it is now (the `values` of it, from a values() query), or None if it
+    has since been deleted.
+    """
+    changes = list(EventChange.objects.filter(id__gt=token)
+                   .order_by('id')[:limit])
+    ids = set(change.event_id for change in changes)
+    events = {}
+    if ids:
+        events = dict((event['id'], event) for event in
+                      Event.objects.filter(id__in=ids).values(*values))
+    for change in changes:
+        change.event = events.get(change.event_id, None)
+    return changes
@@ -0,0 +1,77 @@
+"""
+Looking after database connections - see settings/local.py and
+settings/heroku.py for how these are configured.
+
+Reusing connections between requests (CONN_MAX_AGE, or the pooled backend)
+saves connecting afresh every time, but a connection can die while it sits
+idle - the database might have been restarted, say. Django only notices once a
+query fails, so for databases with CONN_HEALTH_CHECKS set, a reused connection
+which has been idle for more than CONN_HEALTH_CHECK_AFTER seconds is checked
+before a request gets it - by `check_health` as requests start, or by the pool
+as it hands connections out (see hoop_dev_test/data/backends). Checking costs
+a round trip to the database, so connections which were used moments ago
+aren't checked.
+
+`tune_sqlite` applies SQLITE_PRAGMAS to each new SQLite connection - they
+don't persist in the database file, so they have to be set every time.
+"""
+from time import time
+
+from django.conf import settings
+from django.db import connections, DatabaseError
+
+DEFAULT_HEALTH_CHECK_AFTER = 30
+
+
+def health_check_after(settings_dict):
+    """
+    How many seconds a database's connections can be idle before they're
+    checked - or None if they aren't.
+    """
+    if not settings_dict.get('CONN_HEALTH_CHECKS'):
+        return None
+    return settings_dict.get('CONN_HEALTH_CHECK_AFTER',
+                             DEFAULT_HEALTH_CHECK_AFTER)
+
+
+def check_health(**kwargs):
+    """ Connected to request_started - close any connections that are dead """
+    for connection in connections.all():
+        check(connection)
+
+
+def check(connection):
+    """
+    Close `connection` if it has been idle long enough to need checking, and
+    doesn't work - a connection which isn't open (as pooled ones aren't,
+    between requests) is left alone.
+    """
+    after = health_check_after(connection.settings_dict)
+    if connection.connection is None or after is None:
+        return
+    idle_since = getattr(connection, 'idle_since', None)
+    if idle_since is None or time() - idle_since < after:
+        return
+    if not connection.is_usable():
+        try:
+            connection.close()
+        except DatabaseError:  # It's already as closed as it'll get
+            pass
+
+
+def mark_idle(**kwargs):
+    """ Connected to request_finished - note when connections were used """
+    now = time()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.idle_since = now
+
+
+def tune_sqlite(sender, connection, **kwargs):
+    """ Connected to connection_created - set SQLITE_PRAGMAS """
+    if connection.vendor != 'sqlite':
+        return
+    cursor = connection.connection.cursor()
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        cursor.execute('PRAGMA {0} = {1}'.format(name, value))
+    cursor.close()
@@ -0,0 +1,120 @@
+"""
+How many events each location and category has - kept in their `num_events`
+columns by triggers on `data_event`, so that every write is counted, including
+bulk inserts and QuerySet.update() which don't send signals. Reading the counts
+for every location is then a scan of the (short) location table, rather than a
+count of every event.
+
+On Postgres a counter's row stays locked from when it is updated until the
+transaction commits, so anything else writing events in that location or
+category has to wait - and a bulk import, which is one long transaction,
+touches the busiest locations and categories (all of "London", say) early on.
+So the triggers are deferred until commit, as for the change log (see
+changes.py): the counters are only locked while a transaction is committing,
+not while it is running. A transaction's own counts don't change until it
+commits. SQLite only ever has one writer anyway.
+
+As with the search index, SQLite drops the triggers if a migration rebuilds
+`data_event` - and refuses to rebuild `data_location` or `data_category` while
+triggers refer to them - so migrations altering any of these should run (their
+own copies of) UNINSTALL first and INSTALL afterwards.
+
+`facets` counts events by location or category: from the counter columns when
+the whole catalogue is being counted, or with a GROUP BY for part of it.
+"""
+from collections import OrderedDict
+
+from django.db.models import Count
+
+from hoop_dev_test.data import sql
+from hoop_dev_test.data.models import Location, Category
+
+FACETS = OrderedDict([('location', Location), ('category', Category)])
+
+_RECOUNT = [
+    "UPDATE data_location SET num_events = (SELECT COUNT(*) FROM data_event "
+    "WHERE data_event.location_id = data_location.id)",
+    "UPDATE data_category SET num_events = (SELECT COUNT(*) FROM data_event "
+    "WHERE data_event.category_id = data_category.id)",
+]
+
+
+def _change(table, column, row, delta):
+    return "UPDATE {0} SET num_events = num_events {1} WHERE id = {2}.{3};" \
+        .format(table, delta, row, column)
+
+
+def _changes(row, delta):
+    return ' '.join([_change('data_location', 'location_id', row, delta),
+                     _change('data_category', 'category_id', row, delta)])
+
+
+INSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS data_event_count_insert",
+        "CREATE TRIGGER data_event_count_insert AFTER INSERT ON data_event "
+        "BEGIN {0} END".format(_changes('new', '+ 1')),
+        "DROP TRIGGER IF EXISTS data_event_count_delete",
+        "CREATE TRIGGER data_event_count_delete AFTER DELETE ON data_event "
+        "BEGIN {0} END".format(_changes('old', '- 1')),
+        "DROP TRIGGER IF EXISTS data_event_count_update",
+        "CREATE TRIGGER data_event_count_update "
+        "AFTER UPDATE OF location_id, category_id ON data_event "
+        "BEGIN {0} {1} END".format(_changes('old', '- 1'),
+                                   _changes('new', '+ 1')),
+    ] + _RECOUNT,
+    'postgresql': [
+        "CREATE OR REPLACE FUNCTION data_event_count() RETURNS trigger AS $$ "
+        "BEGIN "
+        "IF TG_OP IN ('UPDATE', 'DELETE') THEN {0} END IF; "
+        "IF TG_OP IN ('INSERT', 'UPDATE') THEN {1} END IF; "
+        "RETURN NULL; "
+        "END $$ LANGUAGE plpgsql".format(_changes('OLD', '- 1'),
+                                         _changes('NEW', '+ 1')),
+        "DROP TRIGGER IF EXISTS data_event_count ON data_event",
+        "CREATE CONSTRAINT TRIGGER data_event_count "
+        "AFTER INSERT OR DELETE OR UPDATE OF location_id, category_id "
+        "ON data_event DEFERRABLE INITIALLY DEFERRED "
+        "FOR EACH ROW EXECUTE PROCEDURE data_event_count()",
+    ] + _RECOUNT,
+}
+
+UNINSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS data_event_count_insert",
+        "DROP TRIGGER IF EXISTS data_event_count_delete",
+        "DROP TRIGGER IF EXISTS data_event_count_update",
+    ],
+    'postgresql': [
+        "DROP TRIGGER IF EXISTS data_event_count ON data_event",
+        "DROP FUNCTION IF EXISTS data_event_count()",
+    ],
+}
+
+
+def install(connection):
+    """ Create (or re-create) the triggers, and count everything afresh """
+    sql.execute(INSTALL, connection)
+
+
+def uninstall(connection):
+    sql.execute(UNINSTALL, connection)
+
+
+def facets(queryset, names, whole=False):
+    """
+    For each of `names` (from FACETS) an OrderedDict of how many events in
+    `queryset` there are for each location or category, most first. If
+    `queryset` is `whole` catalogue, the counter columns are read instead.
+    """
+    result = OrderedDict()
+    for name in names:
+        if whole:
+            counts = FACETS[name].objects.filter(num_events__gt=0) \
+                .values_list('name', 'num_events')
+        else:
+            counts = queryset.order_by().values_list(name + '__name') \
+                .annotate(count=Count('id'))
+        result[name] = OrderedDict(sorted(
+            counts, key=lambda count: (-count[1], count[0])))
+    return result
@@ -0,0 +1,57 @@
+"""
+Mis-entered locations and categories ("london" for "London", say) are
+corrected by merging them into the right one: `merge` moves all of their
+events across with a single UPDATE, then deletes them. The database keeps the
+counts and change log right (see counts.py and changes.py), and deleting them
+sends the signals which empty the name caches and cached responses.
+
+`find` looks for candidates - names which are the same once `normalize`d. It
+groups them by the indexed `normalized_name` column, so it never has to
+compare every name with every other, however many there are.
+"""
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Count
+
+from hoop_dev_test.data.models import Event, Location, Category
+
+FIELDS = {Location: 'location', Category: 'category'}
+
+
+def merge(canonical, duplicates):
+    """
+    Move every event of `duplicates` to `canonical` (a Location or Category,
+    as they are) and delete them - returning how many events were moved.
+    """
+    model = type(canonical)
+    ids = [duplicate.pk for duplicate in duplicates
+           if duplicate.pk != canonical.pk]
+    if not ids:
+        return 0
+    field = FIELDS[model]
+    with transaction.atomic():
+        moved = Event.objects.filter(**{field + '_id__in': ids}).update(
+            **{field: canonical})
+        model.objects.filter(pk__in=ids).delete()
+    return moved
+
+
+def shared(model):
+    """ The normalized names which more than one `model` has """
+    return (model.objects.values('normalized_name')
+            .annotate(count=Count('id')).filter(count__gt=1)
+            .values_list('normalized_name', flat=True))
+
+
+def find(model):
+    """
+    Each group of `model`s whose names normalize to the same thing, as a
+    list with the one with the most events (or else the oldest) first - the
+    one to keep, most likely.
+    """
+    candidates = (model.objects.filter(normalized_name__in=shared(model))
+                  .order_by('normalized_name', '-num_events', 'id'))
+    for _, group in groupby(candidates.iterator(),
+                            lambda candidate: candidate.normalized_name):
+        yield list(group)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='category',
+            field=models.ForeignKey(related_name='events', to='data.Category', db_index=False),
+            preserve_default=True,
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='location',
+            field=models.ForeignKey(related_name='events', to='data.Location', db_index=False),
+            preserve_default=True,
+        ),
+        migrations.AlterIndexTogether(
+            name='event',
+            index_together=set([('category', 'id'), ('location', 'id'), ('location', 'category', 'id')]),
+        ),
+    ]
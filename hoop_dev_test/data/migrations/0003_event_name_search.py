@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from hoop_dev_test.data import sql
+
+# search.py's SQL as it was for this migration (see sql.py)
+INSTALL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS data_event_search USING "
+        "fts5(name, content='data_event', content_rowid='id', "
+        "tokenize='porter unicode61 remove_diacritics 1')",
+        "DROP TRIGGER IF EXISTS data_event_search_insert",
+        "CREATE TRIGGER data_event_search_insert AFTER INSERT ON data_event "
+        "BEGIN INSERT INTO data_event_search(rowid, name) VALUES (new.id, "
+        "new.name); END",
+        "DROP TRIGGER IF EXISTS data_event_search_delete",
+        "CREATE TRIGGER data_event_search_delete AFTER DELETE ON data_event "
+        "BEGIN INSERT INTO data_event_search(data_event_search, rowid, name) "
+        "VALUES ('delete', old.id, old.name); END",
+        "DROP TRIGGER IF EXISTS data_event_search_update",
+        "CREATE TRIGGER data_event_search_update AFTER UPDATE OF id, name ON "
+        "data_event BEGIN INSERT INTO data_event_search(data_event_search, "
+        "rowid, name) VALUES ('delete', old.id, old.name);INSERT INTO "
+        "data_event_search(rowid, name) VALUES (new.id, new.name); END",
+        "INSERT INTO data_event_search(data_event_search) VALUES ('rebuild')",
+    ],
+    'postgresql': [
+        "DROP INDEX IF EXISTS data_event_name_search",
+        "CREATE INDEX data_event_name_search ON data_event USING GIN "
+        "(to_tsvector('english', name))",
+    ],
+}
+
+UNINSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS data_event_search_insert",
+        "DROP TRIGGER IF EXISTS data_event_search_delete",
+        "DROP TRIGGER IF EXISTS data_event_search_update",
+        "DROP TABLE IF EXISTS data_event_search",
+    ],
+    'postgresql': [
+        "DROP INDEX IF EXISTS data_event_name_search",
+    ],
+}
+
+
+def install(apps, schema_editor):
+    sql.execute(INSTALL, schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    sql.execute(UNINSTALL, schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0002_event_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
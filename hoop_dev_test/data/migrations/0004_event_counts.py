@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+from hoop_dev_test.data import sql
+
+# counts.py's SQL as it was for this migration (see sql.py)
+INSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS data_event_count_insert",
+        "CREATE TRIGGER data_event_count_insert AFTER INSERT ON data_event "
+        "BEGIN UPDATE data_location SET num_events = num_events + 1 WHERE id "
+        "= new.location_id; UPDATE data_category SET num_events = num_events "
+        "+ 1 WHERE id = new.category_id; END",
+        "DROP TRIGGER IF EXISTS data_event_count_delete",
+        "CREATE TRIGGER data_event_count_delete AFTER DELETE ON data_event "
+        "BEGIN UPDATE data_location SET num_events = num_events - 1 WHERE id "
+        "= old.location_id; UPDATE data_category SET num_events = num_events "
+        "- 1 WHERE id = old.category_id; END",
+        "DROP TRIGGER IF EXISTS data_event_count_update",
+        "CREATE TRIGGER data_event_count_update AFTER UPDATE OF location_id, "
+        "category_id ON data_event BEGIN UPDATE data_location SET num_events "
+        "= num_events - 1 WHERE id = old.location_id; UPDATE data_category "
+        "SET num_events = num_events - 1 WHERE id = old.category_id; UPDATE "
+        "data_location SET num_events = num_events + 1 WHERE id = "
+        "new.location_id; UPDATE data_category SET num_events = num_events + "
+        "1 WHERE id = new.category_id; END",
+        "UPDATE data_location SET num_events = (SELECT COUNT(*) FROM "
+        "data_event WHERE data_event.location_id = data_location.id)",
+        "UPDATE data_category SET num_events = (SELECT COUNT(*) FROM "
+        "data_event WHERE data_event.category_id = data_category.id)",
+    ],
+    'postgresql': [
+        "CREATE OR REPLACE FUNCTION data_event_count() RETURNS trigger AS $$ "
+        "BEGIN IF TG_OP IN ('UPDATE', 'DELETE') THEN UPDATE data_location SET "
+        "num_events = num_events - 1 WHERE id = OLD.location_id; UPDATE "
+        "data_category SET num_events = num_events - 1 WHERE id = "
+        "OLD.category_id; END IF; IF TG_OP IN ('INSERT', 'UPDATE') THEN "
+        "UPDATE data_location SET num_events = num_events + 1 WHERE id = "
+        "NEW.location_id; UPDATE data_category SET num_events = num_events + "
+        "1 WHERE id = NEW.category_id; END IF; RETURN NULL; END $$ LANGUAGE "
+        "plpgsql",
+        "DROP TRIGGER IF EXISTS data_event_count ON data_event",
+        "CREATE TRIGGER data_event_count AFTER INSERT OR DELETE OR UPDATE OF "
+        "location_id, category_id ON data_event FOR EACH ROW EXECUTE "
+        "PROCEDURE data_event_count()",
+        "UPDATE data_location SET num_events = (SELECT COUNT(*) FROM "
+        "data_event WHERE data_event.location_id = data_location.id)",
+        "UPDATE data_category SET num_events = (SELECT COUNT(*) FROM "
+        "data_event WHERE data_event.category_id = data_category.id)",
+    ],
+}
+
+UNINSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS data_event_count_insert",
+        "DROP TRIGGER IF EXISTS data_event_count_delete",
+        "DROP TRIGGER IF EXISTS data_event_count_update",
+    ],
+    'postgresql': [
+        "DROP TRIGGER IF EXISTS data_event_count ON data_event",
+        "DROP FUNCTION IF EXISTS data_event_count()",
+    ],
+}
+
+
+def install(apps, schema_editor):
+    sql.execute(INSTALL, schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    sql.execute(UNINSTALL, schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0003_event_name_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='num_events',
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='num_events',
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+        migrations.RunPython(install, uninstall),
+    ]
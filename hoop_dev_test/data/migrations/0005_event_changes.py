@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+from hoop_dev_test.data import sql
+
+# changes.py's SQL as it was for this migration (see sql.py), and the events
+# there already are, logged as created
+BACKFILL = {
+    'sqlite': [
+        "INSERT INTO data_eventchange (event_id, action) SELECT id, 'created' "
+        "FROM data_event ORDER BY id",
+    ],
+    'postgresql': [
+        "INSERT INTO data_eventchange (event_id, action) SELECT id, 'created' "
+        "FROM data_event ORDER BY id",
+    ],
+}
+
+INSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS data_event_change_insert",
+        "CREATE TRIGGER data_event_change_insert AFTER INSERT ON data_event "
+        "BEGIN INSERT INTO data_eventchange (event_id, action) VALUES "
+        "(new.id, 'created'); END",
+        "DROP TRIGGER IF EXISTS data_event_change_delete",
+        "CREATE TRIGGER data_event_change_delete AFTER DELETE ON data_event "
+        "BEGIN INSERT INTO data_eventchange (event_id, action) VALUES "
+        "(old.id, 'deleted'); END",
+        "DROP TRIGGER IF EXISTS data_event_change_update",
+        "CREATE TRIGGER data_event_change_update AFTER UPDATE ON data_event "
+        "WHEN old.name IS NOT new.name OR old.location_id IS NOT "
+        "new.location_id OR old.category_id IS NOT new.category_id BEGIN "
+        "INSERT INTO data_eventchange (event_id, action) VALUES (new.id, "
+        "'updated'); END",
+        "DROP TRIGGER IF EXISTS data_location_change_rename",
+        "CREATE TRIGGER data_location_change_rename AFTER UPDATE OF name ON "
+        "data_location WHEN old.name IS NOT new.name BEGIN INSERT INTO "
+        "data_eventchange (event_id, action) SELECT id, 'updated' FROM "
+        "data_event WHERE location_id = new.id ORDER BY id; END",
+        "DROP TRIGGER IF EXISTS data_category_change_rename",
+        "CREATE TRIGGER data_category_change_rename AFTER UPDATE OF name ON "
+        "data_category WHEN old.name IS NOT new.name BEGIN INSERT INTO "
+        "data_eventchange (event_id, action) SELECT id, 'updated' FROM "
+        "data_event WHERE category_id = new.id ORDER BY id; END",
+    ],
+    'postgresql': [
+        "CREATE OR REPLACE FUNCTION data_event_change() RETURNS trigger AS $$ "
+        "BEGIN PERFORM pg_advisory_xact_lock(hashtext('data_eventchange')); "
+        "IF TG_OP = 'INSERT' THEN INSERT INTO data_eventchange (event_id, "
+        "action) VALUES (NEW.id, 'created'); ELSIF TG_OP = 'DELETE' THEN "
+        "INSERT INTO data_eventchange (event_id, action) VALUES (OLD.id, "
+        "'deleted'); ELSIF old.name IS DISTINCT FROM new.name OR "
+        "old.location_id IS DISTINCT FROM new.location_id OR old.category_id "
+        "IS DISTINCT FROM new.category_id THEN INSERT INTO data_eventchange "
+        "(event_id, action) VALUES (NEW.id, 'updated'); END IF; RETURN NULL; "
+        "END $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS data_event_change ON data_event",
+        "CREATE TRIGGER data_event_change AFTER INSERT OR DELETE OR UPDATE ON "
+        "data_event FOR EACH ROW EXECUTE PROCEDURE data_event_change()",
+        "CREATE OR REPLACE FUNCTION data_location_change() RETURNS trigger AS "
+        "$$ BEGIN IF NEW.name IS DISTINCT FROM OLD.name THEN PERFORM "
+        "pg_advisory_xact_lock(hashtext('data_eventchange')); INSERT INTO "
+        "data_eventchange (event_id, action) SELECT id, 'updated' FROM "
+        "data_event WHERE location_id = NEW.id ORDER BY id; END IF; RETURN "
+        "NULL; END $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS data_location_change ON data_location",
+        "CREATE TRIGGER data_location_change AFTER UPDATE OF name ON "
+        "data_location FOR EACH ROW EXECUTE PROCEDURE data_location_change()",
+        "CREATE OR REPLACE FUNCTION data_category_change() RETURNS trigger AS "
+        "$$ BEGIN IF NEW.name IS DISTINCT FROM OLD.name THEN PERFORM "
+        "pg_advisory_xact_lock(hashtext('data_eventchange')); INSERT INTO "
+        "data_eventchange (event_id, action) SELECT id, 'updated' FROM "
+        "data_event WHERE category_id = NEW.id ORDER BY id; END IF; RETURN "
+        "NULL; END $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS data_category_change ON data_category",
+        "CREATE TRIGGER data_category_change AFTER UPDATE OF name ON "
+        "data_category FOR EACH ROW EXECUTE PROCEDURE data_category_change()",
+    ],
+}
+
+UNINSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS data_event_change_insert",
+        "DROP TRIGGER IF EXISTS data_event_change_delete",
+        "DROP TRIGGER IF EXISTS data_event_change_update",
+        "DROP TRIGGER IF EXISTS data_location_change_rename",
+        "DROP TRIGGER IF EXISTS data_category_change_rename",
+    ],
+    'postgresql': [
+        "DROP TRIGGER IF EXISTS data_event_change ON data_event",
+        "DROP FUNCTION IF EXISTS data_event_change()",
+        "DROP TRIGGER IF EXISTS data_location_change ON data_location",
+        "DROP FUNCTION IF EXISTS data_location_change()",
+        "DROP TRIGGER IF EXISTS data_category_change ON data_category",
+        "DROP FUNCTION IF EXISTS data_category_change()",
+    ],
+}
+
+
+def install(apps, schema_editor):
+    sql.execute(BACKFILL, schema_editor.connection)
+    sql.execute(INSTALL, schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    sql.execute(UNINSTALL, schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0004_event_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventChange',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('event_id', models.IntegerField()),
+                ('action', models.CharField(max_length=7, choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')])),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from hoop_dev_test.data import sql
+
+# The change triggers as this migration installs them, now NOTIFYing, and
+# as 0005 left them (see sql.py). SQLite's are unchanged.
+INSTALL = {
+    'postgresql': [
+        "CREATE OR REPLACE FUNCTION data_event_change() RETURNS trigger AS $$ "
+        "BEGIN PERFORM pg_advisory_xact_lock(hashtext('data_eventchange')); "
+        "PERFORM pg_notify('data_eventchange', ''); IF TG_OP = 'INSERT' THEN "
+        "INSERT INTO data_eventchange (event_id, action) VALUES (NEW.id, "
+        "'created'); ELSIF TG_OP = 'DELETE' THEN INSERT INTO data_eventchange "
+        "(event_id, action) VALUES (OLD.id, 'deleted'); ELSIF old.name IS "
+        "DISTINCT FROM new.name OR old.location_id IS DISTINCT FROM "
+        "new.location_id OR old.category_id IS DISTINCT FROM new.category_id "
+        "THEN INSERT INTO data_eventchange (event_id, action) VALUES (NEW.id, "
+        "'updated'); END IF; RETURN NULL; END $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS data_event_change ON data_event",
+        "CREATE TRIGGER data_event_change AFTER INSERT OR DELETE OR UPDATE ON "
+        "data_event FOR EACH ROW EXECUTE PROCEDURE data_event_change()",
+        "CREATE OR REPLACE FUNCTION data_location_change() RETURNS trigger AS "
+        "$$ BEGIN IF NEW.name IS DISTINCT FROM OLD.name THEN PERFORM "
+        "pg_advisory_xact_lock(hashtext('data_eventchange')); PERFORM "
+        "pg_notify('data_eventchange', ''); INSERT INTO data_eventchange "
+        "(event_id, action) SELECT id, 'updated' FROM data_event WHERE "
+        "location_id = NEW.id ORDER BY id; END IF; RETURN NULL; END $$ "
+        "LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS data_location_change ON data_location",
+        "CREATE TRIGGER data_location_change AFTER UPDATE OF name ON "
+        "data_location FOR EACH ROW EXECUTE PROCEDURE data_location_change()",
+        "CREATE OR REPLACE FUNCTION data_category_change() RETURNS trigger AS "
+        "$$ BEGIN IF NEW.name IS DISTINCT FROM OLD.name THEN PERFORM "
+        "pg_advisory_xact_lock(hashtext('data_eventchange')); PERFORM "
+        "pg_notify('data_eventchange', ''); INSERT INTO data_eventchange "
+        "(event_id, action) SELECT id, 'updated' FROM data_event WHERE "
+        "category_id = NEW.id ORDER BY id; END IF; RETURN NULL; END $$ "
+        "LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS data_category_change ON data_category",
+        "CREATE TRIGGER data_category_change AFTER UPDATE OF name ON "
+        "data_category FOR EACH ROW EXECUTE PROCEDURE data_category_change()",
+    ],
+}
+
+REVERT = {
+    'postgresql': [
+        "CREATE OR REPLACE FUNCTION data_event_change() RETURNS trigger AS $$ "
+        "BEGIN PERFORM pg_advisory_xact_lock(hashtext('data_eventchange')); "
+        "IF TG_OP = 'INSERT' THEN INSERT INTO data_eventchange (event_id, "
+        "action) VALUES (NEW.id, 'created'); ELSIF TG_OP = 'DELETE' THEN "
+        "INSERT INTO data_eventchange (event_id, action) VALUES (OLD.id, "
+        "'deleted'); ELSIF old.name IS DISTINCT FROM new.name OR "
+        "old.location_id IS DISTINCT FROM new.location_id OR old.category_id "
+        "IS DISTINCT FROM new.category_id THEN INSERT INTO data_eventchange "
+        "(event_id, action) VALUES (NEW.id, 'updated'); END IF; RETURN NULL; "
+        "END $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS data_event_change ON data_event",
+        "CREATE TRIGGER data_event_change AFTER INSERT OR DELETE OR UPDATE ON "
+        "data_event FOR EACH ROW EXECUTE PROCEDURE data_event_change()",
+        "CREATE OR REPLACE FUNCTION data_location_change() RETURNS trigger AS "
+        "$$ BEGIN IF NEW.name IS DISTINCT FROM OLD.name THEN PERFORM "
+        "pg_advisory_xact_lock(hashtext('data_eventchange')); INSERT INTO "
+        "data_eventchange (event_id, action) SELECT id, 'updated' FROM "
+        "data_event WHERE location_id = NEW.id ORDER BY id; END IF; RETURN "
+        "NULL; END $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS data_location_change ON data_location",
+        "CREATE TRIGGER data_location_change AFTER UPDATE OF name ON "
+        "data_location FOR EACH ROW EXECUTE PROCEDURE data_location_change()",
+        "CREATE OR REPLACE FUNCTION data_category_change() RETURNS trigger AS "
+        "$$ BEGIN IF NEW.name IS DISTINCT FROM OLD.name THEN PERFORM "
+        "pg_advisory_xact_lock(hashtext('data_eventchange')); INSERT INTO "
+        "data_eventchange (event_id, action) SELECT id, 'updated' FROM "
+        "data_event WHERE category_id = NEW.id ORDER BY id; END IF; RETURN "
+        "NULL; END $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS data_category_change ON data_category",
+        "CREATE TRIGGER data_category_change AFTER UPDATE OF name ON "
+        "data_category FOR EACH ROW EXECUTE PROCEDURE data_category_change()",
+    ],
+}
+
+
+def install(apps, schema_editor):
+    sql.execute(INSTALL, schema_editor.connection)
+
+
+def revert(apps, schema_editor):
+    sql.execute(REVERT, schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0005_event_changes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, revert),
+    ]
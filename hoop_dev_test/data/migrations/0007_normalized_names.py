@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+from hoop_dev_test.data import sql
+from hoop_dev_test.data.models import normalize
+
+# All of the triggers - counts.py's, changes.py's and search.py's, in that
+# order - as they were for this migration (see sql.py)
+INSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS data_event_count_insert",
+        "CREATE TRIGGER data_event_count_insert AFTER INSERT ON data_event "
+        "BEGIN UPDATE data_location SET num_events = num_events + 1 WHERE id "
+        "= new.location_id; UPDATE data_category SET num_events = num_events "
+        "+ 1 WHERE id = new.category_id; END",
+        "DROP TRIGGER IF EXISTS data_event_count_delete",
+        "CREATE TRIGGER data_event_count_delete AFTER DELETE ON data_event "
+        "BEGIN UPDATE data_location SET num_events = num_events - 1 WHERE id "
+        "= old.location_id; UPDATE data_category SET num_events = num_events "
+        "- 1 WHERE id = old.category_id; END",
+        "DROP TRIGGER IF EXISTS data_event_count_update",
+        "CREATE TRIGGER data_event_count_update AFTER UPDATE OF location_id, "
+        "category_id ON data_event BEGIN UPDATE data_location SET num_events "
+        "= num_events - 1 WHERE id = old.location_id; UPDATE data_category "
+        "SET num_events = num_events - 1 WHERE id = old.category_id; UPDATE "
+        "data_location SET num_events = num_events + 1 WHERE id = "
+        "new.location_id; UPDATE data_category SET num_events = num_events + "
+        "1 WHERE id = new.category_id; END",
+        "UPDATE data_location SET num_events = (SELECT COUNT(*) FROM "
+        "data_event WHERE data_event.location_id = data_location.id)",
+        "UPDATE data_category SET num_events = (SELECT COUNT(*) FROM "
+        "data_event WHERE data_event.category_id = data_category.id)",
+        "DROP TRIGGER IF EXISTS data_event_change_insert",
+        "CREATE TRIGGER data_event_change_insert AFTER INSERT ON data_event "
+        "BEGIN INSERT INTO data_eventchange (event_id, action) VALUES "
+        "(new.id, 'created'); END",
+        "DROP TRIGGER IF EXISTS data_event_change_delete",
+        "CREATE TRIGGER data_event_change_delete AFTER DELETE ON data_event "
+        "BEGIN INSERT INTO data_eventchange (event_id, action) VALUES "
+        "(old.id, 'deleted'); END",
+        "DROP TRIGGER IF EXISTS data_event_change_update",
+        "CREATE TRIGGER data_event_change_update AFTER UPDATE ON data_event "
+        "WHEN old.name IS NOT new.name OR old.location_id IS NOT "
+        "new.location_id OR old.category_id IS NOT new.category_id BEGIN "
+        "INSERT INTO data_eventchange (event_id, action) VALUES (new.id, "
+        "'updated'); END",
+        "DROP TRIGGER IF EXISTS data_location_change_rename",
+        "CREATE TRIGGER data_location_change_rename AFTER UPDATE OF name ON "
+        "data_location WHEN old.name IS NOT new.name BEGIN INSERT INTO "
+        "data_eventchange (event_id, action) SELECT id, 'updated' FROM "
+        "data_event WHERE location_id = new.id ORDER BY id; END",
+        "DROP TRIGGER IF EXISTS data_category_change_rename",
+        "CREATE TRIGGER data_category_change_rename AFTER UPDATE OF name ON "
+        "data_category WHEN old.name IS NOT new.name BEGIN INSERT INTO "
+        "data_eventchange (event_id, action) SELECT id, 'updated' FROM "
+        "data_event WHERE category_id = new.id ORDER BY id; END",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS data_event_search USING "
+        "fts5(name, content='data_event', content_rowid='id', "
+        "tokenize='porter unicode61 remove_diacritics 1')",
+        "DROP TRIGGER IF EXISTS data_event_search_insert",
+        "CREATE TRIGGER data_event_search_insert AFTER INSERT ON data_event "
+        "BEGIN INSERT INTO data_event_search(rowid, name) VALUES (new.id, "
+        "new.name); END",
+        "DROP TRIGGER IF EXISTS data_event_search_delete",
+        "CREATE TRIGGER data_event_search_delete AFTER DELETE ON data_event "
+        "BEGIN INSERT INTO data_event_search(data_event_search, rowid, name) "
+        "VALUES ('delete', old.id, old.name); END",
+        "DROP TRIGGER IF EXISTS data_event_search_update",
+        "CREATE TRIGGER data_event_search_update AFTER UPDATE OF id, name ON "
+        "data_event BEGIN INSERT INTO data_event_search(data_event_search, "
+        "rowid, name) VALUES ('delete', old.id, old.name);INSERT INTO "
+        "data_event_search(rowid, name) VALUES (new.id, new.name); END",
+        "INSERT INTO data_event_search(data_event_search) VALUES ('rebuild')",
+    ],
+    'postgresql': [
+        "CREATE OR REPLACE FUNCTION data_event_count() RETURNS trigger AS $$ "
+        "BEGIN IF TG_OP IN ('UPDATE', 'DELETE') THEN UPDATE data_location SET "
+        "num_events = num_events - 1 WHERE id = OLD.location_id; UPDATE "
+        "data_category SET num_events = num_events - 1 WHERE id = "
+        "OLD.category_id; END IF; IF TG_OP IN ('INSERT', 'UPDATE') THEN "
+        "UPDATE data_location SET num_events = num_events + 1 WHERE id = "
+        "NEW.location_id; UPDATE data_category SET num_events = num_events + "
+        "1 WHERE id = NEW.category_id; END IF; RETURN NULL; END $$ LANGUAGE "
+        "plpgsql",
+        "DROP TRIGGER IF EXISTS data_event_count ON data_event",
+        "CREATE TRIGGER data_event_count AFTER INSERT OR DELETE OR UPDATE OF "
+        "location_id, category_id ON data_event FOR EACH ROW EXECUTE "
+        "PROCEDURE data_event_count()",
+        "UPDATE data_location SET num_events = (SELECT COUNT(*) FROM "
+        "data_event WHERE data_event.location_id = data_location.id)",
+        "UPDATE data_category SET num_events = (SELECT COUNT(*) FROM "
+        "data_event WHERE data_event.category_id = data_category.id)",
+        "CREATE OR REPLACE FUNCTION data_event_change() RETURNS trigger AS $$ "
+        "BEGIN PERFORM pg_advisory_xact_lock(hashtext('data_eventchange')); "
+        "PERFORM pg_notify('data_eventchange', ''); IF TG_OP = 'INSERT' THEN "
+        "INSERT INTO data_eventchange (event_id, action) VALUES (NEW.id, "
+        "'created'); ELSIF TG_OP = 'DELETE' THEN INSERT INTO data_eventchange "
+        "(event_id, action) VALUES (OLD.id, 'deleted'); ELSIF old.name IS "
+        "DISTINCT FROM new.name OR old.location_id IS DISTINCT FROM "
+        "new.location_id OR old.category_id IS DISTINCT FROM new.category_id "
+        "THEN INSERT INTO data_eventchange (event_id, action) VALUES (NEW.id, "
+        "'updated'); END IF; RETURN NULL; END $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS data_event_change ON data_event",
+        "CREATE TRIGGER data_event_change AFTER INSERT OR DELETE OR UPDATE ON "
+        "data_event FOR EACH ROW EXECUTE PROCEDURE data_event_change()",
+        "CREATE OR REPLACE FUNCTION data_location_change() RETURNS trigger AS "
+        "$$ BEGIN IF NEW.name IS DISTINCT FROM OLD.name THEN PERFORM "
+        "pg_advisory_xact_lock(hashtext('data_eventchange')); PERFORM "
+        "pg_notify('data_eventchange', ''); INSERT INTO data_eventchange "
+        "(event_id, action) SELECT id, 'updated' FROM data_event WHERE "
+        "location_id = NEW.id ORDER BY id; END IF; RETURN NULL; END $$ "
+        "LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS data_location_change ON data_location",
+        "CREATE TRIGGER data_location_change AFTER UPDATE OF name ON "
+        "data_location FOR EACH ROW EXECUTE PROCEDURE data_location_change()",
+        "CREATE OR REPLACE FUNCTION data_category_change() RETURNS trigger AS "
+        "$$ BEGIN IF NEW.name IS DISTINCT FROM OLD.name THEN PERFORM "
+        "pg_advisory_xact_lock(hashtext('data_eventchange')); PERFORM "
+        "pg_notify('data_eventchange', ''); INSERT INTO data_eventchange "
+        "(event_id, action) SELECT id, 'updated' FROM data_event WHERE "
+        "category_id = NEW.id ORDER BY id; END IF; RETURN NULL; END $$ "
+        "LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS data_category_change ON data_category",
+        "CREATE TRIGGER data_category_change AFTER UPDATE OF name ON "
+        "data_category FOR EACH ROW EXECUTE PROCEDURE data_category_change()",
+        "DROP INDEX IF EXISTS data_event_name_search",
+        "CREATE INDEX data_event_name_search ON data_event USING GIN "
+        "(to_tsvector('english', name))",
+    ],
+}
+
+UNINSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS data_event_count_insert",
+        "DROP TRIGGER IF EXISTS data_event_count_delete",
+        "DROP TRIGGER IF EXISTS data_event_count_update",
+        "DROP TRIGGER IF EXISTS data_event_change_insert",
+        "DROP TRIGGER IF EXISTS data_event_change_delete",
+        "DROP TRIGGER IF EXISTS data_event_change_update",
+        "DROP TRIGGER IF EXISTS data_location_change_rename",
+        "DROP TRIGGER IF EXISTS data_category_change_rename",
+        "DROP TRIGGER IF EXISTS data_event_search_insert",
+        "DROP TRIGGER IF EXISTS data_event_search_delete",
+        "DROP TRIGGER IF EXISTS data_event_search_update",
+        "DROP TABLE IF EXISTS data_event_search",
+    ],
+    'postgresql': [
+        "DROP TRIGGER IF EXISTS data_event_count ON data_event",
+        "DROP FUNCTION IF EXISTS data_event_count()",
+        "DROP TRIGGER IF EXISTS data_event_change ON data_event",
+        "DROP FUNCTION IF EXISTS data_event_change()",
+        "DROP TRIGGER IF EXISTS data_location_change ON data_location",
+        "DROP FUNCTION IF EXISTS data_location_change()",
+        "DROP TRIGGER IF EXISTS data_category_change ON data_category",
+        "DROP FUNCTION IF EXISTS data_category_change()",
+        "DROP INDEX IF EXISTS data_event_name_search",
+    ],
+}
+
+
+def install(apps, schema_editor):
+    sql.execute(INSTALL, schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    sql.execute(UNINSTALL, schema_editor.connection)
+
+
+def normalize_names(apps, schema_editor):
+    for name in 'Location', 'Category':
+        model = apps.get_model('data', name)
+        for pk, name in model.objects.values_list('id', 'name').iterator():
+            model.objects.filter(pk=pk).update(normalized_name=normalize(name))
+
+
+def keep(apps, schema_editor):
+    """ The column is dropped anyway """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0006_event_change_notify'),
+    ]
+
+    operations = [
+        migrations.RunPython(uninstall, install),
+        migrations.AddField(
+            model_name='category',
+            name='normalized_name',
+            field=models.TextField(default='', editable=False, db_index=True),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='normalized_name',
+            field=models.TextField(default='', editable=False, db_index=True),
+            preserve_default=False,
+        ),
+        migrations.RunPython(normalize_names, keep),
+        migrations.RunPython(install, uninstall),
+    ]
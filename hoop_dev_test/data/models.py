@@ -7,6 +7,26 @@ made locations and categories models in their own right - not only should this
 save database space, but should also make it easier to spot and correct
 mis-entered data (i.e. incorrect capitalisation, mis-spellings).
 
+The event list is filtered and sorted by location and category, so events have
+composite indexes to match - the plain foreign key indexes would be redundant
+alongside them, so I've turned those off.
+
+Locations and categories also keep count of how many events they have - the
+database keeps these up to date (see counts.py), so they are never saved from
+here.
+
+Every change to an event is also logged as an EventChange, again by the
+database (see changes.py), so that copies of the catalogue can be kept up to
+date without reading all of it.
+
+Mis-entered names are mostly the same name with different capitalisation or
+spacing ("london", "London ") - so locations and categories also keep their
+name `normalize`d, in an indexed column, which makes these quick to find and
+merge (see duplicates.py).
+
+Processes remember names' ids for a while (see names.py), so whenever a name is
+renamed or deleted the NameGeneration is counted up, telling them all to forget.
+
 Ideally we should have some constraints on the length of a name, however without
 this I have made the name fields TextField rather than CharField - this is less
 efficient but more flexible.
@@ -14,27 +34,100 @@ efficient but more flexible.
 from django.db import models
 
 
-class Location(models.Model):
-    name = models.TextField(unique=True, db_index=True)
+def normalize(name):
+    """ `name` in lower case, with its whitespace tidied up """
+    return ' '.join(name.split()).lower()
 
 
-class Category(models.Model):
+class EventCounted(models.Model):
+    """ Something events belong to, which knows how many there are """
 
     class Meta:
-        verbose_name_plural = "categories"
+        abstract = True
+
+    num_events = models.PositiveIntegerField(default=0, editable=False)
+
+    def save(self, *args, **kwargs):
+        """
+        Our `num_events` may be out of date by now, so leave the database's
+        alone when updating.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'num_events']
+        super(EventCounted, self).save(*args, **kwargs)
+
+
+class Named(models.Model):
+    """
+    Something with a unique name, which also keeps it `normalize`d - anything
+    which sets the name without saving (QuerySet.update(), bulk_create())
+    has to set `normalized_name` too.
+    """
+
+    class Meta:
+        abstract = True
 
     name = models.TextField(unique=True, db_index=True)
+    normalized_name = models.TextField(db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize(self.name)
+        super(Named, self).save(*args, **kwargs)
+
+
+class Location(Named, EventCounted):
+    pass
+
+
+class Category(Named, EventCounted):
+
+    class Meta:
+        verbose_name_plural = "categories"
 
 
 class Event(models.Model):
 
     class Meta:
         verbose_name_plural = "entries"
+        # These match the filter/sort combinations of the event list - ties
+        # are always broken by id, so the order can be read from the index.
+        # Sorting by location or category name walks that model's name index
+        # and then looks up each location/category's events in order - hence
+        # a single (location, category) index serves both "in this location
+        # by category" and "in this category by location".
+        index_together = (
+            ('location', 'category', 'id'),
+            ('location', 'id'),
+            ('category', 'id'),
+        )
 
     @property
     def eventID(self):
         return self.id
 
     name = models.TextField(unique=True)
-    location = models.ForeignKey(Location, db_index=True, related_name="events")
-    category = models.ForeignKey(Category, db_index=True, related_name="events")
\ No newline at end of file
+    location = models.ForeignKey(Location, db_index=False, related_name="events")
+    category = models.ForeignKey(Category, db_index=False, related_name="events")
+
+
+class EventChange(models.Model):
+    """
+    An event was created, updated or deleted. The id is the change's token -
+    later changes have larger ones.
+    """
+    CREATED, UPDATED, DELETED = 'created', 'updated', 'deleted'
+    ACTIONS = ((CREATED, 'Created'), (UPDATED, 'Updated'),
+               (DELETED, 'Deleted'))
+
+    event_id = models.IntegerField()  # Not a ForeignKey - events get deleted
+    action = models.CharField(max_length=7, choices=ACTIONS)
+
+
+class NameGeneration(models.Model):
+    """
+    A single row, counting how many times a location or category has been
+    renamed or deleted - see names.py.
+    """
+    value = models.PositiveIntegerField(default=0)
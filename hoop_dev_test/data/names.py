@@ -0,0 +1,146 @@
+"""
+There are only ever a handful of locations and categories, and they rarely
+change, yet every event we write or filter needs one looked up by name - so
+this keeps a small in-process cache of the name to id mapping for each.
+
+The caches are bounded, dropping the least recently used names once full, and
+are emptied whenever a location or category is renamed or deleted (see
+`apps.py`). That has to reach every process, not just the one which made the
+change - an id we've kept for a location someone has merged away would
+otherwise be written into new events - so it counts up the NameGeneration in
+the database, which each process reads at most once every
+NAME_CACHE_GENERATION_TTL seconds, emptying its caches when it has changed.
+Anything which changes names without sending signals - i.e. QuerySet.update()
+or .delete() - should call `invalidate` itself.
+"""
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+from django.conf import settings
+from django.db.models import F
+
+from hoop_dev_test.data.models import Location, Category, NameGeneration
+from hoop_dev_test.data.routers import PRIMARY
+
+_generation_lock = Lock()
+_known = {'generation': None, 'expires': 0}  # What we last read of it
+
+
+def _generation():
+    """
+    The current NameGeneration - read from the primary, as a replica could be
+    behind, and then remembered for a while.
+    """
+    with _generation_lock:
+        if _known['expires'] > time():
+            return _known['generation']
+    generation = NameGeneration.objects.using(PRIMARY).get_or_create(
+        pk=1)[0].value
+    ttl = getattr(settings, 'NAME_CACHE_GENERATION_TTL', 1)
+    with _generation_lock:
+        _known.update(generation=generation, expires=time() + ttl)
+    return generation
+
+
+class NameCache(object):
+    """ A least-recently-used cache of names to ids for `model` """
+
+    def __init__(self, model, size=1024, timeout=60):
+        self.model = model
+        self.size = size
+        self.timeout = timeout
+        self._ids = OrderedDict()
+        self._generation = None  # Which generation `_ids` belong to
+        self._lock = Lock()
+
+    def _check(self):
+        """ Forget everything if a name has changed since we learned it """
+        generation = _generation()
+        with self._lock:
+            if generation != self._generation:
+                self._ids.clear()
+                self._generation = generation
+
+    def _get(self, name):
+        with self._lock:
+            pk, expires = self._ids.pop(name, (None, 0))
+            if pk is None or expires < time():
+                return None
+            self._ids[name] = pk, expires  # ...moving it to the end
+            return pk
+
+    def _set(self, name, pk):
+        with self._lock:
+            self._ids.pop(name, None)
+            self._ids[name] = pk, time() + self.timeout
+            while len(self._ids) > self.size:
+                self._ids.popitem(last=False)
+
+    def get_id(self, name):
+        """ The id of the object called `name`, or None if there isn't one """
+        return self.get_ids([name]).get(name, None)
+
+    def get_ids(self, names):
+        """
+        A dict of the ids of those of `names` which exist - any we don't know
+        are looked up together, in a single query.
+        """
+        self._check()
+        ids, missing = {}, []
+        for name in set(names):
+            pk = self._get(name)
+            if pk is None:
+                missing.append(name)
+            else:
+                ids[name] = pk
+        if missing:
+            for name, pk in self.model.objects.filter(
+                    name__in=missing).values_list('name', 'id'):
+                self._set(name, pk)
+                ids[name] = pk
+        return ids
+
+    def get_or_create(self, name):
+        """
+        The object called `name`, creating it if need be - if it's cached we
+        don't touch the database at all, the object is built from the cache.
+        """
+        self._check()
+        pk = self._get(name)
+        if pk is not None:
+            return self.model(id=pk, name=name)
+        obj = self.model.objects.get_or_create(name=name)[0]
+        self._set(name, obj.pk)
+        return obj
+
+    def invalidate(self):
+        """ Forget everything we know, and have every other process forget """
+        invalidate()
+        with self._lock:
+            self._ids.clear()
+
+
+locations = NameCache(Location)
+categories = NameCache(Category)
+
+
+def invalidate():
+    """
+    Start a new generation, so that every process's caches are emptied. As for
+    the response cache, we read the new generation again rather than
+    remembering it, as it isn't visible to anyone else until it's committed.
+    """
+    NameGeneration.objects.using(PRIMARY).filter(pk=1).update(
+        value=F('value') + 1)
+    with _generation_lock:
+        _known['expires'] = 0
+
+
+def invalidate_on_change(sender, created=False, **kwargs):
+    """
+    Connected to post_save and post_delete for Location and Category - a new
+    name can't make anything in the cache wrong, but a rename or delete can.
+    """
+    if not created:
+        {Location: locations, Category: categories}[sender].invalidate()
@@ -0,0 +1,66 @@
+"""
+Most of our traffic is reading the lists and events, which read-only copies of
+the database (replicas) can answer just as well as the primary - leaving the
+primary to get on with writes.
+
+DATABASE_REPLICAS names the aliases in DATABASES which are replicas (see
+settings/local.py and settings/heroku.py). `ReplicaRouter` sends reads to one
+of them, chosen at random, but only inside `replica_reads()` - the REST views
+use this for listing and retrieving (see `ReplicaReadMixin`), so everything
+else, including any reads made while writing, stays on the primary. Writes
+always go to the primary, even for objects which were read from a replica.
+
+A replica can be a little behind the primary, so someone who has just written
+something might not see it if they read from one - see `ReplicaReadMixin` for
+how the REST API avoids this.
+"""
+import random
+from contextlib import contextmanager
+from threading import local
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+_state = local()
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+@contextmanager
+def replica_reads():
+    """ Send reads made by this thread to the replicas, for the duration """
+    previous = getattr(_state, 'replica_reads', False)
+    _state.replica_reads = True
+    try:
+        yield
+    finally:
+        _state.replica_reads = previous
+
+
+class ReplicaRouter(object):
+
+    @staticmethod
+    def db_for_read(model, **hints):
+        aliases = replicas()
+        if not aliases:
+            return None
+        if getattr(_state, 'replica_reads', False):
+            return random.choice(aliases)
+        return PRIMARY
+
+    @staticmethod
+    def db_for_write(model, **hints):
+        return PRIMARY if replicas() else None
+
+    @staticmethod
+    def allow_relation(obj1, obj2, **hints):
+        """ The replicas hold the same data as the primary """
+        return True
+
+    @staticmethod
+    def allow_migrate(db, model):
+        """ Replicas get their tables from the primary """
+        return db not in replicas()
@@ -0,0 +1,152 @@
+"""
+Full-text search over event names. The only index on `Event.name` is the
+unique one, which can't find a word in the middle of a name, so each database
+gets a proper full-text index of its own:
+
+ - SQLite: an FTS5 table, `data_event_search`, which reads the names from
+   `data_event` and is kept up to date by triggers on it.
+ - Postgres: a GIN index over `to_tsvector('english', name)`, which Postgres
+   keeps up to date itself.
+
+Anything else falls back to a (slow) case-insensitive LIKE for each word.
+
+Both indexes are created by a migration, with a copy of INSTALL (see sql.py).
+Be aware that when SQLite alters a table it copies it and drops the original,
+triggers and all - so any later migration which alters `Event` should run its
+own copy of INSTALL again.
+
+EVENT_SEARCH_BACKEND names the class to use; whichever it is, `filter` narrows
+a queryset of events down to those matching every word of the query, and can
+add a `relevance` to each (higher is better) for ranking them.
+"""
+import re
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from hoop_dev_test.data import sql
+
+RELEVANCE = 'relevance'
+
+
+def words(query):
+    return re.findall(r'\w+', query, re.UNICODE)
+
+
+class SimpleSearch(object):
+    """ Look for each word of the query anywhere in the name """
+
+    def filter(self, queryset, query, ranked=False):
+        for term in words(query):
+            queryset = queryset.filter(name__icontains=term)
+        if ranked:  # All matches are equally good
+            queryset = queryset.extra(select={RELEVANCE: '0'})
+        return queryset
+
+
+class SQLiteSearch(object):
+    """ Use the FTS5 table, ranking matches by bm25 """
+
+    def filter(self, queryset, query, ranked=False):
+        # Quoting each word stops FTS5 reading anything in them as syntax
+        match = ' '.join('"{0}"'.format(term) for term in words(query))
+        select = {RELEVANCE: '-bm25(data_event_search)'} if ranked else None
+        return queryset.extra(
+            select=select, tables=['data_event_search'],
+            where=['data_event_search.rowid = data_event.id',
+                   'data_event_search MATCH %s'],
+            params=[match])
+
+
+class PostgresSearch(object):
+    """ Use the GIN index on the names' tsvector, ranking matches by ts_rank """
+    vector = "to_tsvector('english', data_event.name)"
+    query = "plainto_tsquery('english', %s)"
+
+    def filter(self, queryset, query, ranked=False):
+        select, select_params = None, None
+        if ranked:
+            select = {RELEVANCE: 'ts_rank({0}, {1})'.format(self.vector,
+                                                           self.query)}
+            select_params = [query]
+        return queryset.extra(
+            select=select, select_params=select_params,
+            where=['{0} @@ {1}'.format(self.vector, self.query)],
+            params=[query])
+
+
+_backend = None
+
+
+def backend():
+    """ An instance of EVENT_SEARCH_BACKEND """
+    global _backend
+    if _backend is None:
+        _backend = import_string(getattr(
+            settings, 'EVENT_SEARCH_BACKEND',
+            'hoop_dev_test.data.search.SimpleSearch'))()
+    return _backend
+
+
+def search(queryset, query, ranked=False):
+    """ Events in `queryset` whose names contain every word of `query` """
+    if words(query):
+        return backend().filter(queryset, query, ranked)
+    if ranked:
+        queryset = queryset.extra(select={RELEVANCE: '0'})
+    return queryset.none()  # There's nothing to look for
+
+
+INSTALL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS data_event_search USING fts5("
+        "name, content='data_event', content_rowid='id', "
+        "tokenize='porter unicode61 remove_diacritics 1')",
+        "DROP TRIGGER IF EXISTS data_event_search_insert",
+        "CREATE TRIGGER data_event_search_insert AFTER INSERT ON data_event "
+        "BEGIN "
+        "INSERT INTO data_event_search(rowid, name) VALUES (new.id, new.name);"
+        " END",
+        "DROP TRIGGER IF EXISTS data_event_search_delete",
+        "CREATE TRIGGER data_event_search_delete AFTER DELETE ON data_event "
+        "BEGIN "
+        "INSERT INTO data_event_search(data_event_search, rowid, name) "
+        "VALUES ('delete', old.id, old.name);"
+        " END",
+        "DROP TRIGGER IF EXISTS data_event_search_update",
+        "CREATE TRIGGER data_event_search_update "
+        "AFTER UPDATE OF id, name ON data_event "
+        "BEGIN "
+        "INSERT INTO data_event_search(data_event_search, rowid, name) "
+        "VALUES ('delete', old.id, old.name);"
+        "INSERT INTO data_event_search(rowid, name) VALUES (new.id, new.name);"
+        " END",
+        "INSERT INTO data_event_search(data_event_search) VALUES ('rebuild')",
+    ],
+    'postgresql': [
+        "DROP INDEX IF EXISTS data_event_name_search",
+        "CREATE INDEX data_event_name_search ON data_event "
+        "USING GIN (to_tsvector('english', name))",
+    ],
+}
+
+UNINSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS data_event_search_insert",
+        "DROP TRIGGER IF EXISTS data_event_search_delete",
+        "DROP TRIGGER IF EXISTS data_event_search_update",
+        "DROP TABLE IF EXISTS data_event_search",
+    ],
+    'postgresql': [
+        "DROP INDEX IF EXISTS data_event_name_search",
+    ],
+}
+
+
+def install(connection):
+    """ Create (or re-create) the full-text index for `connection` """
+    sql.execute(INSTALL, connection)
+
+
+def uninstall(connection):
+    sql.execute(UNINSTALL, connection)
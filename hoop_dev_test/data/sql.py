@@ -0,0 +1,19 @@
+"""
+Some of what the database does for us - full-text indexes, triggers - can't be
+described by models, so it is written as raw SQL for each kind of database and
+installed by migrations. Anything not written for a database is skipped there.
+
+Each migration keeps its own copy of the SQL it runs, as it was when the
+migration was written, rather than calling a module's `install`: otherwise
+changing the module's INSTALL would change what old migrations do - and a
+fresh database would get the new SQL before the columns it refers to. So a
+change to INSTALL needs a new migration with a copy of the new SQL, which goes
+back to the previous copy when reversed.
+"""
+
+
+def execute(statements, connection):
+    """ Run `statements[connection.vendor]` (a list of SQL), if there is one """
+    cursor = connection.cursor()
+    for statement in statements.get(connection.vendor, ()):
+        cursor.execute(statement)
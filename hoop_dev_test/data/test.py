@@ -0,0 +1,318 @@
+"""
+Check that the database can answer each of the queries the event list makes
+straight from an index - both to find the events and to put them in order - by
+asking SQLite's query planner how it would run them (likewise for finding
+duplicate names) - that migrations install the triggers the modules would,
+that new SQLite connections are set up as the settings ask, and that
+connections are pooled and health-checked as they should be.
+"""
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from nose.tools import (assert_equal, assert_in, assert_is_none,
+                        assert_not_in, assert_raises)
+
+from hoop_dev_test.data import changes, counts, duplicates, search
+from hoop_dev_test.data.models import Event, Location, Category
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN is SQLite's")
+class IndexUsageTest(TestCase):
+
+    def setUp(self):
+        """
+        The planner only picks the best index once it knows what the data looks
+        like - so give it enough events to have an opinion, and ANALYZE them.
+        """
+        locations = [Location.objects.create(name='Location {0}'.format(i))
+                     for i in range(20)]
+        categories = [Category.objects.create(name='Category {0}'.format(i))
+                      for i in range(10)]
+        Event.objects.bulk_create([
+            Event(name='Event {0}'.format(i),
+                  location=locations[i % len(locations)],
+                  category=categories[i // len(locations) % len(categories)])
+            for i in range(2000)])
+        cursor = connection.cursor()
+        cursor.execute('ANALYZE')
+        self.location, self.category = locations[1], categories[1]
+
+        constraints = connection.introspection.get_constraints(
+            cursor, Event._meta.db_table)
+        self.indexes = dict((tuple(info['columns']), name)
+                            for name, info in constraints.items()
+                            if info['index'])
+
+    def _plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return '\n'.join(row[-1] for row in cursor.fetchall())
+
+    def _assert_indexed(self, queryset, columns):
+        """
+        A page of `queryset` should be found using the index on `columns`, and
+        be read in order rather than sorted afterwards.
+        """
+        plan = self._plan(queryset.select_related('location', 'category')[:100])
+        assert_in(self.indexes[columns], plan)
+        assert_not_in('TEMP B-TREE', plan)
+
+    def test_by_location(self):
+        self._assert_indexed(
+            Event.objects.filter(location=self.location).order_by('id'),
+            ('location_id', 'id'))
+
+    def test_by_category(self):
+        self._assert_indexed(
+            Event.objects.filter(category=self.category).order_by('id'),
+            ('category_id', 'id'))
+
+    def test_by_location_and_category(self):
+        queryset = Event.objects.filter(location=self.location,
+                                        category=self.category).order_by('id')
+        self._assert_indexed(queryset, ('location_id', 'category_id', 'id'))
+
+    def test_order_by_location(self):
+        self._assert_indexed(Event.objects.order_by('location__name', 'id'),
+                             ('location_id', 'id'))
+
+    def test_order_by_category(self):
+        self._assert_indexed(Event.objects.order_by('category__name', 'id'),
+                             ('category_id', 'id'))
+
+    def test_by_location_order_by_category(self):
+        self._assert_indexed(Event.objects.filter(location=self.location)
+                             .order_by('category__name', 'id'),
+                             ('location_id', 'category_id', 'id'))
+
+    def test_by_category_order_by_location(self):
+        self._assert_indexed(Event.objects.filter(category=self.category)
+                             .order_by('location__name', 'id'),
+                             ('location_id', 'category_id', 'id'))
+
+    def test_shared_names(self):
+        """ Looking for duplicate names only has to read their index """
+        plan = self._plan(duplicates.shared(Location))
+        assert_in('COVERING INDEX', plan)
+        assert_not_in('TEMP B-TREE', plan)
+
+
+class SQLitePragmaTest(SimpleTestCase):
+    """ New SQLite connections should be set up with SQLITE_PRAGMAS """
+
+    class Wrapper(object):
+        """ Just enough of a database wrapper for `tune_sqlite` """
+        vendor = 'sqlite'
+
+        def __init__(self):
+            import sqlite3
+            self.connection = sqlite3.connect(':memory:')
+
+        def pragma(self, name):
+            return self.connection.execute('PRAGMA ' + name).fetchone()[0]
+
+    def _tuned(self):
+        from hoop_dev_test.data.connections import tune_sqlite
+        wrapper = self.Wrapper()
+        tune_sqlite(sender=self.Wrapper, connection=wrapper)
+        return wrapper
+
+    @override_settings(SQLITE_PRAGMAS={'synchronous': 'OFF',
+                                       'cache_size': -4096})
+    def test_pragmas(self):
+        wrapper = self._tuned()
+        assert_equal(wrapper.pragma('synchronous'), 0)
+        assert_equal(wrapper.pragma('cache_size'), -4096)
+
+    @override_settings(SQLITE_PRAGMAS={})
+    def test_none(self):
+        assert_equal(self._tuned().pragma('synchronous'),
+                     self.Wrapper().pragma('synchronous'))
+
+
+@skipUnless(connection.vendor == 'sqlite', "sqlite_master is SQLite's")
+class TriggerMigrationTest(TestCase):
+    """
+    Migrations run their own copies of the triggers' SQL (see sql.py), so
+    check that the latest copies are what the modules would install now
+    """
+    SCHEMA = ("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+              "OR name = 'data_event_search' ORDER BY name")
+
+    def _schema(self):
+        cursor = connection.cursor()
+        cursor.execute(self.SCHEMA)
+        return cursor.fetchall()
+
+    def test_up_to_date(self):
+        migrated = self._schema()
+        assert_equal(len(migrated), 12)
+        for module in counts, changes, search:
+            module.install(connection)
+        assert_equal(self._schema(), migrated)
+
+
+class FakeError(Exception):
+    pass
+
+
+class FakeConnection(object):
+    """ Just enough of a DB-API connection for `ConnectionPool` """
+
+    class Cursor(object):
+
+        def __init__(self, connection):
+            self.connection = connection
+
+        def execute(self, sql):
+            if not self.connection.alive:
+                raise FakeError("The database went away")
+            self.connection.checked += 1
+
+        def close(self):
+            pass
+
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.checked = 0
+
+    def cursor(self):
+        return self.Cursor(self)
+
+    def reset(self):
+        if not self.alive:
+            raise FakeError("The database went away")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """
+    The pool should hand out no more than its size, give up waiting for one
+    after its timeout, and check connections which have sat idle for a while.
+    """
+
+    def setUp(self):
+        self.made = []
+
+    def _connect(self):
+        self.made.append(FakeConnection())
+        return self.made[-1]
+
+    def _pool(self, size=2, **kwargs):
+        from hoop_dev_test.data.backends.pooled_postgresql.pool import (
+            ConnectionPool)
+        return ConnectionPool(size, self._connect, FakeError, **kwargs)
+
+    def test_reused(self):
+        pool = self._pool()
+        first = pool.get()
+        pool.put(first)
+        assert_equal(pool.get(), first)
+        assert_equal(len(self.made), 1)
+
+    def test_exhausted(self):
+        from django.db import OperationalError
+        pool = self._pool(size=1, timeout=0.05)
+        connection = pool.get()
+        assert_raises(OperationalError, pool.get)
+        pool.put(connection)
+        assert_equal(pool.get(), connection)
+
+    def test_waits(self):
+        from threading import Timer
+        pool = self._pool(size=1, timeout=5)
+        connection = pool.get()
+        Timer(0.05, pool.put, (connection,)).start()
+        assert_equal(pool.get(), connection)
+
+    def test_failed_connect(self):
+        """ A connection which couldn't be made doesn't count as in use """
+        pool = self._pool(size=1, timeout=0.05)
+
+        def fail():
+            raise FakeError("Can't connect")
+        pool.connect = fail
+        assert_raises(FakeError, pool.get)
+        pool.connect = self._connect
+        pool.get()
+
+    def test_broken_when_returned(self):
+        pool = self._pool()
+        connection = pool.get()
+        connection.alive = False
+        pool.put(connection)
+        assert_equal(connection.closed, True)
+        assert_equal(pool.get() is connection, False)
+
+    def test_checked_when_idle(self):
+        pool = self._pool(check_after=0)
+        connection = pool.get()
+        pool.put(connection)
+        assert_equal(pool.get(), connection)
+        assert_equal(connection.checked, 1)
+
+        pool.put(connection)
+        connection.alive = False  # While it sat in the pool
+        replacement = pool.get()
+        assert_equal(replacement is connection, False)
+        assert_equal(connection.closed, True)
+
+    def test_not_checked_when_recent(self):
+        pool = self._pool(check_after=60)
+        connection = pool.get()
+        pool.put(connection)
+        pool.get()
+        assert_equal(connection.checked, 0)
+
+
+class HealthCheckTest(SimpleTestCase):
+    """ Connections should only be checked once they've been idle a while """
+
+    class Wrapper(object):
+        """ Just enough of a database wrapper for `check` """
+
+        def __init__(self, idle, usable=True, checks=True):
+            from time import time
+            self.settings_dict = {'CONN_HEALTH_CHECKS': checks,
+                                  'CONN_HEALTH_CHECK_AFTER': 30}
+            self.connection = object()
+            self.idle_since = time() - idle
+            self.usable = usable
+            self.checked = 0
+
+        def is_usable(self):
+            self.checked += 1
+            return self.usable
+
+        def close(self):
+            self.connection = None
+
+    def _check(self, wrapper):
+        from hoop_dev_test.data.connections import check
+        check(wrapper)
+        return wrapper
+
+    def test_recent(self):
+        assert_equal(self._check(self.Wrapper(idle=1)).checked, 0)
+
+    def test_idle(self):
+        wrapper = self._check(self.Wrapper(idle=60))
+        assert_equal(wrapper.checked, 1)
+        assert_equal(wrapper.connection is None, False)
+
+    def test_dead(self):
+        wrapper = self._check(self.Wrapper(idle=60, usable=False))
+        assert_is_none(wrapper.connection)
+
+    def test_turned_off(self):
+        wrapper = self._check(self.Wrapper(idle=60, checks=False))
+        assert_equal(wrapper.checked, 0)
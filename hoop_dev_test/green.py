@@ -0,0 +1,31 @@
+"""
+A cooperative alternative to wsgi.py, for serving with gevent:
+
+    gunicorn hoop_dev_test.green:application -k gevent
+
+Each request runs in a greenlet rather than holding a whole worker, so clients
+which are slow to send their request or read the response - or views waiting on
+a slow query - only hold up themselves. The standard library is patched to
+yield to other greenlets whenever it would block, and so is psycopg2 (using
+psycogreen), so a request waiting on Postgres lets the others carry on. SQLite
+is called directly from C, so it still blocks the worker while it works.
+
+Each greenlet has a database connection of its own, so the number of
+connections to Postgres can grow to workers x --worker-connections - keep that
+below what the database allows.
+
+Django 1.7 (and Python 2) have no ASGI or async ORM, so this is how the read
+endpoints are served concurrently here - `manage.py loadtest` compares it with
+the plain worker.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+try:
+    from psycogreen.gevent import patch_psycopg
+except ImportError:  # Only needed for Postgres
+    pass
+else:
+    patch_psycopg()
+
+from hoop_dev_test.wsgi import application
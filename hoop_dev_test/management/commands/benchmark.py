@@ -0,0 +1,283 @@
+"""
+Measure the REST endpoints against realistic amounts of data - the tests only
+ever see the ten example events, so they won't notice anything getting slower.
+
+This builds a throwaway database (a temporary SQLite file, unless --database
+says where), fills it with synthetic events - growing it through each of the
+--sizes in turn - and then requests every endpoint, with every combination of
+the event list's filters and orderings, several times over. For each it records
+latency percentiles, how many queries were made and how far the process's peak
+memory grew, and writes it all out as JSON. Give an earlier run's output to
+--compare to see how the latencies have changed.
+
+    python manage.py benchmark --sizes 10000,100000 --output after.json \\
+        --compare before.json
+"""
+from __future__ import division
+
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from itertools import product
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.utils.six.moves.urllib.parse import urlencode
+
+from hoop_dev_test.data.models import Event, EventChange, Location, Category
+from hoop_dev_test.rest.pagination import CursorPaginator
+
+
+def _sizes(option, opt, value, parser):
+    try:
+        sizes = sorted(int(size) for size in value.split(','))
+    except ValueError:
+        raise CommandError("--sizes should be a list of numbers")
+    setattr(parser.values, option.dest, sizes)
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * len(ordered))))]
+
+
+def _peak_rss_kb():
+    """ The most memory this process has used so far (kB on Linux) """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Command(BaseCommand):
+    help = "Benchmark the REST endpoints against synthetic data"
+    option_list = BaseCommand.option_list + (
+        make_option('--sizes', type='string', action='callback',
+                    callback=_sizes, default=[10000, 100000, 1000000],
+                    help="Comma-separated numbers of events to test with"),
+        make_option('--locations', type='int', default=50,
+                    help="How many distinct locations to spread events over"),
+        make_option('--categories', type='int', default=10,
+                    help="How many distinct categories to spread events over"),
+        make_option('--repeat', type='int', default=20,
+                    help="How many times to request each URL"),
+        make_option('--repeat-whole', type='int', default=3,
+                    help="How many times to request URLs which return the "
+                         "whole catalogue (the export)"),
+        make_option('--database', default=None,
+                    help="SQLite file to build the data in (default: a "
+                         "temporary file, removed afterwards)"),
+        make_option('--output', default=None,
+                    help="Where to write the JSON results (default: stdout)"),
+        make_option('--compare', default=None,
+                    help="Results of an earlier run to compare against"),
+        make_option('--seed', type='int', default=0,
+                    help="Random seed for the synthetic data"),
+    )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.client = Client()
+
+        with self.database(options['database']):
+            with override_settings(REST_CACHE_TIMEOUT=0):
+                results = self.run(options)
+
+        output = json.dumps({
+            'meta': {
+                'sizes': options['sizes'],
+                'locations': options['locations'],
+                'categories': options['categories'],
+                'repeat': options['repeat'],
+                'repeat_whole': options['repeat_whole'],
+                'vendor': connection.vendor,
+                'python': sys.version.split()[0],
+            },
+            'results': results,
+        }, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.compare(json.load(f)['results'], results)
+
+    @staticmethod
+    @contextmanager
+    def database(path=None):
+        """ A throwaway database in `path`, or in a temporary file """
+        temporary = path is None
+        if temporary:
+            handle, path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(handle)
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict['TEST']['NAME'] = path
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                           serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if temporary and os.path.exists(path):
+                os.remove(path)
+
+    def populate(self, size, options):
+        """ Add synthetic events until there are `size` of them """
+        locations = list(Location.objects.values_list('id', flat=True))
+        if not locations:
+            Location.objects.bulk_create(
+                [Location(name='Location {0}'.format(i),
+                          normalized_name='location {0}'.format(i))
+                 for i in range(options['locations'])])
+            Category.objects.bulk_create(
+                [Category(name='Category {0}'.format(i),
+                          normalized_name='category {0}'.format(i))
+                 for i in range(options['categories'])])
+            locations = list(Location.objects.values_list('id', flat=True))
+        categories = list(Category.objects.values_list('id', flat=True))
+
+        start, batch = Event.objects.count(), 10000
+        for first in range(start, size, batch):
+            Event.objects.bulk_create([
+                Event(name='Event {0}'.format(i),
+                      location_id=self.random.choice(locations),
+                      category_id=self.random.choice(categories))
+                for i in range(first, min(first + batch, size))])
+        connection.cursor().execute('ANALYZE')
+
+    def urls(self, size):
+        """
+        Every endpoint, and every way of asking for the event list - along
+        with whether they return the whole catalogue rather than a page.
+        """
+        location = Location.objects.order_by('id')[0]
+        category = Category.objects.order_by('id')[0]
+        event = Event.objects.order_by('id')[size // 2]
+
+        yield 'api_root', '/rest/', {}, False
+        filters = [{}, {'location': location.name},
+                   {'category': category.name},
+                   {'location': location.name, 'category': category.name}]
+        orderings = [None, 'name', 'location', 'category', '-location']
+        for filter_by, order_by in product(filters, orderings):
+            params = dict(filter_by)
+            if order_by is not None:
+                params['order_by'] = order_by
+            yield 'event-list', '/rest/event/', params, False
+            cursor = dict(params, cursor='')
+            yield 'event-list-cursor', '/rest/event/', cursor, False
+
+        # Searching - for one event, and for every event in a location
+        for params in ({'q': str(size // 2)},
+                       {'q': 'event', 'location': location.name}):
+            yield 'event-list-search', '/rest/event/', params, False
+
+        # Facets - for the whole catalogue, and for a location's events
+        for params in ({'facets': 'location,category'},
+                       {'facets': 'category', 'location': location.name}):
+            yield 'event-list-facets', '/rest/event/', params, False
+
+        # Half way through the catalogue, by page number and by cursor
+        yield 'event-list', '/rest/event/', {'page': max(1, size // 200)}, False
+        paginator = CursorPaginator(Event.objects.all(), 'id', 1)
+        yield 'event-list-cursor', '/rest/event/', {
+            'cursor': paginator.encode(event, backwards=False)}, False
+
+        yield 'event-detail', '/rest/event/{0}/'.format(event.pk), {}, False
+        yield 'event-changes', '/rest/event/changes/', {
+            'since': EventChange.objects.order_by('-id')[0].id // 2}, False
+        yield 'event-export', '/rest/event/export/', {}, True
+        yield 'event-export', '/rest/event/export/', {
+            'location': location.name, 'order_by': 'category'}, True
+        for name in 'location', 'category':
+            yield name + '-list', '/rest/{0}/'.format(name), {}, False
+        yield ('location-detail',
+               '/rest/location/{0}/'.format(location.pk), {}, False)
+        yield ('category-detail',
+               '/rest/category/{0}/'.format(category.pk), {}, False)
+
+    def request(self, url):
+        response = self.client.get(url)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        if response.status_code != 200:
+            raise CommandError("{0} returned {1}".format(
+                url, response.status_code))
+
+    def measure(self, url, repeat):
+        # The captured queries are a slice of connection.queries, which the
+        # requests below replace - so they have to be counted straight away.
+        with CaptureQueriesContext(connection) as captured:
+            self.request(url)
+        queries = len(captured)
+
+        peak = _peak_rss_kb()
+        timings = []
+        for _ in range(repeat):
+            start = time.time()
+            self.request(url)
+            timings.append((time.time() - start) * 1000)
+        timings.sort()
+        return {
+            'queries': queries,
+            'peak_memory_growth_kb': _peak_rss_kb() - peak,
+            'latency_ms': {
+                'min': timings[0],
+                'p50': _percentile(timings, 0.5),
+                'p90': _percentile(timings, 0.9),
+                'p99': _percentile(timings, 0.99),
+                'max': timings[-1],
+                'mean': sum(timings) / len(timings),
+            },
+        }
+
+    def run(self, options):
+        results = []
+        for size in options['sizes']:
+            self.stderr.write("Generating {0} events...".format(size))
+            self.populate(size, options)
+            for endpoint, path, params, whole in self.urls(size):
+                url = path + ('?' + urlencode(params) if params else '')
+                self.stderr.write("  {0}".format(url))
+                result = self.measure(url, options['repeat_whole'] if whole
+                                      else options['repeat'])
+                result.update(size=size, endpoint=endpoint, path=path,
+                              params=params)
+                results.append(result)
+        return results
+
+    @staticmethod
+    def _key(result):
+        params = dict(result['params'])
+        if params.get('cursor'):  # Cursors differ between runs
+            params['cursor'] = '...'
+        return (result['size'], result['endpoint'],
+                json.dumps(params, sort_keys=True))
+
+    def compare(self, before, after):
+        """ Print how each p50 latency changed since an earlier run """
+        before = dict((self._key(result), result) for result in before)
+        self.stderr.write("{0:>9} {1:<20} {2:<45} {3:>9} {4:>9} {5:>7}".format(
+            'events', 'endpoint', 'params', 'before', 'after', 'ratio'))
+        for result in after:
+            old = before.get(self._key(result))
+            if old is None:
+                continue
+            was, now = old['latency_ms']['p50'], result['latency_ms']['p50']
+            self.stderr.write(
+                "{0:>9} {1:<20} {2:<45} {3:>8.1f}ms {4:>7.1f}ms {5:>6.2f}x"
+                .format(result['size'], result['endpoint'],
+                        self._key(result)[2][:45], was, now,
+                        now / was if was else 0))
@@ -0,0 +1,62 @@
+"""
+What compressing responses (see hoop_dev_test/rest/compression.py) saves in
+bandwidth and costs in CPU. Like `benchmark_formats`, this builds a throwaway
+database of synthetic events and fetches everything `benchmark` would
+request - this time including the export, which grows with the catalogue -
+then compresses each response with each encoding, at the configured levels,
+over and over. For each it reports the size before and after and the mean
+time taken to compress.
+
+    python manage.py benchmark_compression --sizes 1000,10000,100000
+
+brotli is only measured if it's installed.
+"""
+from __future__ import division
+
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from hoop_dev_test.rest import compression
+from . import benchmark, benchmark_formats
+
+
+class Command(benchmark_formats.Command):
+    help = "Measure the bandwidth and CPU cost of compressing responses"
+    pages_only = False
+    option_list = BaseCommand.option_list + tuple(
+        option for option in benchmark.Command.option_list
+        if option.dest in ('sizes', 'locations', 'categories', 'repeat',
+                           'repeat_whole', 'database', 'output', 'seed'))
+
+    @staticmethod
+    def meta(options):
+        return {
+            'sizes': options['sizes'],
+            'repeat': options['repeat'],
+            'repeat_whole': options['repeat_whole'],
+            'python': sys.version.split()[0],
+            'gzip_level': getattr(settings, 'REST_GZIP_LEVEL', 6),
+            'brotli_quality': (getattr(settings, 'REST_BROTLI_QUALITY', 5)
+                               if compression.brotli is not None else None),
+            'min_size': getattr(settings, 'REST_COMPRESSION_MIN_SIZE', 1024),
+        }
+
+    def measure(self, url, repeat):
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+        else:
+            content = response.content
+        result = {'bytes': len(content)}
+        for encoding, compress in compression.encodings():
+            compressed = compress(content)
+            milliseconds = benchmark_formats.mean_ms(repeat, compress, content)
+            result[encoding] = {
+                'bytes': len(compressed),
+                'ratio': len(compressed) / len(content),
+                'compress_ms': milliseconds,
+                'mb_per_s': len(content) / 1000 / milliseconds,
+            }
+        return result
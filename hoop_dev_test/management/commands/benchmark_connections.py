@@ -0,0 +1,98 @@
+"""
+How much each request spends connecting to the database - this makes requests
+through the whole WSGI stack (so connections are opened and closed just as
+they would be by a server) against the configured database, first closing the
+connection after every request and then keeping it, and reports the latency
+of each. On SQLite it also compares with and without SQLITE_PRAGMAS; with the
+pooled Postgres backend, "closing" the connection gives it back to the pool.
+
+    python manage.py benchmark_connections --requests 1000
+
+Use a database with some events in it (see `manage.py seed`) - the response
+cache is turned off, so every request reaches the database.
+"""
+from __future__ import division
+
+import json
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * len(ordered))))]
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-request database connection overhead"
+    option_list = BaseCommand.option_list + (
+        make_option('--requests', type='int', default=500,
+                    help="How many requests to make with each configuration"),
+        make_option('--path', default='/rest/event/?location=London',
+                    help="What to request"),
+    )
+
+    def configurations(self):
+        """ (name, CONN_MAX_AGE, SQLITE_PRAGMAS) to try """
+        pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+        yield 'close after each request', 0, pragmas
+        yield 'persistent', 600, pragmas
+        if connection.vendor == 'sqlite' and pragmas:
+            yield 'close after each request, default pragmas', 0, {}
+            yield 'persistent, default pragmas', 600, {}
+
+    def handle(self, *args, **options):
+        handler = WSGIHandler()
+        path, _, query = options['path'].partition('?')
+        factory = RequestFactory()
+
+        def request():
+            environ = factory.get(path, QUERY_STRING=query).environ
+            response = handler(environ, lambda status, headers: None)
+            for _ in response:
+                pass
+            response.close()  # Sends request_finished, as a server would
+
+        results = []
+        max_age = connection.settings_dict['CONN_MAX_AGE']
+        try:
+            for name, age, pragmas in self.configurations():
+                connection.close()
+                connection.settings_dict['CONN_MAX_AGE'] = age
+                with override_settings(REST_CACHE_TIMEOUT=0,
+                                       SQLITE_PRAGMAS=pragmas):
+                    request()  # Warm up
+                    timings = []
+                    for _ in range(options['requests']):
+                        started = time.time()
+                        request()
+                        timings.append((time.time() - started) * 1000)
+                timings.sort()
+                results.append({
+                    'configuration': name,
+                    'conn_max_age': age,
+                    'sqlite_pragmas': pragmas,
+                    'latency_ms': {
+                        'p50': _percentile(timings, 0.5),
+                        'p90': _percentile(timings, 0.9),
+                        'p99': _percentile(timings, 0.99),
+                        'mean': sum(timings) / len(timings),
+                    },
+                })
+        finally:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+        self.stdout.write(json.dumps({
+            'vendor': connection.vendor,
+            'engine': connection.settings_dict['ENGINE'],
+            'path': options['path'],
+            'requests': options['requests'],
+            'results': results,
+        }, indent=2, sort_keys=True))
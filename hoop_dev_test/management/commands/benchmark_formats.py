@@ -0,0 +1,109 @@
+"""
+How MessagePack compares with JSON for full pages of the REST API. Like
+`benchmark`, this builds a throwaway database of synthetic events, then
+fetches each page it would request and renders what the view returned with
+each renderer - and decodes the result - over and over. The size of each and
+the mean time taken to encode and decode are written out as JSON.
+
+    python manage.py benchmark_formats --sizes 10000 --repeat 200
+
+The export is left out - it covers the whole catalogue, rather than a page.
+"""
+from __future__ import division
+
+import json
+import random
+import sys
+import time
+
+import msgpack
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils.six.moves.urllib.parse import urlencode
+from rest_framework.renderers import JSONRenderer
+
+from hoop_dev_test.rest.renderers import MessagePackRenderer
+from . import benchmark
+
+FORMATS = (
+    ('json', JSONRenderer(),
+     lambda content: json.loads(content.decode('utf-8'))),
+    ('msgpack', MessagePackRenderer(),
+     lambda content: msgpack.unpackb(content, raw=False)),
+)
+
+
+def mean_ms(repeat, function, *args):
+    started = time.time()
+    for _ in range(repeat):
+        function(*args)
+    return (time.time() - started) * 1000 / repeat
+
+
+class Command(benchmark.Command):
+    help = "Compare the size and speed of JSON and MessagePack pages"
+    pages_only = True
+    option_list = BaseCommand.option_list + tuple(
+        option for option in benchmark.Command.option_list
+        if option.dest in ('sizes', 'locations', 'categories', 'repeat',
+                           'database', 'output', 'seed'))
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.client = Client()
+        with self.database(options['database']):
+            with override_settings(REST_CACHE_TIMEOUT=0):
+                results = self.run(options)
+
+        output = json.dumps({
+            'meta': self.meta(options),
+            'results': results,
+        }, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    def meta(options):
+        return {
+            'sizes': options['sizes'],
+            'repeat': options['repeat'],
+            'python': sys.version.split()[0],
+            'msgpack': '.'.join(str(part) for part in msgpack.version),
+        }
+
+    def run(self, options):
+        results = []
+        for size in options['sizes']:
+            self.stderr.write("Generating {0} events...".format(size))
+            self.populate(size, options)
+            for endpoint, path, params, whole in self.urls(size):
+                if whole and self.pages_only:
+                    continue
+                url = path + ('?' + urlencode(params) if params else '')
+                self.stderr.write("  {0}".format(url))
+                result = self.measure(url, options['repeat_whole'] if whole
+                                      else options['repeat'])
+                result.update(size=size, endpoint=endpoint, path=path,
+                              params=params)
+                results.append(result)
+        return results
+
+    def measure(self, url, repeat):
+        data = self.client.get(url, HTTP_ACCEPT='application/json').data
+        result = {}
+        for name, renderer, decode in FORMATS:
+            content = renderer.render(data, renderer.media_type)
+            result[name] = {
+                'bytes': len(content),
+                'encode_ms': mean_ms(repeat, renderer.render, data,
+                                      renderer.media_type),
+                'decode_ms': mean_ms(repeat, decode, content),
+            }
+        result['msgpack_vs_json'] = dict(
+            (key, result['msgpack'][key] / result['json'][key])
+            for key in ('bytes', 'encode_ms', 'decode_ms'))
+        return result
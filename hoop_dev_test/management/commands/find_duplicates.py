@@ -0,0 +1,36 @@
+"""
+List locations and categories whose names only differ by capitalisation and
+spacing - see `hoop_dev_test.data.duplicates`. Each group is listed with the
+one which has the most events first, and with '--merge' the rest are merged
+into it, just as POSTing to its merge/ would.
+
+    python manage.py find_duplicates --merge
+"""
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from hoop_dev_test.data import duplicates
+from hoop_dev_test.data.models import Location, Category
+
+
+class Command(NoArgsCommand):
+    help = "Find (and optionally merge) duplicate locations and categories"
+    option_list = NoArgsCommand.option_list + (
+        make_option('--merge', action='store_true', default=False,
+                    help="Merge each group into its first"),
+    )
+
+    def handle_noargs(self, **options):
+        for model in Location, Category:
+            label = model._meta.verbose_name
+            # Found in full before merging any, rather than deleting rows
+            # from under the query
+            for group in list(duplicates.find(model)):
+                self.stdout.write(u"{0}: {1}".format(label, ', '.join(
+                    u"'{0}' ({1} events)".format(obj.name, obj.num_events)
+                    for obj in group)))
+                if options['merge']:
+                    moved = duplicates.merge(group[0], group[1:])
+                    self.stdout.write(u"  merged into '{0}', moving {1} "
+                                      u"events".format(group[0].name, moved))
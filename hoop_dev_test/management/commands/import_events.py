@@ -0,0 +1,60 @@
+"""
+Load events from a file (or stdin, given '-') - either a JSON list of events or
+newline-delimited JSON, one event per line, in the same shape you'd POST to the
+event list. This is the command line version of /rest/event/bulk/ - see
+`hoop_dev_test.data.bulk`.
+"""
+import io
+import json
+import sys
+from itertools import chain
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hoop_dev_test.data import bulk
+from hoop_dev_test.rest.parsers import NDJSONParser
+
+
+class Command(BaseCommand):
+    args = '<file>'
+    help = "Import events from a JSON or newline-delimited JSON file"
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int',
+                    default=bulk.DEFAULT_BATCH_SIZE,
+                    help="How many events to insert at a time"),
+    )
+
+    @staticmethod
+    def _rows(stream):
+        """
+        A JSON list has to be read whole, but NDJSON is read line by line - we
+        can tell which we've got from the first character.
+        """
+        first = stream.read(1)
+        while first.isspace():
+            first = stream.read(1)
+        if first == '[':
+            try:
+                return json.loads(first + stream.read())
+            except ValueError as exc:
+                raise CommandError("Invalid JSON: {0}".format(exc))
+        lines = chain([first + stream.readline()], stream)
+        return NDJSONParser.rows(lines, 'utf-8')
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Usage: import_events {0}".format(self.args))
+        if args[0] == '-':
+            stream = io.open(sys.stdin.fileno(), encoding='utf-8',
+                             closefd=False)
+        else:
+            stream = io.open(args[0], encoding='utf-8')
+
+        with stream:
+            result = bulk.ingest(self._rows(stream), options['batch_size'])
+
+        for error in result.errors:
+            self.stderr.write("Row {row}: {error}".format(**error))
+        self.stdout.write("Created {0} events ({1} errors)".format(
+            result.created, len(result.errors)))
@@ -0,0 +1,145 @@
+"""
+How many requests a running server can answer while slow clients are connected
+to it - for comparing a plain gunicorn worker (hoop_dev_test.wsgi) with a
+gevent one (hoop_dev_test.green):
+
+    gunicorn hoop_dev_test.wsgi -w 2 -b 127.0.0.1:8001 &
+    gunicorn hoop_dev_test.green:application -k gevent -w 2 \\
+        -b 127.0.0.1:8002 &
+    python manage.py loadtest http://127.0.0.1:8001 --output sync.json
+    python manage.py loadtest http://127.0.0.1:8002 --output green.json
+
+Some clients (--slow-clients) connect and send their request headers a line at
+a time, --slow-interval seconds apart, never finishing - meanwhile the others
+(--clients) request the read endpoints as fast as they are answered. The
+throughput and latency of the fast clients are reported as JSON.
+"""
+from __future__ import division
+
+import json
+import socket
+import threading
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.six.moves import http_client
+from django.utils.six.moves.urllib.parse import urlsplit
+
+PATHS = ('/rest/', '/rest/event/', '/rest/event/?order_by=location',
+         '/rest/location/', '/rest/category/')
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(fraction * len(ordered))))]
+
+
+class Command(BaseCommand):
+    args = '<base url>'
+    help = "Measure a running server's throughput while slow clients connect"
+    option_list = BaseCommand.option_list + (
+        make_option('--clients', type='int', default=10,
+                    help="How many clients make requests as fast as they can"),
+        make_option('--slow-clients', type='int', default=50,
+                    help="How many clients trickle their requests in"),
+        make_option('--slow-interval', type='float', default=1.0,
+                    help="Seconds between each line a slow client sends"),
+        make_option('--duration', type='float', default=10.0,
+                    help="How many seconds to run for"),
+        make_option('--timeout', type='float', default=30.0,
+                    help="Seconds to wait for a response before giving up"),
+        make_option('--paths', default=','.join(PATHS),
+                    help="Comma-separated paths for the fast clients"),
+        make_option('--output', default=None,
+                    help="Where to write the JSON results (default: stdout)"),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Give the base url of the server to test")
+        url = urlsplit(args[0])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError("Expected a url like http://127.0.0.1:8000")
+        self.host, self.port = url.hostname, url.port or 80
+        self.options = options
+        self.paths = [path for path in options['paths'].split(',') if path]
+        self.deadline = time.time() + options['duration']
+        self.lock = threading.Lock()
+        self.latencies, self.errors = [], 0
+
+        threads = [threading.Thread(target=self.slow_client)
+                   for _ in range(options['slow_clients'])]
+        threads += [threading.Thread(target=self.fast_client, args=(i,))
+                    for i in range(options['clients'])]
+        started = time.time()
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+
+        latencies = sorted(self.latencies)
+        output = json.dumps({
+            'url': args[0],
+            'clients': options['clients'],
+            'slow_clients': options['slow_clients'],
+            'duration_s': elapsed,
+            'requests': len(latencies),
+            'errors': self.errors,
+            'requests_per_s': len(latencies) / elapsed,
+            'latency_ms': {
+                'p50': _percentile(latencies, 0.5),
+                'p90': _percentile(latencies, 0.9),
+                'p99': _percentile(latencies, 0.99),
+                'max': latencies[-1] if latencies else None,
+            },
+        }, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+    def slow_client(self):
+        """ Trickle in an endless request until the test is over """
+        try:
+            sock = socket.create_connection((self.host, self.port),
+                                            self.options['timeout'])
+        except socket.error:
+            return
+        try:
+            sock.sendall(b'GET /rest/ HTTP/1.1\r\nHost: loadtest\r\n')
+            i = 0
+            while time.time() < self.deadline:
+                time.sleep(self.options['slow_interval'])
+                sock.sendall('X-Slow-{0}: yes\r\n'.format(i).encode('ascii'))
+                i += 1
+        except socket.error:  # The server gave up on us
+            pass
+        finally:
+            sock.close()
+
+    def fast_client(self, i):
+        while time.time() < self.deadline:
+            path = self.paths[i % len(self.paths)]
+            i += 1
+            started = time.time()
+            try:
+                connection = http_client.HTTPConnection(
+                    self.host, self.port, timeout=self.options['timeout'])
+                connection.request('GET', path,
+                                   headers={'Accept': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                connection.close()
+                ok = response.status == 200
+            except (socket.error, http_client.HTTPException):
+                ok = False
+            with self.lock:
+                if ok:
+                    self.latencies.append((time.time() - started) * 1000)
+                else:
+                    self.errors += 1
@@ -0,0 +1,15 @@
+"""
+Pre-seed the database with the example events - this used to be checked on
+every request, but it only needs doing once, so it now happens at startup (see
+wsgi.py) or when this command is run.
+"""
+from django.core.management.base import NoArgsCommand
+
+from hoop_dev_test.test_data import TestData
+
+
+class Command(NoArgsCommand):
+    help = "Add the example events to the database if they aren't there"
+
+    def handle_noargs(self, **options):
+        TestData().create_all()
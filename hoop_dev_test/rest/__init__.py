@@ -21,4 +21,5 @@ Seeing as it was simple and easy I have added endpoints representing locations
 and categories so you can see how many events each has, and if you follow the
 url to an individual location or category you will see a list of the events for
 said location or category.
-"""
\ No newline at end of file
+"""
+default_app_config = 'hoop_dev_test.rest.apps.RestConfig'
\ No newline at end of file
@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
+
+
+class RestConfig(AppConfig):
+    name = 'hoop_dev_test.rest'
+    label = 'rest'
+
+    def ready(self):
+        """ Any write to our models makes the cached responses stale """
+        from hoop_dev_test.data import bulk
+        from hoop_dev_test.data.models import Event, Location, Category
+        from hoop_dev_test.rest import cache
+        for model in Event, Location, Category:
+            post_save.connect(cache.invalidate, sender=model)
+            post_delete.connect(cache.invalidate, sender=model)
+        bulk.ingested.connect(cache.invalidate)
@@ -0,0 +1,158 @@
+"""
+Nearly all of our traffic is anonymous GETs of the lists, which only change
+when someone writes to an event, location or category - so we keep the
+rendered lists, along with their headers, in Django's cache (local memory
+unless configured otherwise).
+
+Cache keys are made up of the scheme, host and path (the lists link to
+themselves with absolute urls), the query string (sorted, so that the order of
+the parameters doesn't matter), the media type being rendered and a
+"generation" which is counted up whenever anything is written - that way
+invalidating everything is a single write rather than a hunt for keys. The
+generation is kept in the database (see `CacheGeneration`), so a write made by
+any process invalidates every process's cache, and each process remembers it
+for REST_CACHE_GENERATION_TTL seconds rather than reading it for every
+request. The same key doubles as the ETag, so a client which sends it back in
+If-None-Match gets a 304 without the database being touched at all (unless
+it's time to read the generation again).
+
+Compressed responses are cached too (see `compressed` and compression.py),
+under the ETag of the response they compress - which changes with the content,
+so they need no invalidating.
+
+Writes are picked up from model signals, and from bulk imports' `ingested`
+(see `apps.py`) - anything else which skips them, such as QuerySet.update(),
+must call `invalidate`.
+"""
+from functools import wraps
+from hashlib import md5
+from threading import Lock
+from time import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+
+from hoop_dev_test.data.routers import PRIMARY
+from .instrumentation import timed
+from .models import CacheGeneration
+
+_generation_lock = Lock()
+_known = {'generation': None, 'expires': 0}  # What we last read of it
+
+
+def _cache():
+    return caches[getattr(settings, 'REST_CACHE', 'default')]
+
+
+def _generation():
+    """
+    The current generation - read from the primary, as a replica could be
+    behind, and then remembered for a while.
+    """
+    with _generation_lock:
+        if _known['expires'] > time():
+            return _known['generation']
+    generation = CacheGeneration.objects.using(PRIMARY).get_or_create(
+        pk=1)[0].value
+    ttl = getattr(settings, 'REST_CACHE_GENERATION_TTL', 1)
+    with _generation_lock:
+        _known.update(generation=generation, expires=time() + ttl)
+    return generation
+
+
+def invalidate(**kwargs):
+    """
+    Start a new generation - everything cached so far is forgotten. This
+    doubles as a signal receiver, hence the kwargs.
+
+    We don't remember the new generation ourselves, but read it again: until
+    the write is committed, other requests can't see it, and whatever they
+    cache belongs with the old generation.
+    """
+    CacheGeneration.objects.using(PRIMARY).filter(pk=1).update(
+        value=F('value') + 1)
+    with _generation_lock:
+        _known['expires'] = 0
+
+
+def _cache_key(request):
+    params = sorted((key, value) for key in request.QUERY_PARAMS
+                    for value in request.QUERY_PARAMS.getlist(key))
+    parts = [request.scheme, request.get_host(), request.path, repr(params),
+             request.accepted_media_type, str(_generation())]
+    return md5('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _cacheable(request):
+    return (request.method in ('GET', 'HEAD') and
+            not request.user.is_authenticated())
+
+
+def cache_response(method):
+    """
+    Decorate a ViewSet method (such as `list`) whose response should be cached
+    for anonymous users, for REST_CACHE_TIMEOUT seconds (0 disables it).
+    """
+    @wraps(method)
+    def _inner(self, request, *args, **kwargs):
+        timeout = getattr(settings, 'REST_CACHE_TIMEOUT', 0)
+        if not timeout or not _cacheable(request):
+            return method(self, request, *args, **kwargs)
+
+        key = _cache_key(request)
+        # Weak, as it's shared by the compressed versions (see compression.py)
+        # - a 304 has to say the same as the 200 did.
+        etag = 'W/' + quote_etag(key)
+        if key in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        cached = _cache().get('rest:response:' + key)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content)
+            for header, value in headers:
+                response[header] = value
+            response['ETag'] = etag
+            return response
+
+        response = method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            # Render it now rather than leave it to finalize_response, so that
+            # we have something to put in the cache.
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            with timed(request, 'serialize'):
+                response.render()
+            # Along with what the view will add - Vary: Accept, above all, as
+            # each media type has its own key
+            headers = dict(self.headers)
+            headers.update(response.items())
+            _cache().set('rest:response:' + key,
+                         (response.content, sorted(headers.items())),
+                         timeout)
+            response['ETag'] = etag
+        return response
+    return _inner
+
+
+def compressed(etag, encoding, compress, content):
+    """
+    `compress(content)`, remembered for REST_CACHE_TIMEOUT seconds - `etag`
+    must identify `content`.
+    """
+    timeout = getattr(settings, 'REST_CACHE_TIMEOUT', 0)
+    if not timeout:
+        return compress(content)
+    key = 'rest:compressed:{0}:{1}'.format(
+        encoding, md5(etag.encode('utf-8')).hexdigest())
+    result = _cache().get(key)
+    if result is None:
+        result = compress(content)
+        _cache().set(key, result, timeout)
+    return result
@@ -0,0 +1,147 @@
+"""
+A page of the event list is tens of kilobytes of JSON, and the location and
+category details grow with the number of events - but it's all very
+repetitive, so it compresses well.
+
+`CompressionMiddleware` compresses responses of at least
+REST_COMPRESSION_MIN_SIZE bytes (smaller ones aren't worth the CPU) for
+clients which accept it - with brotli, if the `brotli` package is installed
+and the client accepts 'br', otherwise with gzip. Streamed responses (such as
+the export) are gzipped as they go.
+
+Only the API's own media types (`COMPRESSED_TYPES`) are compressed. The
+browsable API's HTML isn't: for someone logged in it holds their CSRF token
+alongside whatever they put in the query string, which is just what the BREACH
+attack needs to guess the token from the compressed sizes. Nor are server-sent
+events, which would be held back until enough of them had built up to
+compress.
+
+The responses cached by cache.py carry a (weak) ETag which identifies their
+content, so their compressed versions are cached under it (see `cache.compressed`) -
+serving one from the cache costs no compression at all. `manage.py
+benchmark_compression` measures what compression saves, and costs, for each
+page.
+"""
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import cache
+from .instrumentation import timed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_TYPES = ('application/json', 'application/x-ndjson',
+                    'application/msgpack')
+
+_ENCODING = re.compile(r'^\s*([^\s;]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def accepted_encodings(header):
+    """ The encodings an Accept-Encoding header allows (those with q > 0) """
+    encodings = set()
+    for part in header.split(','):
+        match = _ENCODING.match(part)
+        if match is None:
+            continue
+        encoding, quality = match.groups()
+        try:
+            if quality is None or float(quality) > 0:
+                encodings.add(encoding.lower())
+        except ValueError:
+            continue
+    return encodings
+
+
+def _gzip_compressor():
+    level = getattr(settings, 'REST_GZIP_LEVEL', 6)
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def gzip(content):
+    compressor = _gzip_compressor()
+    return compressor.compress(content) + compressor.flush()
+
+
+def gzip_sequence(sequence):
+    """
+    Gzip a streamed response lazily - unlike Django's `compress_sequence` this
+    doesn't flush after each chunk, which would cost a few bytes for each of
+    the export's many small chunks.
+    """
+    compressor = _gzip_compressor()
+    for chunk in sequence:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def br(content):
+    return brotli.compress(content,
+                           quality=getattr(settings, 'REST_BROTLI_QUALITY', 5))
+
+
+def encodings():
+    """ (name, compress) for each encoding we can use, best first """
+    if brotli is not None:
+        yield 'br', br
+    yield 'gzip', gzip
+
+
+class CompressionMiddleware(object):
+    """
+    Compress responses - this should come early in MIDDLEWARE_CLASSES (just
+    after InstrumentationMiddleware), so that it compresses what the other
+    middleware have finished with.
+    """
+
+    @staticmethod
+    def process_response(request, response):
+        media_type = response.get('Content-Type', '').split(';')[0].strip()
+        if (response.has_header('Content-Encoding') or
+                media_type not in COMPRESSED_TYPES):
+            return response
+        min_size = getattr(settings, 'REST_COMPRESSION_MIN_SIZE', 1024)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if response.streaming:
+            if 'gzip' not in accepted:
+                return response
+            encoding = 'gzip'
+            response.streaming_content = gzip_sequence(
+                response.streaming_content)
+            del response['Content-Length']
+        else:
+            for encoding, compress in encodings():
+                if encoding in accepted:
+                    break
+            else:
+                return response
+            with timed(request, 'compress'):
+                if response.has_header('ETag'):
+                    content = cache.compressed(response['ETag'], encoding,
+                                               compress, response.content)
+                else:
+                    content = compress(response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        # The ETag identifies the uncompressed content, which the compressed
+        # content only matches semantically. (cache.py's already are weak.)
+        etag = response.get('ETag', '')
+        if etag and not etag.startswith('W/'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
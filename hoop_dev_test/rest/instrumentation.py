@@ -0,0 +1,278 @@
+"""
+Where does the time go in a request? `InstrumentationMiddleware` records, for
+every request, how many SQL queries were made and how long they took, how long
+the response took to render (serialize) and to compress (see compression.py)
+and how long the whole thing took.
+
+These are sent back to the client in a `Server-Timing` header - so they show up
+in the browser's developer tools - and are added to per-view histograms, which
+staff can read from [/rest/_stats/](/rest/_stats/). The histograms belong to
+the process, so with several workers each one reports only what it has seen.
+
+Any query slower than REST_SLOW_QUERY_MS milliseconds (None to turn this off)
+is logged to the 'hoop_dev_test.rest.slow_queries' logger as a warning.
+
+Queries are timed by wrapping each connection's cursors in a `TimedCursor` for
+the length of each request - Django's debug cursor would do, but it keeps
+every query's SQL (with its parameters filled in) in a list which grows for as
+long as the request goes on, which is more than monitoring should cost.
+Streamed responses (such as the export) do most of their work after the
+middleware has finished, so only what happens beforehand is counted.
+"""
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from time import time
+import logging
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('hoop_dev_test.rest.slow_queries')
+
+# Upper bounds of the histogram buckets - anything larger goes in a last one
+MILLISECONDS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERIES = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram(object):
+    """ Counts of values falling into buckets with the given upper bounds """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def percentile(self, fraction):
+        """
+        The upper bound of the bucket holding the `fraction` percentile - or,
+        if that's the last bucket, which has none, its label ('>10000', say).
+        None means there's nothing to go on.
+        """
+        rank, seen = fraction * sum(self.counts), 0
+        overflow = '>{0}'.format(self.bounds[-1])
+        for bound, count in zip(self.bounds + (overflow,), self.counts):
+            seen += count
+            if count and seen >= rank:
+                return bound
+
+    @property
+    def to_dict(self):
+        count = sum(self.counts)
+        labels = ['<={0}'.format(bound) for bound in self.bounds]
+        labels.append('>{0}'.format(self.bounds[-1]))  # As in `percentile`
+        return OrderedDict([
+            ('count', count),
+            ('mean', self.total / float(count) if count else None),
+            ('p50', self.percentile(0.5)),
+            ('p90', self.percentile(0.9)),
+            ('p99', self.percentile(0.99)),
+            ('buckets', OrderedDict(zip(labels, self.counts))),
+        ])
+
+
+class Stats(object):
+    """ Histograms of each measurement, for each view """
+    measurements = OrderedDict([
+        ('queries', QUERIES),
+        ('db', MILLISECONDS),
+        ('serialize', MILLISECONDS),
+        ('compress', MILLISECONDS),
+        ('total', MILLISECONDS),
+    ])
+
+    def __init__(self):
+        self._views = {}
+        self._lock = Lock()
+
+    def add(self, view, metrics):
+        with self._lock:
+            histograms = self._views.get(view, None)
+            if histograms is None:
+                histograms = self._views[view] = OrderedDict(
+                    (name, Histogram(bounds))
+                    for name, bounds in self.measurements.items())
+            for name, histogram in histograms.items():
+                histogram.add(getattr(metrics, name))
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    @property
+    def to_dict(self):
+        with self._lock:
+            return OrderedDict(
+                (view, OrderedDict((name, histogram.to_dict)
+                                   for name, histogram in histograms.items()))
+                for view, histograms in sorted(self._views.items()))
+
+
+stats = Stats()
+
+
+class RequestMetrics(object):
+    """ What one request has cost so far - times are in milliseconds """
+
+    def __init__(self):
+        self.started = time()
+        self.view = None
+        self.path = None
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.compress = 0.0
+        self.total = 0.0
+
+    def query(self, started, sql, params):
+        """ Count a query which started at `started`, and has just finished """
+        elapsed = (time() - started) * 1000
+        self.queries += 1
+        self.db += elapsed
+        threshold = getattr(settings, 'REST_SLOW_QUERY_MS', None)
+        if threshold is not None and elapsed >= threshold:
+            logger.warning("%.1fms in %s: %s; args=%r", elapsed,
+                           self.view or self.path, sql, params)
+
+    @property
+    def server_timing(self):
+        return ', '.join([
+            'db;dur={0:.3f};desc="{1} queries"'.format(self.db, self.queries),
+            'serialize;dur={0:.3f}'.format(self.serialize),
+            'compress;dur={0:.3f}'.format(self.compress),
+            'total;dur={0:.3f}'.format(self.total),
+        ])
+
+
+class TimedCursor(object):
+    """ Adds the queries made through `cursor` to `metrics` """
+
+    def __init__(self, cursor, metrics):
+        self.cursor = cursor
+        self.metrics = metrics
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.cursor.__exit__(exc_type, exc_value, traceback)
+
+    def execute(self, sql, params=None):
+        started = time()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            self.metrics.query(started, sql, params)
+
+    def executemany(self, sql, param_list):
+        started = time()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            self.metrics.query(started, sql, None)
+
+
+class TimedConnection(object):
+    """
+    Has a connection time its queries into its `request_metrics`, whenever it
+    has some - connections belong to a thread, so these are the metrics of the
+    thread's current request.
+    """
+    request_metrics = None
+
+    def cursor(self):
+        cursor = super(TimedConnection, self).cursor()
+        if self.request_metrics is None:
+            return cursor
+        return TimedCursor(cursor, self.request_metrics)
+
+
+_timed_classes = {}
+
+
+def _instrument(connection):
+    """
+    Mix `TimedConnection` into `connection`. I change its class rather than
+    patching the one instance, so that copies of it time their own queries.
+    """
+    cls = type(connection)
+    if issubclass(cls, TimedConnection):
+        return
+    if cls not in _timed_classes:
+        _timed_classes[cls] = type(cls.__name__, (TimedConnection, cls), {})
+    connection.__class__ = _timed_classes[cls]
+
+
+def _metrics(request):
+    """ The metrics for a Django or REST framework request, if any """
+    return getattr(getattr(request, '_request', request), '_metrics', None)
+
+
+@contextmanager
+def timed(request, name):
+    """ Add the time taken by the body to `request`'s `name` measurement """
+    metrics, started = _metrics(request), time()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            elapsed = (time() - started) * 1000
+            setattr(metrics, name, getattr(metrics, name) + elapsed)
+
+
+class InstrumentationMiddleware(object):
+    """
+    Measure each request - this should come first in MIDDLEWARE_CLASSES, so
+    that the total includes the other middleware.
+    """
+
+    @staticmethod
+    def process_request(request):
+        metrics = request._metrics = RequestMetrics()
+        metrics.path = request.path
+        for connection in connections.all():
+            _instrument(connection)
+            connection.request_metrics = metrics
+
+    @staticmethod
+    def process_view(request, view_func, view_args, view_kwargs):
+        request._metrics.view = request.resolver_match.view_name
+
+    @staticmethod
+    def process_template_response(request, response):
+        """ Time the rendering, which happens once we've returned """
+        metrics = _metrics(request)
+        if metrics is not None:
+            started = time()
+
+            def rendered(response):
+                metrics.serialize += (time() - started) * 1000
+            response.add_post_render_callback(rendered)
+        return response
+
+    @classmethod
+    def process_response(cls, request, response):
+        metrics = _metrics(request)
+        if metrics is None:  # An earlier middleware answered the request
+            return response
+
+        for connection in connections.all():
+            if getattr(connection, 'request_metrics', None) is metrics:
+                connection.request_metrics = None
+
+        metrics.total = (time() - metrics.started) * 1000
+        response['Server-Timing'] = metrics.server_timing
+        if metrics.view is not None:
+            stats.add(metrics.view, metrics)
+        return response
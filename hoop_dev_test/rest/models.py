@@ -0,0 +1,11 @@
+"""
+The REST API's own state - just the response cache's generation (see
+cache.py), which is kept in the database so that a write made by any process
+reaches all of them.
+"""
+from django.db import models
+
+
+class CacheGeneration(models.Model):
+    """ A single row, counting how many times the cache has been invalidated """
+    value = models.PositiveIntegerField(default=0)
@@ -0,0 +1,206 @@
+"""
+The default pagination uses page numbers, which the database implements with an
+OFFSET - this means it has to step over every event before the page it returns,
+so crawling the whole catalogue page by page gets slower the further you go.
+
+Adding `?cursor=` to the event list switches to keyset (or "cursor")
+pagination - each page is fetched by filtering on the sort key and id of the
+last event on the previous page, so every page costs the same no matter how
+deep it is. The cursors in the `next` and `previous` links are opaque, and tied
+to the ordering they were issued for.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils import six
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePaginationSerializer
+from rest_framework.templatetags.rest_framework import replace_query_param
+
+
+class CursorPage(object):
+    """
+    Looks enough like a django Page to be given to a pagination serializer -
+    rather than page numbers it knows the cursors either side of itself.
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(object):
+    """
+    Pages through a queryset sorted by `ordering` (a field name as accepted by
+    `order_by`, optionally prefixed with '-'), using the primary key to break
+    ties so that every event has exactly one place in the ordering.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.ordering = ordering
+        self.descending = ordering.startswith('-')
+        self.field = ordering.lstrip('-')
+        self.page_size = page_size
+        self.queryset = queryset
+
+    def _order_by(self, backwards):
+        descending = self.descending != backwards
+        prefix = '-' if descending else ''
+        if self.field == 'id':
+            return prefix + 'id',
+        return prefix + self.field, prefix + 'id'
+
+    def _beyond(self, value, pk, backwards):
+        """ Everything after (or before) the event at `value`, `pk` """
+        op = 'lt' if self.descending != backwards else 'gt'
+        if self.field == 'id':
+            return Q(**{'id__' + op: pk})
+        return (Q(**{self.field + '__' + op: value}) |
+                Q(**{self.field: value, 'id__' + op: pk}))
+
+    def _key(self, item):
+        """ The sort key and id of `item` - a model or a row from values() """
+        if isinstance(item, dict):
+            return item[self.field], item['id']
+        value = item
+        for attr in self.field.split('__'):
+            value = getattr(value, attr)
+        return value, item.pk
+
+    def encode(self, item, backwards):
+        value, pk = self._key(item)
+        token = {'o': self.ordering, 'v': value, 'id': pk}
+        if backwards:
+            token['b'] = 1
+        return base64.urlsafe_b64encode(
+            json.dumps(token).encode('utf-8')).decode('ascii')
+
+    def decode(self, cursor):
+        try:
+            token = json.loads(base64.urlsafe_b64decode(str(cursor))
+                               .decode('utf-8'))
+            value, pk, backwards = token['v'], token['id'], bool(token.get('b'))
+            ordering = token['o']
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise ParseError("Invalid cursor")
+        # Cursors come from clients, so they might hold anything - only sort
+        # keys and ids we could have issued are allowed near the database.
+        scalar = six.string_types + six.integer_types + (float, type(None))
+        if (not isinstance(pk, six.integer_types) or isinstance(pk, bool) or
+                not isinstance(value, scalar) or isinstance(value, bool)):
+            raise ParseError("Invalid cursor")
+        if ordering != self.ordering:
+            raise ParseError("Cursor was issued for a different order_by")
+        return value, pk, backwards
+
+    def page(self, cursor):
+        """ Get the page following (or preceding) `cursor`, '' for the first """
+        queryset = self.queryset
+        backwards = False
+        if cursor:
+            value, pk, backwards = self.decode(cursor)
+            queryset = queryset.filter(self._beyond(value, pk, backwards))
+
+        queryset = queryset.order_by(*self._order_by(backwards))
+        items = list(queryset[:self.page_size + 1])
+        more = len(items) > self.page_size
+        items = items[:self.page_size]
+
+        if backwards:
+            items.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, bool(cursor)
+
+        next_cursor = previous_cursor = None
+        if items and has_next:
+            next_cursor = self.encode(items[-1], backwards=False)
+        if items and has_previous:
+            previous_cursor = self.encode(items[0], backwards=True)
+        return CursorPage(items, next_cursor, previous_cursor)
+
+    def pages(self):
+        """ Every page, from first to last """
+        page = self.page('')
+        yield page
+        while page.has_next():
+            page = self.page(page.next_cursor)
+            yield page
+
+
+class NextCursorField(serializers.Field):
+    """ Link to the next page of a `CursorPage` """
+    cursor_field = 'cursor'
+
+    def to_representation(self, value):
+        if not value.has_next():
+            return None
+        request = self.context.get('request')
+        url = request and request.build_absolute_uri() or ''
+        return replace_query_param(url, self.cursor_field, value.next_cursor)
+
+
+class PreviousCursorField(serializers.Field):
+    """ Link to the previous page of a `CursorPage` """
+    cursor_field = 'cursor'
+
+    def to_representation(self, value):
+        if not value.has_previous():
+            return None
+        request = self.context.get('request')
+        url = request and request.build_absolute_uri() or ''
+        return replace_query_param(url, self.cursor_field,
+                                   value.previous_cursor)
+
+
+class CursorPaginationSerializer(BasePaginationSerializer):
+    """
+    As the default PaginationSerializer, but without a count - counting is as
+    slow as the offsets we're trying to avoid.
+    """
+    next = NextCursorField(source='*')
+    previous = PreviousCursorField(source='*')
+
+
+class CursorPaginationMixin(object):
+    """
+    Adds cursor pagination to a GenericAPIView - `paginate_by_cursor` gives a
+    page that `get_pagination_serializer` knows how to render. Each object on
+    either kind of page is rendered by `get_page_serializer_class()`.
+    """
+    cursor_query_param = 'cursor'
+    cursor_pagination_serializer_class = CursorPaginationSerializer
+
+    def get_cursor(self):
+        """ The requested cursor, or None if it's not a cursor request """
+        return self.request.QUERY_PARAMS.get(self.cursor_query_param, None)
+
+    def paginate_by_cursor(self, queryset, ordering):
+        paginator = CursorPaginator(queryset, ordering, self.get_paginate_by())
+        return paginator.page(self.get_cursor())
+
+    def get_page_serializer_class(self):
+        """ The serializer for each object on a page """
+        return self.get_serializer_class()
+
+    def get_pagination_serializer(self, page):
+        if isinstance(page, CursorPage):
+            pagination_class = self.cursor_pagination_serializer_class
+        else:
+            pagination_class = self.pagination_serializer_class
+
+        class SerializerClass(pagination_class):
+            class Meta:
+                object_serializer_class = self.get_page_serializer_class()
+
+        return SerializerClass(instance=page,
+                               context=self.get_serializer_context())
@@ -0,0 +1,52 @@
+"""
+Extra parsers for the REST API - see the individual classes.
+"""
+import json
+
+import msgpack
+from django.conf import settings
+from django.utils import six
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON - one JSON value per line - lazily, so that a
+    large upload can be consumed a line at a time rather than read into memory
+    in one go. Lines which aren't valid JSON come out as None, leaving it to
+    the view to report which rows were bad without abandoning the rest.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return self.rows(stream, encoding)
+
+    @staticmethod
+    def rows(lines, encoding):
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode(encoding, 'replace')
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+class MessagePackParser(BaseParser):
+    """
+    Parses MessagePack (see `MessagePackRenderer`) - strings come out as text,
+    whether they were packed as 'raw' or 'str' values.
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as exc:  # Such as unhashable keys
+            raise ParseError('MessagePack parse error - %s' %
+                             six.text_type(exc))
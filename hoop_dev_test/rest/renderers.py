@@ -0,0 +1,71 @@
+"""
+Extra renderers for the REST API - see the individual classes.
+"""
+import json
+
+import msgpack
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(JSONRenderer):
+    """
+    Newline-delimited JSON - one compact JSON value per line. Views which
+    stream NDJSON write the lines themselves (see `EntryViewSet.export`); this
+    renders anything else they return, such as errors, as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def get_indent(self, accepted_media_type, renderer_context):
+        return None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super(NDJSONRenderer, self).render(
+            data, accepted_media_type, renderer_context) + b'\n'
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack - like JSON, but binary, so it's smaller and quicker to decode
+    (see `manage.py benchmark_formats`). Strings are packed as UTF-8 'raw'
+    values, which every MessagePack library can read; anything MessagePack
+    doesn't know about, such as dates, is converted just as it is for JSON.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=JSONEncoder().default,
+                             use_bin_type=False)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Server-sent events (text/event-stream). Views which stream events write
+    them themselves (see `EntryViewSet.stream`); this renders anything else
+    they return, such as errors, as a single 'error' event.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    @staticmethod
+    def event(data, name=None, id_=None):
+        """ One event, with `data` as JSON """
+        lines = []
+        if id_ is not None:
+            lines.append('id: {0}'.format(id_))
+        if name is not None:
+            lines.append('event: {0}'.format(name))
+        lines.append('data: ' + json.dumps(data, cls=JSONEncoder))
+        return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return self.event(data, 'error')
@@ -1,5 +1,13 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.http import urlencode
+
+from hoop_dev_test.data import names
 from hoop_dev_test.data.models import Event, Location, Category
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+from .pagination import CursorPaginator
 
 
 class NameField(serializers.CharField):
@@ -33,11 +41,11 @@ class EventSerializer(serializers.HyperlinkedModelSerializer):
 
     @staticmethod
     def _get_location(data):
-        return Location.objects.get_or_create(name=data['location'])[0]
+        return names.locations.get_or_create(data['location'])
 
     @staticmethod
     def _get_category(data):
-        return Category.objects.get_or_create(name=data['category'])[0]
+        return names.categories.get_or_create(data['category'])
 
     def create(self, data):
         name = data['name']
@@ -55,39 +63,177 @@ class EventSerializer(serializers.HyperlinkedModelSerializer):
         return instance
 
 
-class RelatedListField(serializers.ListField):
+class EventListSerializer(serializers.Field):
+    """
+    For each event in the listing we shall only show:
+        - url
+        - eventID
+        - name
+        - category
+    Other than having added the url, this is what was specified in the spec.
+
+    Lists can be long, so rather than going through EventSerializer (and then
+    throwing most of it away) this renders the rows of a `values()` query
+    directly - see `values` for what it needs. The url of every event only
+    differs by its id, so it is reversed once and the id dropped in.
+    """
+    values = ('id', 'name', 'category__name')
+
+    def __init__(self, *args, **kwargs):
+        super(EventListSerializer, self).__init__(*args, **kwargs)
+        self._url = None
+
+    def _get_url(self, pk):
+        if self._url is None:
+            url = reverse('event-detail', kwargs={'pk': 0},
+                          request=self.context.get('request', None),
+                          format=self.context.get('format', None))
+            self._url = url.rsplit('0', 1)
+        return '{0}{2}{1}'.format(self._url[0], self._url[1], pk)
+
+    def to_representation(self, event):
+        reduced = OrderedDict()
+        reduced['url'] = self._get_url(event['id'])  # For HATEOAS
+        reduced['eventID'] = event['id']
+        reduced['name'] = event['name']
+        reduced['category'] = event['category__name']
+        return reduced
+
+
+class EmbeddedEventSerializer(EventListSerializer):
+    """
+    Shows an event just as EventSerializer does, but renders a row of a
+    `values()` query as EventListSerializer does.
+    """
+    values = ('id', 'name', 'location__name', 'category__name')
+
+    def to_representation(self, event):
+        reduced = OrderedDict()
+        reduced['eventID'] = event['id']
+        reduced['url'] = self._get_url(event['id'])
+        reduced['name'] = event['name']
+        reduced['location'] = event['location__name']
+        reduced['category'] = event['category__name']
+        return reduced
+
+
+class EventChangeSerializer(serializers.Serializer):
     """
-    Another simple field - ListField does almost what I want, but isn't designed
-    for lists of relations - I couldn't easily find one that did, so I adapted
-    ListField by simply changing the list comprehension in to_representation to
-    iterate over `data.all()` rather than `data`. As this operates on a
-    relationship I renamed the parameter to be more descriptive.
+    A change from the change feed (see `hoop_dev_test.data.changes`) - its
+    token, what happened to which event, and the event as it is now.
     """
-    pass
+    token = serializers.IntegerField(source='id')
+    action = serializers.CharField()
+    eventID = serializers.IntegerField(source='event_id')
+    event = EmbeddedEventSerializer()
 
-    def to_representation(self, related):
-        return [self.child.to_representation(item) for item in related.all()]
+
+class EventBulkUpdateSerializer(serializers.Serializer):
+    """
+    What a bulk PATCH (see `EntryViewSet.bulk`) changes about every event it
+    matches - the location and/or category, by name. Event names are unique,
+    so there's no changing them in bulk.
+    """
+    location = NameField(required=False)
+    category = NameField(required=False)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError(
+                "Give a location and/or category to move the events to")
+        return data
+
+
+class MergeSerializer(serializers.Serializer):
+    """
+    Which locations or categories to merge into another (see `MergeMixin`) -
+    by name, or if 'names' is left out, those whose names only differ from
+    its name by case and spacing.
+    """
+    names = serializers.ListField(child=serializers.CharField(),
+                                  required=False)
 
 
-class LocationSerializer(serializers.HyperlinkedModelSerializer):
+class EmbeddedEventsMixin(object):
+    """
+    These used to list every one of a location's or category's events, which
+    for a big city meant building thousands of EventSerializers for a single
+    detail. Now only the first REST_EMBEDDED_EVENTS (by eventID) are shown, all
+    read in one query, and `moreEvents` links to the rest of them in the event
+    list - with a cursor (see pagination.py), so nothing needs counting.
+    """
+    events_filter = None  # The event list's filter for one of these
+
+    def to_representation(self, instance):
+        data = super(EmbeddedEventsMixin, self).to_representation(instance)
+        size = getattr(settings, 'REST_EMBEDDED_EVENTS', 20)
+        events = instance.events.values(*EmbeddedEventSerializer.values)
+        page = CursorPaginator(events, 'id', size).page('')
+
+        serializer = EmbeddedEventSerializer()
+        serializer.bind('events', self)
+        data['events'] = [serializer.to_representation(event)
+                          for event in page.object_list]
+        data['moreEvents'] = None
+        if page.has_next():
+            url = reverse('event-list',
+                          request=self.context.get('request', None),
+                          format=self.context.get('format', None))
+            data['moreEvents'] = '{0}?{1}'.format(url, urlencode([
+                (self.events_filter, instance.name),
+                ('cursor', page.next_cursor)]))
+        return data
+
+
+class LocationSerializer(EmbeddedEventsMixin,
+                         serializers.HyperlinkedModelSerializer):
     """ This is really just to make the Location endpoints nice - bonus """
+    events_filter = 'location'
 
     class Meta:
         model = Location
-        fields = ('url', 'name', 'events')
+        fields = ('url', 'name')
 
-    events = RelatedListField(child=EventSerializer(), required=False)
 
-
-class CategorySerializer(serializers.HyperlinkedModelSerializer):
+class CategorySerializer(EmbeddedEventsMixin,
+                         serializers.HyperlinkedModelSerializer):
     """ This is really just to make the Category endpoints nice - bonus """
+    events_filter = 'category'
+
+    class Meta:
+        model = Category
+        fields = ('url', 'name')
+
+
+class LocationListSerializer(serializers.HyperlinkedModelSerializer):
+    """
+    Lists of locations only show how many events each has, which the database
+    keeps count of (see `EventCountMixin`) rather than serialising them all.
+    """
+
+    class Meta:
+        model = Location
+        fields = ('url', 'name', 'numEvents')
+
+    numEvents = serializers.IntegerField(source='num_events', read_only=True)
+
+
+class CategoryListSerializer(serializers.HyperlinkedModelSerializer):
+    """ As with `LocationListSerializer`, but for categories """
 
     class Meta:
         model = Category
-        fields = ('url', 'name', 'events')
+        fields = ('url', 'name', 'numEvents')
 
-    events = RelatedListField(child=EventSerializer(), required=False)
+    numEvents = serializers.IntegerField(source='num_events', read_only=True)
 
-__all__ = ['LocationSerializer',
+__all__ = ['EventListSerializer',
+           'EmbeddedEventSerializer',
+           'EventChangeSerializer',
+           'EventBulkUpdateSerializer',
+           'MergeSerializer',
+           'LocationSerializer',
+           'LocationListSerializer',
            'CategorySerializer',
+           'CategoryListSerializer',
            'EventSerializer']
\ No newline at end of file
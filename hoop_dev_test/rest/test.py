@@ -9,12 +9,16 @@ from functools import wraps
 import json
 from abc import ABCMeta
 
-from django.test import TestCase
+from django.test import LiveServerTestCase, TestCase
+from django.test.utils import override_settings
+from django.utils.six.moves.urllib.parse import urlencode
 from django.contrib.auth.models import User
 from rest_framework.status import *
 from nose.tools import assert_equal, assert_is_none
 
+from hoop_dev_test.data import names
 from hoop_dev_test.data.models import Event, Location, Category
+from hoop_dev_test.rest import cache
 from hoop_dev_test.test_data import TestData
 
 
@@ -32,6 +36,20 @@ def assert_status(code):
     return decorator
 
 
+def clear_data():
+    """
+    Start from an empty database - the name and response caches are emptied
+    too, as rolling back a test's transaction doesn't tell them about the ids
+    that went away, or take back the cache generation.
+    """
+    for model in Event, Location, Category:
+        model.objects.all().delete()
+    names.locations.invalidate()
+    names.categories.invalidate()
+    cache.invalidate()
+    cache._cache().clear()
+
+
 class APIBase(object):
     """
     This abstract class contains the operations we want to run using our two
@@ -49,8 +67,7 @@ class APIBase(object):
         """
         cls.data = TestData()
 
-        for model in Event, Location, Category:
-            map(model.delete, model.objects.all())
+        clear_data()
 
         cls.event = cls.data.next.get_or_create()
 
@@ -103,6 +120,7 @@ class APIBase(object):
         self._assert_single(locations)
         location = locations.data["results"][0]
         assert_equal(location["name"], self.location.name)
+        assert_equal(location["numEvents"], 1)
         return locations
 
     def test_post_location(self):
@@ -129,6 +147,7 @@ class APIBase(object):
         self._assert_single(categories)
         category = categories.data["results"][0]
         assert_equal(category["name"], self.category.name)
+        assert_equal(category["numEvents"], 1)
         return categories
 
     def test_post_category(self):
@@ -150,6 +169,7 @@ class APIBase(object):
             self.category.pk))
 
 
+@override_settings(REST_CACHE_TIMEOUT=0)
 class AnonymousAPITest(APIBase, TestCase):
 
     @classmethod
@@ -283,4 +303,1573 @@ class AuthenticatedAPITest(APIBase, TestCase):
 
     @assert_status(HTTP_204_NO_CONTENT)
     def test_delete_category(self):
-        return super(AuthenticatedAPITest, self).test_delete_category()
\ No newline at end of file
+        return super(AuthenticatedAPITest, self).test_delete_category()
+
+@override_settings(REST_CACHE_TIMEOUT=0)
+class QueryCountTest(TestCase):
+    """
+    Listing events should cost the same number of queries however many events
+    end up on the page - anything else means we're looking up each event's
+    location or category separately.
+    """
+
+    def setUp(self):
+        clear_data()
+
+    def _count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.client.get(url)  # Warm up any caches
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        assert_equal(response.status_code, HTTP_200_OK)
+        return len(queries)
+
+    def _assert_constant(self, url):
+        data = TestData()
+        data.next.get_or_create()
+        single = self._count_queries(url)
+        data.create_all()
+        assert_equal(self._count_queries(url), single)
+
+    def test_post_event(self):
+        """ Once the names are cached, a write is just the INSERT """
+        User.objects.create_user(username='writer', password='writer')
+        self.client.login(username='writer', password='writer')
+        data = TestData()
+        first = data.next
+        first.get_or_create()
+        second = data.next
+        second.location, second.category = first.location, first.category
+        self.client.get('/rest/event/?' + urlencode({
+            'location': first.location, 'category': first.category}))
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/rest/event/', second.to_dict)
+        assert_equal(response.status_code, HTTP_201_CREATED)
+        assert_equal(response.data['location'], first.location)
+        sql = [query['sql'] for query in queries]
+        assert_equal(len([q for q in sql if 'INSERT INTO' in q]), 1)
+        assert_equal([q for q in sql if 'data_location' in q or
+                      'data_category' in q], [])
+
+    @override_settings(NAME_CACHE_GENERATION_TTL=0)
+    def test_renamed_elsewhere(self):
+        """ A location another process renames isn't written into events """
+        from django.db.models import F
+        from hoop_dev_test.data.models import NameGeneration
+        User.objects.create_user(username='writer', password='writer')
+        self.client.login(username='writer', password='writer')
+        data = TestData()
+        first = data.next
+        first.get_or_create()
+        assert_equal(names.locations.get_id(first.location) is None, False)
+        # No signals, so this process doesn't hear of it...
+        Location.objects.filter(name=first.location).update(name='Elsewhere')
+        # ...until the other process counts up the generation
+        NameGeneration.objects.update(value=F('value') + 1)
+        second = data.next
+        second.location = first.location
+        response = self.client.post('/rest/event/', second.to_dict)
+        assert_equal(response.status_code, HTTP_201_CREATED)
+        event = Event.objects.select_related('location').get(name=second.name)
+        assert_equal(event.location.name, first.location)
+
+    def test_api_root(self):
+        assert_equal(self._count_queries('/rest/'), 0)
+
+    def test_event_list(self):
+        self._assert_constant('/rest/event/')
+
+    def test_event_list_ordered(self):
+        self._assert_constant('/rest/event/?order_by=location')
+
+    def test_event_list_filtered(self):
+        self._assert_constant('/rest/event/?location=London')
+
+    def test_location_list(self):
+        self._assert_constant('/rest/location/')
+
+    def test_category_list(self):
+        self._assert_constant('/rest/category/')
+
+
+@override_settings(REST_CACHE_TIMEOUT=0)
+class CursorPaginationTest(TestCase):
+    """
+    Walk the event list a few events at a time using cursors, checking that we
+    see every event exactly once and in the right order, whichever way we go.
+    """
+
+    def setUp(self):
+        from hoop_dev_test.rest.views import EntryViewSet
+        clear_data()
+        TestData().create_all()
+        self.view = EntryViewSet
+        self.view.paginate_by, self.paginate_by = 3, self.view.paginate_by
+
+    def tearDown(self):
+        self.view.paginate_by = self.paginate_by
+
+    def _crawl(self, url, direction='next'):
+        ids = []
+        while url is not None:
+            response = self.client.get(url)
+            assert_equal(response.status_code, HTTP_200_OK)
+            assert_equal(len(response.data['results']) <= 3, True)
+            page = [event['eventID'] for event in response.data['results']]
+            ids = ids + page if direction == 'next' else page + ids
+            last = url
+            url = response.data[direction]
+        return ids, last
+
+    def _assert_crawl(self, order_by, *ordering):
+        expected = list(Event.objects.order_by(*ordering)
+                        .values_list('id', flat=True))
+        ids, last = self._crawl('/rest/event/?order_by={0}&cursor='.format(
+            order_by))
+        assert_equal(ids, expected)
+        # ...and back again from the last page
+        ids, _ = self._crawl(last, direction='previous')
+        assert_equal(ids, expected)
+
+    def test_default(self):
+        self._assert_crawl('', 'id')
+
+    def test_by_location(self):
+        self._assert_crawl('location', 'location__name', 'id')
+
+    def test_by_category_descending(self):
+        self._assert_crawl('-category', '-category__name', '-id')
+
+    def test_by_name(self):
+        self._assert_crawl('name', 'name', 'id')
+
+    def test_filtered(self):
+        ids, _ = self._crawl('/rest/event/?category=sports&cursor=')
+        assert_equal(ids, list(Event.objects.filter(category__name='sports')
+                               .order_by('id').values_list('id', flat=True)))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/rest/event/?cursor=rubbish')
+        assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_ill_typed_cursor(self):
+        import base64
+        for ordering, value, pk in (('id', 1, 'abc'), ('name', 'x', None),
+                                    ('name', ['x'], 1), ('name', {}, 1),
+                                    ('id', 1, True), ('id', 1, 1.5)):
+            cursor = base64.urlsafe_b64encode(json.dumps(
+                {'o': ordering, 'v': value, 'id': pk}).encode('utf-8'))
+            response = self.client.get('/rest/event/?' + urlencode({
+                'order_by': ordering, 'cursor': cursor}))
+            assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_cursor_for_other_ordering(self):
+        response = self.client.get('/rest/event/?cursor=')
+        cursor = response.data['next'].split('cursor=')[1]
+        response = self.client.get(
+            '/rest/event/?order_by=name&cursor=' + cursor)
+        assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+
+
+class BulkIngestTest(TestCase):
+    """
+    POST a batch of events to the bulk endpoint, as JSON and as NDJSON - the
+    number of queries shouldn't depend on the number of events.
+    """
+    username = 'bulk'
+    password = 'bulk'
+
+    def setUp(self):
+        clear_data()
+        User.objects.create_user(username=self.username, password=self.password)
+        self.client.login(username=self.username, password=self.password)
+
+    def _post(self, body, content_type='application/json'):
+        return self.client.post('/rest/event/bulk/', body,
+                                content_type=content_type)
+
+    def test_json(self):
+        rows = [eg.to_dict for eg in TestData.examples]
+        response = self._post(json.dumps(rows))
+        assert_equal(response.status_code, HTTP_200_OK)
+        assert_equal(response.data, {'created': len(rows), 'errors': []})
+        assert_equal(Event.objects.count(), len(rows))
+        assert_equal(Location.objects.count(), 4)
+        assert_equal(Category.objects.count(), 3)
+
+    def test_ndjson(self):
+        lines = [eg.to_json for eg in TestData.examples[:3]]
+        response = self._post('\n'.join(lines), 'application/x-ndjson')
+        assert_equal(response.data['created'], 3)
+        assert_equal(Event.objects.get(name=TestData.examples[2].name)
+                     .location.name, TestData.examples[2].location)
+
+    def test_errors(self):
+        data = TestData()
+        data.next.get_or_create()
+        lines = [data.current.to_json,           # already exists
+                 data.next.to_json,
+                 data.current.to_json,           # duplicated within the feed
+                 '{"name": "No location", "category": "sports"}',
+                 'not json']
+        response = self._post('\n'.join(lines), 'application/x-ndjson')
+        assert_equal(response.data['created'], 1)
+        assert_equal([error['row'] for error in response.data['errors']],
+                     [0, 2, 3, 4])
+
+    def test_constant_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        counts = []
+        for examples in TestData.examples[:2], TestData.examples[2:]:
+            body = json.dumps([eg.to_dict for eg in examples])
+            with CaptureQueriesContext(connection) as queries:
+                self._post(body)
+            counts.append(len(queries))
+        assert_equal(counts[0], counts[1])
+
+    def test_huge_batch(self):
+        """ Batches are kept small enough for SQLite to look them up """
+        from django.db import connection, reset_queries
+        from django.test.utils import CaptureQueriesContext
+        reset_queries()
+        rows = [{'name': 'Event {0}'.format(i), 'location': 'London',
+                 'category': 'sports'} for i in range(1000)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                '/rest/event/bulk/?batch_size=100000', json.dumps(rows),
+                content_type='application/json')
+        assert_equal(response.status_code, HTTP_200_OK)
+        assert_equal(response.data['created'], 1000)
+        lookups = [query for query in queries
+                   if 'SELECT "data_event"."name" FROM' in query['sql']]
+        assert_equal(len(lookups), 2)  # In two batches
+
+    def test_created_meanwhile(self):
+        """ Names another import creates after we look for them are used """
+        from hoop_dev_test.data import bulk
+        resolver = bulk.NameResolver(Location)
+        fetch, looked = resolver._fetch, []
+
+        def fetch_before_leeds(names):
+            if not looked:  # Another import creates Leeds just after this
+                looked.append(list(fetch(names)))
+                Location.objects.create(name='Leeds')
+                return looked[0]
+            return fetch(names)
+        resolver._fetch = fetch_before_leeds
+        resolver.resolve(['Leeds', 'York'])
+        assert_equal(resolver['Leeds'], Location.objects.get(name='Leeds').pk)
+        assert_equal(resolver['York'], Location.objects.get(name='York').pk)
+
+    def test_anonymous(self):
+        self.client.logout()
+        response = self._post(json.dumps([TestData.examples[0].to_dict]))
+        assert_equal(response.status_code, HTTP_403_FORBIDDEN)
+
+    def test_not_a_list(self):
+        response = self._post(TestData.examples[0].to_json)
+        assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+
+
+
+class ResponseCacheTest(TestCase):
+    """
+    Anonymous list requests should be answered from the cache (or with a 304)
+    without going near the database, until something is written.
+    """
+
+    def setUp(self):
+        clear_data()
+        TestData().create_all()
+        User.objects.create_user(username='cache', password='cache')
+
+    def _get(self, url, queries=None, **headers):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, **headers)
+        if queries is not None:
+            assert_equal(len(captured), queries)
+        return response
+
+    def test_cached(self):
+        for url in '/rest/event/', '/rest/location/', '/rest/category/':
+            first = self._get(url)
+            second = self._get(url, queries=0)
+            assert_equal(second.status_code, HTTP_200_OK)
+            assert_equal(second.content, first.content)
+            assert_equal(second['ETag'], first['ETag'])
+
+
+    def test_imported(self):
+        """ Events loaded from the command line aren't hidden by the cache """
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from django.utils.six import StringIO
+        first = self._get('/rest/event/')
+        handle, path = tempfile.mkstemp(suffix='.ndjson')
+        with os.fdopen(handle, 'w') as f:
+            f.write(json.dumps({'name': 'Imported', 'location': 'Leeds',
+                                'category': 'sports'}))
+        try:
+            call_command('import_events', path, stdout=StringIO())
+        finally:
+            os.remove(path)
+        response = self._get('/rest/event/', HTTP_IF_NONE_MATCH=first['ETag'])
+        assert_equal(response.status_code, HTTP_200_OK)
+        assert_equal(response.data['count'], first.data['count'] + 1)
+    def test_parameter_order(self):
+        first = self._get('/rest/event/?location=London&order_by=name')
+        self._get('/rest/event/?order_by=name&location=London', queries=0)
+        other = self._get('/rest/event/?order_by=name&location=Bristol')
+        assert_equal(first['ETag'] == other['ETag'], False)
+
+    def test_not_modified(self):
+        etag = self._get('/rest/event/')['ETag']
+        response = self._get('/rest/event/', queries=0,
+                             HTTP_IF_NONE_MATCH=etag)
+        assert_equal(response.status_code, HTTP_304_NOT_MODIFIED)
+
+    def test_invalidated_by_write(self):
+        etag = self._get('/rest/event/')['ETag']
+        self.client.login(username='cache', password='cache')
+        self.client.delete('/rest/event/{0}/'.format(
+            Event.objects.all()[0].pk))
+        self.client.logout()
+        response = self._get('/rest/event/', HTTP_IF_NONE_MATCH=etag)
+        assert_equal(response.status_code, HTTP_200_OK)
+        assert_equal(json.loads(response.content.decode('utf-8'))['count'],
+                     len(TestData.examples) - 1)
+
+    def test_headers(self):
+        first = self._get('/rest/event/')
+        second = self._get('/rest/event/', queries=0)
+        for header in 'Content-Type', 'Vary', 'Allow':
+            assert_equal(second[header], first[header])
+        assert_equal('Accept' in second['Vary'], True)
+
+    def test_host(self):
+        """ The lists link to themselves with absolute urls """
+        first = self._get('/rest/event/')
+        other = self._get('/rest/event/', HTTP_HOST='example.com')
+        assert_equal(other['ETag'] == first['ETag'], False)
+        assert_equal(b'http://example.com/' in other.content, True)
+        secure = self._get('/rest/event/', **{'wsgi.url_scheme': 'https'})
+        assert_equal(secure['ETag'] == first['ETag'], False)
+
+    @override_settings(REST_CACHE_GENERATION_TTL=0)
+    def test_invalidated_elsewhere(self):
+        """ A write made by another process reaches this one's cache """
+        from django.db.models import F
+        from hoop_dev_test.rest.models import CacheGeneration
+        etag = self._get('/rest/event/')['ETag']
+        # No signals, so this process doesn't hear of it...
+        Event.objects.filter(pk=Event.objects.all()[0].pk).update(
+            name='Renamed elsewhere')
+        self._get('/rest/event/', queries=1, HTTP_IF_NONE_MATCH=etag)
+        # ...until the other process counts up the generation
+        CacheGeneration.objects.update(value=F('value') + 1)
+        response = self._get('/rest/event/', HTTP_IF_NONE_MATCH=etag)
+        assert_equal(response.status_code, HTTP_200_OK)
+        assert_equal(b'Renamed elsewhere' in response.content, True)
+
+    def test_not_cached_when_authenticated(self):
+        self.client.login(username='cache', password='cache')
+        self._get('/rest/event/')
+        response = self._get('/rest/event/')
+        assert_equal(response.has_header('ETag'), False)
+
+
+@override_settings(REST_CACHE_TIMEOUT=0)
+class EventListTest(TestCase):
+    """
+    The event list is rendered without EventSerializer, so check that it still
+    agrees with what the event itself says.
+    """
+
+    def setUp(self):
+        clear_data()
+        TestData().create_all()
+
+    def _assert_list_matches_detail(self, url):
+        results = self.client.get(url).data['results']
+        assert_equal(len(results), len(TestData.examples))
+        for result in results:
+            assert_equal(list(result.keys()),
+                         ['url', 'eventID', 'name', 'category'])
+            event = self.client.get(result['url']).data
+            for key in result:
+                assert_equal(result[key], event[key])
+
+    def test_list(self):
+        self._assert_list_matches_detail('/rest/event/?order_by=-location')
+
+    def test_format_suffix(self):
+        self._assert_list_matches_detail('/rest/event/.json?order_by=name')
+
+
+class ExportTest(TestCase):
+    """
+    The export should contain every matching event, in order, however many
+    chunks it takes to read them.
+    """
+
+    def setUp(self):
+        from hoop_dev_test.rest.views import EntryViewSet
+        clear_data()
+        TestData().create_all()
+        self.view = EntryViewSet
+        self.view.export_chunk_size, self.chunk_size = (
+            3, self.view.export_chunk_size)
+
+    def tearDown(self):
+        self.view.export_chunk_size = self.chunk_size
+
+    @staticmethod
+    def _content(response):
+        assert_equal(response.status_code, HTTP_200_OK)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def _expected(self, *ordering, **filters):
+        return [{'eventID': event.id,
+                 'name': event.name,
+                 'location': event.location.name,
+                 'category': event.category.name}
+                for event in Event.objects.filter(**filters)
+                                          .order_by(*ordering)]
+
+    def test_ndjson(self):
+        response = self.client.get('/rest/event/export/?order_by=location')
+        assert_equal(response['Content-Type'], 'application/x-ndjson')
+        lines = self._content(response).splitlines()
+        assert_equal([json.loads(line) for line in lines],
+                     self._expected('location__name', 'id'))
+
+    def test_json(self):
+        response = self.client.get(
+            '/rest/event/export/?format=json&category=sports&order_by=-name')
+        assert_equal(json.loads(self._content(response)),
+                     self._expected('-name', '-id', category__name='sports'))
+
+    def test_empty(self):
+        response = self.client.get(
+            '/rest/event/export/?format=json&location=Nowhere')
+        assert_equal(json.loads(self._content(response)), [])
+
+
+@override_settings(REST_CACHE_TIMEOUT=0)
+class InstrumentationTest(TestCase):
+    """
+    Every response should say where its time went, and staff should be able to
+    see how each view has been doing.
+    """
+
+    def setUp(self):
+        from hoop_dev_test.rest.instrumentation import stats
+        clear_data()
+        TestData().create_all()
+        stats.reset()
+        User.objects.create_superuser(username='staff', password='staff',
+                                      email='staff@example.com')
+
+    @staticmethod
+    def _timings(response):
+        timings = {}
+        for metric in response['Server-Timing'].split(', '):
+            name, params = metric.split(';', 1)
+            timings[name] = dict(param.split('=', 1)
+                                 for param in params.split(';'))
+        return timings
+
+    def test_server_timing(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/rest/event/')
+        timings = self._timings(response)
+        assert_equal(sorted(timings), ['compress', 'db', 'serialize', 'total'])
+        assert_equal(timings['db']['desc'],
+                     '"{0} queries"'.format(len(queries)))
+        assert_equal(float(timings['total']['dur']) >=
+                     float(timings['db']['dur']), True)
+
+    def test_no_debug_cursor(self):
+        """ Queries are counted without Django keeping every one of them """
+        from django.db import connection
+        response = self.client.get('/rest/event/')
+        assert_equal(self._timings(response)['db']['desc'] != '"0 queries"',
+                     True)
+        assert_equal(connection.queries, [])
+
+    def test_stats(self):
+        self.client.get('/rest/event/')
+        self.client.get('/rest/event/?order_by=name')
+        self.client.login(username='staff', password='staff')
+        response = self.client.get('/rest/_stats/')
+        assert_equal(response.status_code, HTTP_200_OK)
+        assert_equal(list(response.data['event-list']),
+                     ['queries', 'db', 'serialize', 'compress', 'total'])
+        assert_equal(response.data['event-list']['total']['count'], 2)
+
+    def test_percentiles(self):
+        from hoop_dev_test.rest.instrumentation import Histogram
+        histogram = Histogram((1, 10))
+        assert_is_none(histogram.percentile(0.5))
+        for value in 0.5, 5, 50, 500:
+            histogram.add(value)
+        assert_equal([histogram.percentile(fraction)
+                      for fraction in (0.25, 0.5, 0.99)], [1, 10, '>10'])
+
+    def test_stats_protected(self):
+        response = self.client.get('/rest/_stats/')
+        assert_equal(response.status_code, HTTP_403_FORBIDDEN)
+
+    def test_slow_queries(self):
+        import logging
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger = logging.getLogger('hoop_dev_test.rest.slow_queries')
+        logger.addHandler(handler)
+        logger.propagate = False  # Keep them out of the test output
+        try:
+            with self.settings(REST_SLOW_QUERY_MS=None):
+                self.client.get('/rest/event/')
+            assert_equal(records, [])
+            with self.settings(REST_SLOW_QUERY_MS=0):
+                self.client.get('/rest/event/')
+        finally:
+            logger.removeHandler(handler)
+            logger.propagate = True
+        assert_equal(len(records) > 0, True)
+        assert_equal('event-list' in records[0].getMessage(), True)
+
+
+@override_settings(REST_CACHE_TIMEOUT=0)
+class SearchTest(TestCase):
+    """
+    Searching should find events by any words of their names, alongside the
+    other filters, with the best matches first.
+    """
+
+    def setUp(self):
+        clear_data()
+        TestData().create_all()
+
+    def _names(self, url):
+        response = self.client.get(url)
+        assert_equal(response.status_code, HTTP_200_OK)
+        return [event['name'] for event in response.data['results']]
+
+    def test_search(self):
+        assert_equal(sorted(self._names('/rest/event/?q=Spanish')),
+                     sorted(Event.objects.filter(name__contains='Spanish')
+                            .values_list('name', flat=True)))
+
+    def test_every_word(self):
+        assert_equal(self._names('/rest/event/?q=football+rugby'),
+                     ["Rugby & Football Afternoon"])
+
+    def test_stemmed(self):
+        assert_equal(self._names('/rest/event/?q=paint&order_by=name'),
+                     ["Advanced Portrait Painting",
+                      "Finger Painting for Two Year Olds"])
+
+    def test_filtered(self):
+        assert_equal(self._names('/rest/event/?q=painting&location=Bristol'),
+                     ["Advanced Portrait Painting"])
+
+    def test_ranked(self):
+        """ A name which is only the search term beats a longer one """
+        for name in 'Yoga', 'Yoga for the whole family':
+            Event.objects.create(name=name,
+                                 location=Location.objects.all()[0],
+                                 category=Category.objects.all()[0])
+        names = self._names('/rest/event/?q=yoga')
+        assert_equal(names[0], 'Yoga')
+        assert_equal(len(names), 3)
+
+    def test_cursor(self):
+        response = self.client.get('/rest/event/?q=spanish&cursor=')
+        assert_equal([event['eventID'] for event in response.data['results']],
+                     sorted(Event.objects.filter(name__icontains='spanish')
+                            .values_list('id', flat=True)))
+
+    def test_nothing_to_search_for(self):
+        assert_equal(self._names('/rest/event/?q=%22*%28'), [])
+
+    def test_kept_in_sync(self):
+        event = Event.objects.get(name="French for Toddlers")
+        event.name = "German for Toddlers"
+        event.save()
+        assert_equal(self._names('/rest/event/?q=french'), [])
+        assert_equal(self._names('/rest/event/?q=german'),
+                     ["German for Toddlers"])
+        event.delete()
+        assert_equal(self._names('/rest/event/?q=toddlers'), [])
+
+
+@override_settings(REST_CACHE_TIMEOUT=0)
+class FilterTest(TestCase):
+    """
+    Several names can be given for location or category, or left out with
+    '!=', and any number of them is still a single query for the page.
+    """
+
+    def setUp(self):
+        clear_data()
+        TestData().create_all()
+
+    def _ids(self, url):
+        response = self.client.get(url)
+        assert_equal(response.status_code, HTTP_200_OK)
+        return sorted(event['eventID'] for event in response.data['results'])
+
+    @staticmethod
+    def _expected(queryset):
+        return sorted(queryset.values_list('id', flat=True))
+
+    def test_several(self):
+        assert_equal(self._ids('/rest/event/?location=London'
+                               '&location=Bristol'),
+                     self._expected(Event.objects.filter(
+                         location__name__in=['London', 'Bristol'])))
+
+    def test_repeated(self):
+        assert_equal(self._ids('/rest/event/?category=sports'
+                               '&category=language'),
+                     self._expected(Event.objects.filter(
+                         category__name__in=['sports', 'language'])))
+
+    def test_excluded(self):
+        assert_equal(self._ids('/rest/event/?location=London'
+                               '&location=Bristol&category!=sports'
+                               '&category!=language'),
+                     self._expected(Event.objects.filter(
+                         location__name__in=['London', 'Bristol'])
+                         .exclude(category__name__in=['sports', 'language'])))
+
+    def test_unknown(self):
+        assert_equal(self._ids('/rest/event/?location=Nowhere'
+                               '&location=London'),
+                     self._expected(Event.objects.filter(
+                         location__name='London')))
+        assert_equal(self._ids('/rest/event/?location=Nowhere'), [])
+        assert_equal(self._ids('/rest/event/?location!=Nowhere'),
+                     self._expected(Event.objects.all()))
+
+    def test_comma(self):
+        """ Names with commas in them aren't several names """
+        location = Location.objects.create(name='Washington, DC')
+        category = Category.objects.get(name='sports')
+        Event.objects.create(name='Mall Run', location=location,
+                             category=category)
+        url = '/rest/event/?' + urlencode({'location': 'Washington, DC'})
+        assert_equal(self._ids(url), self._expected(Event.objects.filter(
+            location=location)))
+        assert_equal(self._ids(url.replace('location=', 'location!=')),
+                     self._expected(Event.objects.exclude(
+                         location=location)))
+
+    def test_single_query(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        url = ('/rest/event/?location=London&location=Bristol'
+               '&category!=sports&cursor=')
+        self.client.get(url)  # Warm up the name caches
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        assert_equal(len(queries), 1)
+
+    def test_bad_ordering(self):
+        for ordering in 'location__name', 'nonsense', '-relevance':
+            response = self.client.get('/rest/event/?order_by=' + ordering)
+            assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+        response = self.client.get('/rest/event/?q=spanish&order_by=relevance')
+        assert_equal(response.status_code, HTTP_200_OK)
+
+
+@override_settings(REST_CACHE_TIMEOUT=0)
+class FacetTest(TestCase):
+    """
+    Facets should agree with counting the events by hand - whether they come
+    from the counter columns or are counted for a filtered list - however the
+    events were written.
+    """
+
+    def setUp(self):
+        clear_data()
+        TestData().create_all()
+
+    @staticmethod
+    def _expected(name, **filters):
+        counts = {}
+        for event in Event.objects.filter(**filters).select_related(name):
+            key = getattr(event, name).name
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def _facets(self, url):
+        response = self.client.get(url)
+        assert_equal(response.status_code, HTTP_200_OK)
+        return response.data['facets']
+
+    def _assert_counted(self):
+        facets = self._facets('/rest/event/?facets=location,category')
+        assert_equal(dict(facets['location']), self._expected('location'))
+        assert_equal(dict(facets['category']), self._expected('category'))
+
+    def test_unfiltered(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            facets = self._facets('/rest/event/?facets=category')
+        assert_equal(list(facets), ['category'])
+        assert_equal([query['sql'] for query in queries
+                      if 'GROUP BY' in query['sql']], [])
+        self._assert_counted()
+
+    def test_filtered(self):
+        facets = self._facets('/rest/event/?facets=location,category'
+                              '&category!=sports')
+        assert_equal(dict(facets['location']),
+                     self._expected('location', category__name__in=[
+                         'language', 'arts and craft']))
+        assert_equal(dict(facets['category']),
+                     {'language': 3, 'arts and craft': 3})
+        assert_equal(list(facets['category'].values()), [3, 3])
+
+    def test_searched_by_relevance(self):
+        facets = self._facets('/rest/event/?q=spanish&order_by=relevance'
+                              '&facets=category')
+        assert_equal(facets, self._facets('/rest/event/?q=spanish'
+                                          '&facets=category'))
+        assert_equal(list(facets['category']), ['language'])
+
+    def test_most_first(self):
+        facets = self._facets('/rest/event/?facets=category')
+        assert_equal(list(facets['category']),
+                     ['sports', 'arts and craft', 'language'])
+
+    def test_writes_counted(self):
+        event = Event.objects.get(name="French for Toddlers")
+        event.location = Location.objects.get(name='Bristol')
+        event.save()
+        Event.objects.filter(name__contains='Football').update(
+            category=Category.objects.get(name='language'))
+        Event.objects.get(name="Archery: Ages 8-12").delete()
+        from hoop_dev_test.data import bulk
+        bulk.ingest([{'name': 'Sculpture', 'location': 'Leeds',
+                      'category': 'arts and craft'}])
+        location = Location.objects.get(name='London')
+        location.name = 'Greater London'
+        location.save()  # Mustn't overwrite its count
+        Event.objects.create(name='Big Ben Tour', location=location,
+                             category=Category.objects.get(name='sports'))
+        location.save()
+        self._assert_counted()
+
+    def test_unknown(self):
+        response = self.client.get('/rest/event/?facets=location,venue')
+        assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_unpaginated(self):
+        from hoop_dev_test.rest.views import EntryViewSet
+        paginate_by, EntryViewSet.paginate_by = EntryViewSet.paginate_by, None
+        try:
+            response = self.client.get('/rest/event/?facets=location')
+        finally:
+            EntryViewSet.paginate_by = paginate_by
+        assert_equal(len(response.data['results']), len(TestData.examples))
+        assert_equal(dict(response.data['facets']['location']),
+                     self._expected('location'))
+
+
+@override_settings(REST_CACHE_TIMEOUT=0, DATABASE_REPLICAS=['replica'])
+class ReplicaTest(TestCase):
+    """
+    Lists and details should be read from a replica, but writes - and the
+    writer's reads for a while afterwards - should go to the primary.
+
+    There is only the one test database, so the "replica" is a second alias
+    for its connection - which is enough to see where each query was sent.
+    """
+
+    def setUp(self):
+        import copy
+        from django.db import connections
+        clear_data()
+        self.event = TestData().next.get_or_create()
+        User.objects.create_user(username='replica', password='replica')
+
+        self.primary = connections['default']
+        self.replica = copy.copy(self.primary)
+        self.replica.alias, self.replica.queries = 'replica', []
+        connections.databases['replica'] = self.primary.settings_dict
+        setattr(connections._connections, 'replica', self.replica)
+
+    def tearDown(self):
+        from django.db import connections
+        delattr(connections._connections, 'replica')
+        del connections.databases['replica']
+
+    def _request(self, method, url, *args, **kwargs):
+        """ The response, and how many queries went to each database """
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(self.primary) as primary:
+            with CaptureQueriesContext(self.replica) as replica:
+                response = getattr(self.client, method)(url, *args, **kwargs)
+        return response, len(primary), len(replica)
+
+    def test_reads(self):
+        for url in ('/rest/event/', '/rest/event/{0}/'.format(self.event.pk),
+                    '/rest/location/', '/rest/category/{0}/'.format(
+                        self.event.category.pk)):
+            response, primary, replica = self._request('get', url)
+            assert_equal(response.status_code, HTTP_200_OK)
+            assert_equal(primary, 0)
+            assert_equal(replica > 0, True)
+
+    def test_writes(self):
+        self.client.login(username='replica', password='replica')
+        response, primary, replica = self._request(
+            'post', '/rest/event/', TestData.examples[1].to_dict)
+        assert_equal(response.status_code, HTTP_201_CREATED)
+        assert_equal(replica, 0)
+        assert_equal('read_primary' in response.cookies, True)
+
+        # ...and so the writer's next reads are from the primary
+        response, primary, replica = self._request('get', '/rest/event/')
+        assert_equal(response.data['count'], 2)
+        assert_equal(replica, 0)
+
+    def test_failed_write(self):
+        response = self.client.delete('/rest/event/{0}/'.format(self.event.pk))
+        assert_equal(response.status_code, HTTP_403_FORBIDDEN)
+        assert_equal('read_primary' in response.cookies, False)
+
+    def test_no_replicas(self):
+        self.client.login(username='replica', password='replica')
+        with self.settings(DATABASE_REPLICAS=[]):
+            response, primary, replica = self._request(
+                'delete', '/rest/event/{0}/'.format(self.event.pk))
+        assert_equal(response.status_code, HTTP_204_NO_CONTENT)
+        assert_equal(replica, 0)
+        assert_equal('read_primary' in response.cookies, False)
+
+
+@override_settings(REST_CACHE_TIMEOUT=0)
+class MessagePackTest(TestCase):
+    """
+    Everything should say the same in MessagePack as it does in JSON, and
+    MessagePack should be accepted wherever JSON is.
+    """
+    username = 'msgpack'
+    password = 'msgpack'
+
+    def setUp(self):
+        clear_data()
+        TestData().create_all()
+        User.objects.create_user(username=self.username, password=self.password)
+
+    @staticmethod
+    def _unpack(content):
+        import msgpack
+        return msgpack.unpackb(content, raw=False)
+
+    def _assert_same(self, url, data=None, **headers):
+        data = data or {}
+        response = self.client.get(url, data, **headers)
+        assert_equal(response.status_code, HTTP_200_OK)
+        assert_equal(response['Content-Type'], 'application/msgpack')
+        data.pop('format', None)
+        expected = self.client.get(url, data, HTTP_ACCEPT='application/json')
+        assert_equal(self._unpack(response.content),
+                     json.loads(expected.content.decode('utf-8')))
+
+    def test_format(self):
+        event = Event.objects.all()[0]
+        for url in ('/rest/event/', '/rest/event/{0}/'.format(event.pk),
+                    '/rest/location/',
+                    '/rest/category/{0}/'.format(event.category.pk)):
+            self._assert_same(url, {'format': 'msgpack', 'order_by': 'name'})
+
+    def test_accept(self):
+        self._assert_same('/rest/', HTTP_ACCEPT='application/msgpack')
+
+    def test_post(self):
+        import msgpack
+        self.client.login(username=self.username, password=self.password)
+        data = TestData.examples[0].to_dict
+        data['name'] = u'Caf\xe9 crochet'
+        response = self.client.post('/rest/event/?format=msgpack',
+                                    msgpack.packb(data),
+                                    content_type='application/msgpack')
+        assert_equal(response.status_code, HTTP_201_CREATED)
+        assert_equal(self._unpack(response.content)['name'], data['name'])
+        assert_equal(Event.objects.filter(name=data['name']).count(), 1)
+
+    def test_bad_body(self):
+        self.client.login(username=self.username, password=self.password)
+        response = self.client.post('/rest/event/', b'\xc1',
+                                    content_type='application/msgpack')
+        assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_export(self):
+        import msgpack
+        response = self.client.get('/rest/event/export/?format=msgpack')
+        assert_equal(response['Content-Type'], 'application/msgpack')
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(b''.join(response.streaming_content))
+        assert_equal([event['eventID'] for event in unpacker],
+                     list(Event.objects.order_by('id')
+                          .values_list('id', flat=True)))
+
+
+class CompressionTest(TestCase):
+    """
+    Large responses should be compressed for clients which accept it, and the
+    compressed versions of cached responses should be cached too.
+    """
+
+    def setUp(self):
+        clear_data()
+        TestData().create_all()
+        cache.invalidate()
+
+    @staticmethod
+    def _gunzip(content):
+        import zlib
+        return zlib.decompress(content, 16 + zlib.MAX_WBITS)
+
+    def test_gzip(self):
+        plain = self.client.get('/rest/event/')
+        response = self.client.get('/rest/event/', HTTP_ACCEPT_ENCODING='gzip')
+        assert_equal(response['Content-Encoding'], 'gzip')
+        assert_equal('Accept-Encoding' in response['Vary'], True)
+        assert_equal(self._gunzip(response.content), plain.content)
+        assert_equal(len(response.content) < len(plain.content), True)
+
+    def test_brotli(self):
+        from hoop_dev_test.rest import compression
+        if compression.brotli is None:
+            from nose.plugins.skip import SkipTest
+            raise SkipTest("brotli isn't installed")
+        plain = self.client.get('/rest/event/')
+        response = self.client.get('/rest/event/',
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        assert_equal(response['Content-Encoding'], 'br')
+        assert_equal(compression.brotli.decompress(response.content),
+                     plain.content)
+
+    def test_not_accepted(self):
+        for accept_encoding in ('', 'identity', 'gzip;q=0'):
+            response = self.client.get('/rest/event/',
+                                       HTTP_ACCEPT_ENCODING=accept_encoding)
+            assert_equal(response.has_header('Content-Encoding'), False)
+            assert_equal('Accept-Encoding' in response['Vary'], True)
+
+    def test_small(self):
+        event = Event.objects.all()[0]
+        response = self.client.get('/rest/event/{0}/'.format(event.pk),
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        assert_equal(response.has_header('Content-Encoding'), False)
+
+    def test_cached(self):
+        from hoop_dev_test.rest import compression
+        calls = []
+        gzip = compression.gzip
+        compression.gzip = lambda content: calls.append(1) or gzip(content)
+        try:
+            responses = [self.client.get('/rest/event/',
+                                         HTTP_ACCEPT_ENCODING='gzip')
+                         for _ in range(2)]
+        finally:
+            compression.gzip = gzip
+        assert_equal(len(calls), 1)
+        assert_equal(responses[0].content, responses[1].content)
+
+        # The ETag still works, and the 304 gives it back just as weak
+        etag = responses[0]['ETag']
+        assert_equal(etag.startswith('W/"'), True)
+        response = self.client.get('/rest/event/', HTTP_IF_NONE_MATCH=etag)
+        assert_equal(response.status_code, HTTP_304_NOT_MODIFIED)
+        assert_equal(response['ETag'], etag)
+
+    def test_html(self):
+        """ The browsable API isn't compressed - see BREACH """
+        User.objects.create_user(username='breach', password='breach')
+        self.client.login(username='breach', password='breach')
+        response = self.client.get('/rest/event/?q=csrftoken',
+                                   HTTP_ACCEPT='text/html',
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        assert_equal(response.status_code, HTTP_200_OK)
+        assert_equal(response['Content-Type'].startswith('text/html'), True)
+        assert_equal(response.has_header('Content-Encoding'), False)
+
+    def test_streamed(self):
+        plain = self.client.get('/rest/event/export/')
+        response = self.client.get('/rest/event/export/',
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        assert_equal(response['Content-Encoding'], 'gzip')
+        assert_equal(self._gunzip(b''.join(response.streaming_content)),
+                     b''.join(plain.streaming_content))
+
+
+@override_settings(REST_CACHE_TIMEOUT=0, REST_EMBEDDED_EVENTS=2)
+class EmbeddedEventsTest(TestCase):
+    """
+    Location and category details should show the first few of their events,
+    as the events themselves would, and link to the rest.
+    """
+
+    def setUp(self):
+        clear_data()
+        TestData().create_all()
+        self.category = Category.objects.get(name='sports')
+        self.url = '/rest/category/{0}/'.format(self.category.pk)
+
+    def test_first_events(self):
+        events = self.client.get(self.url).data['events']
+        assert_equal([event['eventID'] for event in events],
+                     list(self.category.events.order_by('id')
+                          .values_list('id', flat=True)[:2]))
+        for event in events:
+            assert_equal(event, self.client.get(event['url']).data)
+
+    def test_more_events(self):
+        data = self.client.get(self.url).data
+        seen = [event['eventID'] for event in data['events']]
+        response = self.client.get(data['moreEvents'])
+        assert_equal(response.status_code, HTTP_200_OK)
+        seen += [event['eventID'] for event in response.data['results']]
+        assert_equal(seen, list(self.category.events.order_by('id')
+                                .values_list('id', flat=True)))
+
+    def test_comma(self):
+        """ The link works for names with commas in them too """
+        location = Location.objects.create(name='Washington, DC')
+        for name in 'Mall Run', 'Capitol Tour', 'Smithsonian Trail':
+            Event.objects.create(name=name, location=location,
+                                 category=self.category)
+        data = self.client.get('/rest/location/{0}/'.format(
+            location.pk)).data
+        response = self.client.get(data['moreEvents'])
+        assert_equal([event['name'] for event in response.data['results']],
+                     ['Smithsonian Trail'])
+
+    def test_no_more_events(self):
+        with self.settings(REST_EMBEDDED_EVENTS=4):
+            data = self.client.get(self.url).data
+        assert_equal(len(data['events']), 4)
+        assert_is_none(data['moreEvents'])
+
+    def test_constant_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        counts = []
+        for size in 1, 3:
+            with self.settings(REST_EMBEDDED_EVENTS=size):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(self.url)
+            counts.append(len(queries))
+        assert_equal(counts[0], counts[1])
+
+
+class ChangeFeedTest(TestCase):
+    """
+    Every way of changing an event should show up in the change feed, in the
+    order it happened, and reading from a token should give only what came
+    after it.
+    """
+    username = 'changes'
+    password = 'changes'
+
+    def setUp(self):
+        from hoop_dev_test.data.models import EventChange
+        clear_data()
+        EventChange.objects.all().delete()
+        User.objects.create_user(username=self.username, password=self.password)
+        self.data = TestData()
+        self.event = self.data.next.get_or_create()
+
+    def _changes(self, since=None):
+        url = '/rest/event/changes/'
+        if since is not None:
+            url += '?since={0}'.format(since)
+        response = self.client.get(url)
+        assert_equal(response.status_code, HTTP_200_OK)
+        return response.data
+
+    @staticmethod
+    def _summary(changes):
+        return [(change['action'], change['eventID']) for change in changes]
+
+    def test_api(self):
+        self.client.login(username=self.username, password=self.password)
+        created = self.client.post('/rest/event/', self.data.next.to_dict)
+        pk = created.data['eventID']
+        self.client.put('/rest/event/{0}/'.format(self.event.pk),
+                        self.data.next.to_json,
+                        content_type='application/json')
+        self.client.delete('/rest/event/{0}/'.format(pk))
+
+        results = self._changes()['results']
+        assert_equal(self._summary(results), [
+            ('created', self.event.pk), ('created', pk),
+            ('updated', self.event.pk), ('deleted', pk)])
+        tokens = [change['token'] for change in results]
+        assert_equal(tokens, sorted(tokens))
+        assert_equal(results[2]['event'], self.client.get(
+            '/rest/event/{0}/'.format(self.event.pk)).data)
+        assert_is_none(results[1]['event'])
+
+    def test_since(self):
+        first = self._changes()
+        assert_equal(len(first['results']), 1)
+        token = first['results'][0]['token']
+        assert_equal(self._changes(token)['results'], [])
+
+        event = self.data.next.get_or_create()
+        later = self.client.get(first['next']).data
+        assert_equal(self._summary(later['results']),
+                     [('created', event.pk)])
+        assert_equal(later['next'].endswith(
+            'since={0}'.format(later['results'][0]['token'])), True)
+
+    def test_unchanged(self):
+        token = self._changes()['results'][-1]['token']
+        Event.objects.get(pk=self.event.pk).save()
+        assert_equal(self._changes(token)['results'], [])
+
+    def test_without_signals(self):
+        token = self._changes()['results'][-1]['token']
+        bulk = self.data.next
+        self.client.login(username=self.username, password=self.password)
+        self.client.post('/rest/event/bulk/', json.dumps([bulk.to_dict]),
+                         content_type='application/json')
+        Event.objects.filter(pk=self.event.pk).update(name='Renamed')
+        assert_equal(self._summary(self._changes(token)['results']), [
+            ('created', Event.objects.get(name=bulk.name).pk),
+            ('updated', self.event.pk)])
+
+    def test_renamed_location(self):
+        token = self._changes()['results'][-1]['token']
+        location = self.event.location
+        location.name = 'Elsewhere'
+        location.save()
+        results = self._changes(token)['results']
+        assert_equal(self._summary(results), [('updated', self.event.pk)])
+        assert_equal(results[0]['event']['location'], 'Elsewhere')
+
+    def test_batches(self):
+        from hoop_dev_test.rest.views import EntryViewSet
+        for _ in range(4):
+            self.data.next.get_or_create()
+        size, EntryViewSet.change_batch_size = (
+            EntryViewSet.change_batch_size, 2)
+        try:
+            batches = [self._changes()]
+            while batches[-1]['results']:
+                batches.append(self.client.get(batches[-1]['next']).data)
+        finally:
+            EntryViewSet.change_batch_size = size
+        assert_equal([len(batch['results']) for batch in batches],
+                     [2, 2, 1, 0])
+
+    def test_bad_token(self):
+        response = self.client.get('/rest/event/changes/?since=soon')
+        assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+
+
+class StreamTest(TestCase):
+    """
+    The stream should send what was missed since Last-Event-ID, then each
+    change as the broadcaster passes it on - and end once its client has
+    fallen too far behind.
+    """
+
+    def setUp(self):
+        from hoop_dev_test.data import broadcast
+        from hoop_dev_test.data.models import EventChange
+        from hoop_dev_test.rest.views import EntryViewSet
+        clear_data()
+        EventChange.objects.all().delete()
+        self.data = TestData()
+        self.event = self.data.next.get_or_create()
+        self.broadcaster = broadcast.Broadcaster(
+            broadcast.MemoryBackend(), 3, threaded=False)
+        self.previous = broadcast._broadcaster
+        broadcast._broadcaster = self.broadcaster
+        self.keepalive, EntryViewSet.stream_keepalive = (
+            EntryViewSet.stream_keepalive, 0.01)
+
+    def tearDown(self):
+        from hoop_dev_test.data import broadcast
+        from hoop_dev_test.rest.views import EntryViewSet
+        broadcast._broadcaster = self.previous
+        EntryViewSet.stream_keepalive = self.keepalive
+
+    def _stream(self, **extra):
+        response = self.client.get('/rest/event/stream/', **extra)
+        assert_equal(response.status_code, HTTP_200_OK)
+        assert_equal(response['Content-Type'], 'text/event-stream')
+        return iter(response.streaming_content)
+
+    @staticmethod
+    def _event(chunk):
+        """ (id, event name, data) """
+        fields = dict(line.split(': ', 1)
+                      for line in chunk.decode('utf-8').strip().split('\n'))
+        return int(fields['id']), fields['event'], json.loads(fields['data'])
+
+    def test_live(self):
+        stream = self._stream()
+        assert_equal(next(stream), b': keepalive\n\n')
+        event = self.data.next.get_or_create()
+        self.broadcaster.poll()
+        token, name, data = self._event(next(stream))
+        assert_equal(name, 'created')
+        assert_equal(data, {'token': token, 'action': 'created',
+                            'eventID': event.pk})
+
+    def test_last_event_id(self):
+        stream = self._stream(HTTP_LAST_EVENT_ID='0')
+        token, name, data = self._event(next(stream))
+        assert_equal((name, data['eventID']), ('created', self.event.pk))
+
+        Event.objects.filter(pk=self.event.pk).update(name='Renamed')
+        self.broadcaster.poll()
+        later, name, data = self._event(next(stream))
+        assert_equal((name, data['eventID']), ('updated', self.event.pk))
+        assert_equal(later > token, True)
+
+    def test_not_repeated(self):
+        """ Changes read from the log aren't sent again when broadcast """
+        self.broadcaster.subscribe()  # So it starts from before the stream
+        stream = self._stream(HTTP_LAST_EVENT_ID='0')
+        self._event(next(stream))
+        self.broadcaster.poll()
+        assert_equal(next(stream), b': keepalive\n\n')
+
+    def test_dropped(self):
+        stream = self._stream()
+        assert_equal(next(stream), b': keepalive\n\n')
+        for _ in range(4):
+            self.data.next.get_or_create()
+        self.broadcaster.poll()
+        assert_equal(list(stream), [])
+        assert_equal(self.broadcaster._subscriptions, set())
+
+    def test_subscribed_while_polling(self):
+        """ Subscribing between batches still gets the later batches """
+        from hoop_dev_test.data import changes
+        first = self.broadcaster.subscribe()
+        self.data.next.get_or_create()
+        self.data.next.get_or_create()
+        self.broadcaster.batch_size = 1
+        after, subscribed = changes.after, []
+
+        def subscribing_after(token, limit):
+            if len(subscribed) == 1:  # Between the first and second batch
+                subscribed.append(self.broadcaster.subscribe())
+            else:
+                subscribed.append(None)
+            return after(token, limit)
+        changes.after = subscribing_after
+        try:
+            self.broadcaster.poll()
+        finally:
+            changes.after = after
+        batch = first.get(0)
+        assert_equal(len(batch), 2)
+        assert_equal(subscribed[1].get(0), batch[1:])
+
+    def test_bad_token(self):
+        response = self.client.get('/rest/event/stream/?since=soon')
+        assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_subscription(self):
+        from hoop_dev_test.data.broadcast import Subscription
+        subscription = Subscription(2)
+        assert_equal(subscription.get(0), [])
+        subscription.put([1])
+        subscription.put([2])
+        assert_equal(subscription.get(0), [1, 2])
+        subscription.put([3, 4, 5])
+        assert_is_none(subscription.get(0))
+        subscription.put([6])
+        assert_is_none(subscription.get(0))
+
+
+class BulkChangeTest(TestCase):
+    """
+    Bulk PATCH and DELETE should change exactly the events the filters match,
+    with one statement - keeping the counts, change log and cached lists
+    right - and refuse to change everything when no filter is given.
+    """
+    username = 'bulk'
+    password = 'bulk'
+
+    def setUp(self):
+        clear_data()
+        TestData().create_all()
+        User.objects.create_user(username=self.username, password=self.password)
+        self.client.login(username=self.username, password=self.password)
+
+    def _patch(self, query, data):
+        return self.client.patch('/rest/event/bulk/?' + query,
+                                 json.dumps(data),
+                                 content_type='application/json')
+
+    def _counts(self, name):
+        response = self.client.get('/rest/{0}/'.format(name))
+        return dict((item['name'], item['numEvents'])
+                    for item in response.data['results'])
+
+    def test_update(self):
+        london = set(Event.objects.filter(location__name='London')
+                     .values_list('id', flat=True))
+        bristol = self._counts('location')['Bristol']  # Cached...
+        from django.db import connection, reset_queries
+        from django.test.utils import CaptureQueriesContext
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            response = self._patch('location=London', {'location': 'Bristol'})
+        assert_equal(response.status_code, HTTP_200_OK)
+        assert_equal(response.data, {'updated': len(london)})
+        assert_equal(len([query for query in queries
+                          if 'UPDATE "data_event"' in query['sql']]), 1)
+        assert_equal(set(Event.objects.filter(location__name='Bristol')
+                         .values_list('id', flat=True)) >= london, True)
+        counts = self._counts('location')  # ...but not any more
+        assert_equal(counts['London'], 0)
+        assert_equal(counts['Bristol'], bristol + len(london))
+
+    def test_new_names(self):
+        response = self._patch('category=sports&location!=London',
+                               {'category': 'outdoors', 'location': 'Leeds'})
+        assert_equal(response.data, {'updated': 2})
+        assert_equal(sorted(Event.objects.filter(
+            category__name='outdoors', location__name='Leeds')
+            .values_list('name', flat=True)),
+            ["Archery: Ages 8-12", "Rugby & Football Afternoon"])
+
+    def test_delete(self):
+        from hoop_dev_test.data import changes
+        token = changes.latest()
+        sports = Event.objects.filter(category__name='sports').count()
+        response = self.client.delete('/rest/event/bulk/?category=sports')
+        assert_equal(response.status_code, HTTP_200_OK)
+        assert_equal(response.data, {'deleted': sports})
+        assert_equal(Event.objects.filter(category__name='sports').count(), 0)
+        assert_equal(self._counts('category')['sports'], 0)
+        assert_equal([change.action for change in changes.since(
+            token, 100, ('id',))], ['deleted'] * sports)
+
+    def test_no_match(self):
+        response = self.client.delete(
+            '/rest/event/bulk/?location=Manchester&category=language')
+        assert_equal(response.data, {'deleted': 0})
+        response = self._patch('location=Manchester&category=language',
+                               {'location': 'Leeds'})
+        assert_equal(response.data, {'updated': 0})
+
+    def test_unfiltered(self):
+        total = Event.objects.count()
+        response = self.client.delete('/rest/event/bulk/')
+        assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+        response = self._patch('q=football', {'location': 'Leeds'})
+        assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+        assert_equal(Event.objects.count(), total)
+
+    def test_unknown_excluded(self):
+        """ Excluding nothing mustn't change everything """
+        total = Event.objects.count()
+        for query in ('location!=Nowhereville', 'location!=',
+                      'category!=sports&category!=nonsense',
+                      'location=London&location=Paris'):
+            response = self.client.delete('/rest/event/bulk/?' + query)
+            assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+            response = self._patch(query, {'location': 'Leeds'})
+            assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+        assert_equal(Event.objects.count(), total)
+        assert_equal(Event.objects.filter(location__name='Leeds').exists(),
+                     False)
+        assert_equal(Location.objects.filter(name='Leeds').exists(), False)
+
+    def test_excluded(self):
+        others = Event.objects.exclude(location__name='London').count()
+        response = self.client.delete('/rest/event/bulk/?location!=London')
+        assert_equal(response.data, {'deleted': others})
+        assert_equal(Event.objects.exclude(location__name='London').exists(),
+                     False)
+
+    def test_nothing_to_change(self):
+        response = self._patch('location=London', {})
+        assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_anonymous(self):
+        self.client.logout()
+        response = self.client.delete('/rest/event/bulk/?location=London')
+        assert_equal(response.status_code, HTTP_403_FORBIDDEN)
+        assert_equal(Event.objects.filter(location__name='London').exists(),
+                     True)
+
+
+class MergeTest(TestCase):
+    """
+    Merging should move every event of the duplicates to the one they're
+    merged into, delete them, and keep the counts and change log right -
+    whether they're named, found by their normalized names, or found by
+    `manage.py find_duplicates`.
+    """
+    username = 'merge'
+    password = 'merge'
+
+    def setUp(self):
+        clear_data()
+        TestData().create_all()
+        User.objects.create_user(username=self.username, password=self.password)
+        self.client.login(username=self.username, password=self.password)
+        self.london = Location.objects.get(name='London')
+        self.events = Event.objects.filter(location=self.london).count()
+        for i, name in enumerate(('london', ' LONDON ')):
+            Event.objects.create(
+                name='Duplicate {0}'.format(i),
+                location=Location.objects.create(name=name),
+                category=Category.objects.get(name='sports'))
+
+    def _merge(self, url, names=None):
+        data = {} if names is None else {'names': names}
+        return self.client.post(url + 'merge/', json.dumps(data),
+                                content_type='application/json')
+
+    def _url(self, obj):
+        name = type(obj).__name__.lower()
+        return '/rest/{0}/{1}/'.format(name, obj.pk)
+
+    def test_named(self):
+        from hoop_dev_test.data import changes
+        token = changes.latest()
+        response = self._merge(self._url(self.london), ['london'])
+        assert_equal(response.status_code, HTTP_200_OK)
+        assert_equal(response.data, {'merged': ['london'], 'events': 1})
+        assert_equal(Location.objects.filter(name='london').exists(), False)
+        assert_equal(Location.objects.get(pk=self.london.pk).num_events,
+                     self.events + 1)
+        assert_equal([change.action for change in changes.since(
+            token, 100, ('id',))], ['updated'])
+
+    def test_normalized(self):
+        response = self._merge(self._url(self.london))
+        assert_equal(response.data, {'merged': [' LONDON ', 'london'],
+                                     'events': 2})
+        assert_equal(Location.objects.filter(
+            normalized_name='london').count(), 1)
+        listed = self.client.get('/rest/event/?location=London').data
+        assert_equal(listed['count'], self.events + 2)
+
+    def test_category(self):
+        arts = Category.objects.get(name='arts and craft')
+        sports = Category.objects.get(name='sports')
+        count = Event.objects.filter(category=sports).count()
+        response = self._merge(self._url(arts), ['sports'])
+        assert_equal(response.data, {'merged': ['sports'], 'events': count})
+        assert_equal(Category.objects.filter(name='sports').exists(), False)
+
+    def test_unknown(self):
+        response = self._merge(self._url(self.london), ['london', 'Paris'])
+        assert_equal(response.status_code, HTTP_400_BAD_REQUEST)
+        assert_equal(Location.objects.filter(name='london').exists(), True)
+
+    def test_anonymous(self):
+        self.client.logout()
+        response = self._merge(self._url(self.london), ['london'])
+        assert_equal(response.status_code, HTTP_403_FORBIDDEN)
+
+    def test_command(self):
+        from django.core.management import call_command
+        from django.utils.six import StringIO
+        out = StringIO()
+        call_command('find_duplicates', stdout=out)
+        assert_equal(out.getvalue().splitlines()[0],
+                     "location: 'London' ({0} events), 'london' (1 events), "
+                     "' LONDON ' (1 events)".format(self.events))
+        assert_equal(Location.objects.filter(
+            normalized_name='london').count(), 3)
+
+        call_command('find_duplicates', merge=True, stdout=StringIO())
+        assert_equal(list(Location.objects.filter(
+            normalized_name='london').values_list('name', flat=True)),
+            ['London'])
+        assert_equal(Event.objects.filter(location=self.london).count(),
+                     self.events + 2)
+
+
+@override_settings(REST_CACHE_TIMEOUT=0)
+class BenchmarkTest(TestCase):
+    """
+    The benchmark's query counts should be those of the request it measures,
+    whatever the requests it times afterwards leave in connection.queries.
+    """
+
+    def setUp(self):
+        clear_data()
+        TestData().create_all()
+
+    def test_query_counts(self):
+        from django.db import connection
+        from django.test import Client
+        from django.test.utils import CaptureQueriesContext
+        from hoop_dev_test.management.commands.benchmark import Command
+        command = Command()
+        command.client = Client()
+        url = '/rest/event/?location=London'
+        command.request(url)  # Warm up the name caches
+        with CaptureQueriesContext(connection) as queries:
+            command.request(url)
+        with self.settings(DEBUG=True):  # As when it's run locally
+            counts = [command.measure(url, 1)['queries'] for _ in range(2)]
+        assert_equal(counts, [len(queries)] * 2)
+
+
+class LoadTestTest(LiveServerTestCase):
+    """
+    The load test should report its clients' requests against a real server.
+    (The test server answers one request at a time, so slow clients would
+    only hold it up - and break their pipes when they give up.)
+    """
+
+    def setUp(self):
+        clear_data()
+        TestData().create_all()
+
+    def test_command(self):
+        from django.core.management import call_command
+        from django.utils.six import StringIO
+        out = StringIO()
+        call_command('loadtest', self.live_server_url, clients=2,
+                     slow_clients=0, duration=0.5,
+                     timeout=5, paths='/rest/event/,/rest/location/',
+                     stdout=out)
+        results = json.loads(out.getvalue())
+        assert_equal(results['requests'] > 0, True)
+        assert_equal(results['errors'], 0)
+        assert_equal((results['clients'], results['slow_clients']), (2, 0))
+
+    def test_bad_url(self):
+        from django.core.management import call_command, CommandError
+        for args in (), ('ftp://localhost',), ('http://',):
+            try:
+                call_command('loadtest', *args)
+            except CommandError:
+                pass
+            else:
+                raise AssertionError("{0} should be refused".format(args))
@@ -16,5 +16,6 @@ router.register('location', views.LocationViewSet)
 
 urlpatterns = [
     url(r'^$', views.api_root),
+    url(r'^_stats/$', views.stats, name='stats'),
     url(r'^', include(router.urls))
 ]
\ No newline at end of file
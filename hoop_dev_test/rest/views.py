@@ -1,37 +1,53 @@
 """
 For the most part these are standard ViewSets, but with some added control over
-the display formatting. There could be some merit in the future to adding xml
-support etc - for now JSON will do.
+the display formatting. As well as JSON, everything can be had as MessagePack
+with '?format=msgpack' (or by accepting 'application/msgpack'), which is
+smaller and quicker for our batch consumers to decode - see renderers.py.
+
+The lists are cached for anonymous users, who make up most of our traffic - see
+cache.py for how this works. Lists and details are read from replicas of the
+database, if there are any - see `ReplicaReadMixin`.
 """
 from collections import OrderedDict
-
-from rest_framework import permissions
-from rest_framework.decorators import api_view
+from types import GeneratorType
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import sql
+from django.db.models.sql.constants import CURSOR
+from django.http import StreamingHttpResponse
+
+from rest_framework import permissions, serializers
+from rest_framework.decorators import (api_view, detail_route, list_route,
+                                       permission_classes)
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
 from rest_framework.reverse import reverse
 from rest_framework.response import Response
+from rest_framework.templatetags.rest_framework import replace_query_param
 from rest_framework import viewsets
 
+from hoop_dev_test.data import (broadcast, bulk, counts, duplicates, names,
+                                routers, search)
+from hoop_dev_test.data import changes as change_log
 from hoop_dev_test.data.models import Event, Location, Category
+from .cache import cache_response, invalidate as invalidate_cache
+from .instrumentation import stats as request_stats
+from .pagination import CursorPaginationMixin, CursorPaginator
+from .parsers import MessagePackParser, NDJSONParser
+from .renderers import (EventStreamRenderer, MessagePackRenderer,
+                        NDJSONRenderer)
 from .serializers import *
 
 
-def ensure_data():
-    """
-    A bit of a cheat - before we list any sort of data, make sure we've added
-    the example events.
-    """
-    if Event.objects.count() == 0:
-        from hoop_dev_test.test_data import TestData
-        TestData().create_all()
-
-
 @api_view(('GET',))
 def api_root(request, format_=None):
     """
     This is the root of our API, the main part of this lies under `event`, but
     `location` and `category` are provided for convenience.
     """
-    ensure_data()
     return Response({
         'events': reverse('event-list', request=request, format=format_),
         'locations': reverse('location-list', request=request, format=format_),
@@ -39,7 +55,49 @@ def api_root(request, format_=None):
     })
 
 
-class EntryViewSet(viewsets.ModelViewSet):
+@api_view(('GET',))
+@permission_classes((permissions.IsAdminUser,))
+def stats(request, format_=None):
+    """
+    How long each view has been taking in this process - histograms of the
+    number of queries, and of the time spent in the database, serializing and
+    overall (in milliseconds). See `instrumentation.py`.
+    """
+    return Response(request_stats.to_dict)
+
+
+class ReplicaReadMixin(object):
+    """
+    Read lists and details from the database replicas (see
+    `hoop_dev_test.data.routers`) rather than the primary.
+
+    So that clients see their own writes, even if the replicas haven't caught
+    up yet, any successful write sets a cookie which sends that client's reads
+    to the primary for the next DATABASE_REPLICA_LAG seconds.
+    """
+    replica_actions = ('list', 'retrieve')
+    sticky_cookie = 'read_primary'
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get(request.method.lower(), None)
+        if (action in self.replica_actions and
+                self.sticky_cookie not in request.COOKIES):
+            with routers.replica_reads():
+                return super(ReplicaReadMixin, self).dispatch(
+                    request, *args, **kwargs)
+
+        response = super(ReplicaReadMixin, self).dispatch(
+            request, *args, **kwargs)
+        if (request.method not in SAFE_METHODS and
+                response.status_code < 400 and routers.replicas()):
+            lag = getattr(settings, 'DATABASE_REPLICA_LAG', 10)
+            response.set_cookie(self.sticky_cookie, '1', max_age=lag,
+                                httponly=True)
+        return response
+
+
+class EntryViewSet(ReplicaReadMixin, CursorPaginationMixin,
+                   viewsets.ModelViewSet):
     """
     A ViewSet of our Entry objects - the spec called for some customisation of
     the list display, to only show the id, name and category. I have disobeyed
@@ -57,119 +115,536 @@ class EntryViewSet(viewsets.ModelViewSet):
     [?order_by=category&location=London](/rest/event/?order_by=category&location=London)
 
     [?location=London&category=arts%20and%20craft](/rest/event/?location=London&category=arts%20and%20craft)
+
+    Several locations or categories can be given at once by repeating them,
+    and any can be left out using '!=' rather than '='. (They aren't split on
+    commas, since names can have commas in them - "Washington, DC", say.)
+
+    [?location=London&location=Bristol&category!=sports](/rest/event/?location=London&location=Bristol&category!=sports)
+
+    Every event is rendered with the names of its location and category, so
+    these are joined in the same query rather than being fetched row by row.
+
+    Adding an empty cursor switches to cursor pagination, which is much cheaper
+    for walking through every page - see `pagination.py`.
+
+    [?order_by=location&cursor=](/rest/event/?order_by=location&cursor=)
+
+    Location and category names are looked up in an in-process cache (see
+    `hoop_dev_test.data.names`) so that filtering is a plain comparison of ids
+    (or an IN / NOT IN of them).
+
+    Event names can be searched with 'q' - every word has to appear in the
+    name. Unless another order is asked for, the best matches come first.
+
+    [?q=spanish&location=Bristol](/rest/event/?q=spanish&location=Bristol)
+
+    How many of the events there are in each location and/or category can be
+    included with 'facets'.
+
+    [?facets=location,category&q=painting](/rest/event/?facets=location,category&q=painting)
+
+    The whole catalogue - or any filtered, sorted part of it - can be
+    downloaded in one go from [export/](/rest/event/export/).
+
+    Large numbers of events can be POSTed to [bulk/](/rest/event/bulk/), as
+    either a JSON list or newline-delimited JSON (application/x-ndjson). It
+    also takes the list's location and category filters to move (PATCH) or
+    delete (DELETE) every matching event at once.
+
+    Every change to an event is logged, and [changes/](/rest/event/changes/)
+    gives the changes since a token - so a copy of the catalogue can be kept
+    up to date without reading all of it again. Rather than polling for them,
+    changes can be streamed as they happen from [stream/](/rest/event/stream/).
     """
-    queryset = Event.objects.all()
+    queryset = Event.objects.select_related('location', 'category')
+    orderings = ('id', 'name', 'location', 'category')
     serializer_class = EventSerializer
     permission_classes = permissions.IsAuthenticatedOrReadOnly,
+    export_chunk_size = 1000
+    change_batch_size = 500
+    stream_keepalive = 15  # Seconds
 
+    @cache_response
     def list(self, request, *args, **kwargs):
         """
         This has had some method calls added to change the list representation -
-        please see the individual methods for a description.
+        please see the individual methods, and `EventListSerializer`, for a
+        description.
+        """
+        ranked = self.get_cursor() is None  # Cursors need a real field
+        ordering = self.ordering(request, ranked)
+        facets = self.facets(request)
+        values = EventListSerializer.values + (ordering.lstrip('-'),)
+        instance = self.filtered_queryset(request, ranked).values(*values)
+        if self.get_cursor() is None:
+            page = self.paginate_queryset(instance)
+        else:
+            page = self.paginate_by_cursor(instance, ordering)
+        if page is not None:
+            serializer = self.get_pagination_serializer(page)
+        else:
+            serializer = serializers.ListSerializer(
+                instance, child=EventListSerializer(),
+                context=self.get_serializer_context())
+
+        data = serializer.data
+        if facets:
+            if not isinstance(data, dict):
+                data = OrderedDict([('results', data)])
+            data['facets'] = counts.facets(
+                self.filtered_queryset(request, ordered=False), facets,
+                self.unfiltered(request))
+        return Response(data)
+
+    def filtered_queryset(self, request, ranked=False, ordered=True):
+        """
+        The events the list would show, in the order it would show them (unless
+        they needn't be `ordered`, as for counting them) - please see the
+        individual methods for a description.
         """
-        ensure_data()
         queryset = self.get_queryset()
 
-        queryset = self.order(request, queryset)
+        queryset = self.search(request, queryset, ranked)
+        if ordered:
+            queryset = self.order(request, queryset, ranked)
         queryset = self.location(request, queryset)
         queryset = self.category(request, queryset)
 
-        instance = self.filter_queryset(queryset)
-        page = self.paginate_queryset(instance)
-        if page is not None:
-            serializer = self.get_pagination_serializer(page)
-        else:
-            serializer = self.get_serializer(instance, many=True)
+        return self.filter_queryset(queryset)
 
-        results = serializer.data['results']
+    @staticmethod
+    def facets(request):
+        """ Which of the facets in `counts.FACETS` 'facets' asks for """
+        facets = [facet for value in request.QUERY_PARAMS.getlist('facets')
+                  for facet in value.split(',') if facet]
+        unknown = set(facets).difference(counts.FACETS)
+        if unknown:
+            raise ParseError("There are no '{0}' facets - try {1}".format(
+                "', '".join(sorted(unknown)), ', '.join(counts.FACETS)))
+        return [facet for facet in counts.FACETS if facet in facets]
 
-        for result in results:
-            self.reduce_result(result)
+    @staticmethod
+    def unfiltered(request):
+        """ Whether the list is of every event """
+        return not any(request.QUERY_PARAMS.get(key, None) is not None
+                       for key in ('q', 'location', 'location!', 'category',
+                                   'category!'))
+
+    def get_page_serializer_class(self):
+        if self.action == 'list':
+            return EventListSerializer
+        return super(EntryViewSet, self).get_page_serializer_class()
+
+    @list_route(renderer_classes=(NDJSONRenderer, JSONRenderer,
+                                  MessagePackRenderer))
+    def export(self, request, *args, **kwargs):
+        """
+        Stream every event matching the list's filters, in the list's order -
+        as NDJSON by default, or a JSON list with '?format=json', or one
+        MessagePack map after another with '?format=msgpack'. The events
+        are read a chunk at a time using the cursor paginator, so memory use
+        doesn't grow with the size of the catalogue.
+        """
+        ordering = self.ordering(request)
+        values = ('id', 'name', 'location__name', 'category__name',
+                  ordering.lstrip('-'))
+        queryset = self.filtered_queryset(request).values(*values)
+        paginator = CursorPaginator(queryset, ordering, self.export_chunk_size)
+        renderer = request.accepted_renderer
+
+        def rendered():
+            for page in paginator.pages():
+                for event in page.object_list:
+                    yield renderer.render(OrderedDict([
+                        ('eventID', event['id']),
+                        ('name', event['name']),
+                        ('location', event['location__name']),
+                        ('category', event['category__name'])]))
+
+        if isinstance(renderer, (NDJSONRenderer, MessagePackRenderer)):
+            content = rendered()
+        else:
+            content = self.json_list(rendered())
+        return StreamingHttpResponse(content,
+                                     content_type=request.accepted_media_type)
 
-        return Response(serializer.data)
+    @staticmethod
+    def json_list(items):
+        """ Join already rendered JSON values into a JSON list, lazily """
+        yield b'['
+        for i, item in enumerate(items):
+            yield item if i == 0 else b',' + item
+        yield b']'
+
+    @list_route(methods=['post', 'patch', 'delete'],
+                parser_classes=(JSONParser, NDJSONParser, MessagePackParser))
+    def bulk(self, request, *args, **kwargs):
+        """
+        POST creates many events at once - see `hoop_dev_test.data.bulk`. The
+        batch size can be set with '?batch_size=' (up to 900), and the
+        response says how many events were created along with any rows which
+        couldn't be.
+
+        PATCH and DELETE change every event matching the 'location' and
+        'category' filters, just as the list takes them - PATCH moves them
+        to the location and/or category it's given, as in
+        {"location": "Bristol"}, and DELETE deletes them. Either is a single
+        UPDATE or DELETE statement, and the response says how many events it
+        changed.
+
+        [?location=london](/rest/event/bulk/?location=london)
+        """
+        if request.method == 'PATCH':
+            return self.bulk_update(request)
+        elif request.method == 'DELETE':
+            return self.bulk_delete(request)
+
+        rows = request.data
+        if not isinstance(rows, (list, GeneratorType)):
+            raise ParseError("Expected a list of events")
+        batch_size = request.QUERY_PARAMS.get('batch_size', '')
+        if not batch_size:
+            batch_size = bulk.DEFAULT_BATCH_SIZE
+        elif batch_size.isdigit() and int(batch_size) > 0:
+            batch_size = int(batch_size)
+        else:
+            raise ParseError("batch_size must be a positive number")
+        result = bulk.ingest(rows, batch_size)
+        return Response(result.to_dict)
+
+    def bulk_update(self, request):
+        serializer = EventBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        # The filters are checked before anything is created, so that a
+        # refused request doesn't leave a new location or category behind.
+        matching = self.matching(request)
+        with transaction.atomic():
+            update = {}
+            if 'location' in data:
+                update['location'] = names.locations.get_or_create(
+                    data['location'])
+            if 'category' in data:
+                update['category'] = names.categories.get_or_create(
+                    data['category'])
+            updated = matching.update(**update)
+        invalidate_cache()
+        broadcast.notify()
+        return Response({'updated': updated})
+
+    def bulk_delete(self, request):
+        with transaction.atomic():
+            deleted = self.delete_all(self.matching(request))
+        invalidate_cache()
+        broadcast.notify()
+        return Response({'deleted': deleted})
+
+    @classmethod
+    def matching(cls, request):
+        """
+        The events which the location and category filters match, for
+        changing in bulk - at least one has to be given, and every name in
+        them has to exist, so that nothing changes every event by accident.
+        Nothing is joined, so the whole lot can be updated or deleted with one
+        statement, sending no signals: the database's triggers keep the counts
+        and change log up to date.
+        """
+        queryset = Event.objects.all()
+        queryset = cls.location(request, queryset, strict=True)
+        queryset = cls.category(request, queryset, strict=True)
+        if not queryset.query.where:
+            raise ParseError("Say which events to change with 'location' "
+                             "and/or 'category'")
+        return queryset
 
     @staticmethod
-    def reduce_result(result):
-        """
-        For each event in the listing we shall only show:
-            - url
-            - eventID
-            - name
-            - category
-        Other than having added the url, this is what was specified in the spec.
-        """
-        reduced = OrderedDict()
-        reduced['url'] = result.pop('url')  # For HATEOAS
-        reduced['eventID'] = result.pop('eventID')
-        reduced['name'] = result.pop('name')
-        reduced['category'] = result.pop('category')
-        result.clear()
-        result.update(reduced)
+    def delete_all(queryset):
+        """
+        Delete `queryset` with a single DELETE, returning how many rows it
+        deleted - unlike QuerySet.delete(), which loads every object to send
+        signals and cascade. Its filters mustn't need any joins.
+        """
+        query = sql.DeleteQuery(queryset.model)
+        query.get_initial_alias()
+        query.where = queryset.query.where
+        cursor = query.get_compiler(queryset.db).execute_sql(CURSOR)
+        if cursor is None:  # The filters can't match anything
+            return 0
+        try:
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    @list_route()
+    def changes(self, request, *args, **kwargs):
+        """
+        What has happened to events since the token given with '?since=' (0,
+        or leaving it out, starts from the beginning) - oldest first, and at
+        most `change_batch_size` at a time. Each change has its token, what
+        happened to which event, and the event as it is now (null if it has
+        since been deleted). `next` asks for the changes after these; once
+        there are none, it asks for the same ones again, ready for polling.
+        """
+        since = request.QUERY_PARAMS.get('since', '') or '0'
+        if not since.isdigit():
+            raise ParseError("since must be a token from the change feed")
+        batch = change_log.since(int(since), self.change_batch_size,
+                                 EmbeddedEventSerializer.values)
+        if batch:
+            since = batch[-1].id
+        return Response(OrderedDict([
+            ('next', replace_query_param(request.build_absolute_uri(),
+                                         'since', since)),
+            ('results', EventChangeSerializer(
+                batch, many=True, context=self.get_serializer_context()).data),
+        ]))
+
+    @list_route(renderer_classes=(EventStreamRenderer,))
+    def stream(self, request, *args, **kwargs):
+        """
+        Changes to events as they happen, as server-sent events - each named
+        after what happened, with the token, action and eventID that
+        [changes/](/rest/event/changes/) would give, and the token as its id.
+        Connecting with a Last-Event-ID header (as EventSource does when it
+        reconnects) or '?since=' a token first sends whatever was missed.
+
+        Anyone who falls too far behind is disconnected rather than have
+        changes pile up for them (see `hoop_dev_test.data.broadcast`) - they
+        can reconnect to catch up.
+        """
+        since = (request.META.get('HTTP_LAST_EVENT_ID', '') or
+                 request.QUERY_PARAMS.get('since', ''))
+        if since and not since.isdigit():
+            raise ParseError("since must be a token from the change feed")
+        broadcaster = broadcast.broadcaster()
+        subscription = broadcaster.subscribe()
+        if not since:
+            since = change_log.latest()
+        response = StreamingHttpResponse(
+            self.events(broadcaster, subscription, int(since)),
+            content_type=EventStreamRenderer.media_type)
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def events(self, broadcaster, subscription, token):
+        """ The server-sent events for `subscription`, after `token` """
+        try:
+            while True:  # Catch up from the log
+                batch = change_log.after(token, self.change_batch_size)
+                if not batch:
+                    break
+                for change in batch:
+                    yield self.event(change)
+                token = batch[-1][0]
+            connection.close()  # Rather than keep it while we wait
+
+            while True:
+                batch = subscription.get(self.stream_keepalive)
+                if batch is None:  # Dropped
+                    return
+                if not batch:
+                    yield b': keepalive\n\n'
+                for change in batch:
+                    if change[0] > token:  # Not already sent from the log
+                        yield self.event(change)
+                        token = change[0]
+        finally:
+            broadcaster.unsubscribe(subscription)
 
     @staticmethod
-    def order(request, query_set):
-        """ Allow events to be ordered by location or category """
+    def event(change):
+        token, action, event_id = change
+        return EventStreamRenderer.event(OrderedDict([
+            ('token', token), ('action', action), ('eventID', event_id)]),
+            action, token)
+
+    @classmethod
+    def ordering(cls, request, ranked=False):
+        """
+        The field named by 'order_by', defaulting to the primary key - or, if
+        the results of a search are to be `ranked`, to their relevance.
+        """
+        searching = ranked and request.QUERY_PARAMS.get('q', None)
         by = request.QUERY_PARAMS.get('order_by', None)
-        if by is None:
-            return query_set
-        if by in {'location', 'category'}:  # Use the location/category name
-            by += '__name'                  # as opposed to its primary key...
-        return query_set.order_by(by)
+        if not by:
+            by = '-' + search.RELEVANCE if searching else 'id'
+        prefix = '-' if by.startswith('-') else ''
+        field = by[len(prefix):]
+        if field == search.RELEVANCE and not searching:
+            raise ParseError("Only searches (with 'q', and without a cursor) "
+                             "can be ordered by relevance")
+        elif field != search.RELEVANCE and field not in cls.orderings:
+            raise ParseError("Can't order by '{0}' - try one of {1}".format(
+                field, ', '.join(cls.orderings + (search.RELEVANCE,))))
+        if field in {'location', 'category'}:  # Use the location/category name
+            field += '__name'                  # as opposed to its primary key
+        return prefix + field
+
+    @classmethod
+    def order(cls, request, query_set, ranked=False):
+        """
+        Allow events to be ordered by location or category - ties are broken by
+        the primary key, so that the order is the same from one page to the
+        next.
+        """
+        by = cls.ordering(request, ranked)
+        prefix = '-' if by.startswith('-') else ''
+        if by == prefix + 'id':
+            return query_set.order_by(by)
+        return query_set.order_by(by, prefix + 'id')
 
     @staticmethod
-    def location(request, query_set):
-        """ Filter for a location """
-        location = request.QUERY_PARAMS.get('location', None)
-        if location is None:
+    def search(request, query_set, ranked=False):
+        """
+        Search event names, using the full-text index - see
+        `hoop_dev_test.data.search`. Matches are only given a relevance to
+        order them by if they are to be `ranked`.
+        """
+        query = request.QUERY_PARAMS.get('q', None)
+        if not query:
             return query_set
-        return query_set.filter(location__name=location)
+        return search.search(query_set, query, ranked)
 
-    @staticmethod
-    def category(request, query_set):
-        """ Filter for a category """
-        category = request.QUERY_PARAMS.get('category', None)
-        if category is None:
-            return query_set
-        return query_set.filter(category__name=category)
+    @classmethod
+    def location(cls, request, query_set, strict=False):
+        """ Filter for (or against) locations """
+        return cls.filter_names(request, query_set, 'location',
+                                names.locations, strict)
 
+    @classmethod
+    def category(cls, request, query_set, strict=False):
+        """ Filter for (or against) categories """
+        return cls.filter_names(request, query_set, 'category',
+                                names.categories, strict)
 
-def collapse_events_in_list(self):
+    @staticmethod
+    def given_names(request, key):
+        """
+        Every name given for `key`, by repeating it - or None if it wasn't
+        given at all. I don't split them on commas, which names can contain.
+        """
+        if key not in request.QUERY_PARAMS:
+            return None
+        return [name for name in request.QUERY_PARAMS.getlist(key) if name]
+
+    @staticmethod
+    def name_ids(names, key, cache, strict=False):
+        """
+        The ids of those of `names` which exist - if `strict`, there have to
+        be some names, and all of them have to exist.
+        """
+        ids = cache.get_ids(names)
+        if strict:
+            unknown = sorted(set(names).difference(ids))
+            if not names:
+                raise ParseError("'{0}' needs a name".format(key))
+            elif unknown:
+                raise ParseError("'{0}' names nothing called '{1}'".format(
+                    key, "', '".join(unknown)))
+        return list(ids.values())
+
+    @classmethod
+    def filter_names(cls, request, query_set, field, cache, strict=False):
+        """
+        Keep only events whose `field` is one of those named by '`field`=', and
+        drop any named by '`field`!=' - the names are turned into ids using
+        `cache`, so this is a single IN / NOT IN on the foreign key. Names
+        which don't exist are ignored, unless `strict`.
+        """
+        included = cls.given_names(request, field)
+        if included is not None:
+            ids = cls.name_ids(included, field, cache, strict)
+            if not ids:
+                return query_set.none()
+            elif len(ids) == 1:
+                query_set = query_set.filter(**{field + '_id': ids[0]})
+            else:
+                query_set = query_set.filter(**{field + '_id__in': ids})
+
+        excluded = cls.given_names(request, field + '!')
+        if excluded or (excluded is not None and strict):
+            ids = cls.name_ids(excluded, field + '!', cache, strict)
+            if ids:
+                query_set = query_set.exclude(**{field + '_id__in': ids})
+        return query_set
+
+
+class EventCountMixin(object):
     """
     A bit of fun - there was a lot on category/location lists, so replace the
     list of events with simply a count of how many there are.
+
+    The database keeps count of each one's events (see
+    `hoop_dev_test.data.counts`), so the events themselves are never loaded -
+    `list_serializer_class` is used to render the result.
     """
-    ensure_data()
-    instance = self.filter_queryset(self.get_queryset())
-    page = self.paginate_queryset(instance)
-    if page is not None:
-        serializer = self.get_pagination_serializer(page)
-    else:
-        serializer = self.get_serializer(instance, many=True)
+    list_serializer_class = None
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return self.list_serializer_class
+        return super(EventCountMixin, self).get_serializer_class()
 
-    results = serializer.data['results']
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super(EventCountMixin, self).list(request, *args, **kwargs)
 
-    for result in results:
-        events = result.pop('events')
-        result['numEvents'] = len(events)
 
-    return Response(serializer.data)
+class MergeMixin(object):
+    """
+    Correcting mis-entered names - a location or category can have others
+    merged into it, giving it all of their events. `manage.py
+    find_duplicates` finds likely candidates.
+    """
 
+    @detail_route(methods=['post'])
+    def merge(self, request, *args, **kwargs):
+        """
+        Move all the events of those named in 'names' here, then delete them
+        - or, without 'names', of any whose name is this one's with
+        different capitalisation or spacing. See
+        `hoop_dev_test.data.duplicates`.
 
-class LocationViewSet(viewsets.ModelViewSet):
+            {"names": ["london", "London "]}
+        """
+        canonical = self.get_object()
+        serializer = MergeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        model = type(canonical)
+        given = serializer.validated_data.get('names', None)
+        if given is None:
+            merged = list(model.objects.filter(
+                normalized_name=canonical.normalized_name))
+        else:
+            merged = list(model.objects.filter(name__in=given))
+            missing = set(given).difference(obj.name for obj in merged)
+            if missing:
+                raise serializers.ValidationError({'names': [
+                    "There's nothing called '{0}'".format(name)
+                    for name in sorted(missing)]})
+        merged = [obj for obj in merged if obj.pk != canonical.pk]
+        moved = duplicates.merge(canonical, merged)
+        invalidate_cache()
+        return Response(OrderedDict([
+            ('merged', sorted(obj.name for obj in merged)),
+            ('events', moved),
+        ]))
+
+
+class LocationViewSet(ReplicaReadMixin, EventCountMixin, MergeMixin,
+                      viewsets.ModelViewSet):
     """ Seeing as it's so easy, I may as well expose Locations """
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
+    list_serializer_class = LocationListSerializer
     permission_classes = permissions.IsAuthenticatedOrReadOnly,
 
-    def list(self, request, *args, **kwargs):
-        return collapse_events_in_list(self)
-
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ReplicaReadMixin, EventCountMixin, MergeMixin,
+                      viewsets.ModelViewSet):
     """ Seeing as it's so easy, I may as well expose Categories """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    list_serializer_class = CategoryListSerializer
     permission_classes = permissions.IsAuthenticatedOrReadOnly,
-
-    def list(self, request, *args, **kwargs):
-        return collapse_events_in_list(self)
\ No newline at end of file
@@ -40,6 +40,8 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'hoop_dev_test.rest.instrumentation.InstrumentationMiddleware',
+    'hoop_dev_test.rest.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -51,6 +53,14 @@ MIDDLEWARE_CLASSES = (
 
 ROOT_URLCONF = 'hoop_dev_test.urls'
 
+# Reads can be sent to replicas of the database - the profiles add any listed
+# in REPLICA_DATABASE_URLS to DATABASES and DATABASE_REPLICAS. Clients read
+# from the primary for DATABASE_REPLICA_LAG seconds after they write, so that
+# they see what they wrote. See hoop_dev_test/data/routers.py.
+DATABASE_ROUTERS = ['hoop_dev_test.data.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_LAG = 10
+
 WSGI_APPLICATION = 'hoop_dev_test.wsgi.application'
 
 # Internationalization
@@ -72,8 +82,82 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Anonymous list responses are cached (see hoop_dev_test/rest/cache.py) - each
+# process keeps its own copy in memory unless a shared cache is set up here.
+# Whether they're still current is kept in the database, which every process
+# reads at most once every REST_CACHE_GENERATION_TTL seconds - so a write made
+# by one process reaches the others' caches within that long.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+REST_CACHE_TIMEOUT = 60 * 60
+REST_CACHE_GENERATION_TTL = 1
+
+# Each process remembers locations' and categories' ids by name (see
+# hoop_dev_test/data/names.py), checking at most once every this many seconds
+# whether any have been renamed, merged or deleted since.
+NAME_CACHE_GENERATION_TTL = 1
+
+# How many of its events a location's or category's details show - the rest are
+# linked to (see hoop_dev_test/rest/serializers.py).
+REST_EMBEDDED_EVENTS = 20
+
+# Queries taking longer than this many milliseconds are logged as warnings (see
+# hoop_dev_test/rest/instrumentation.py) - None turns this off.
+REST_SLOW_QUERY_MS = 100
+
+# Responses of at least this many bytes are compressed, for clients which
+# accept it (see hoop_dev_test/rest/compression.py) - brotli is used if it's
+# installed, at a quality which is quick enough to do on every request.
+REST_COMPRESSION_MIN_SIZE = 1024
+REST_GZIP_LEVEL = 6
+REST_BROTLI_QUALITY = 5
+
+# Anyone streaming changes to events (see hoop_dev_test/data/broadcast.py) who
+# falls this many changes behind is disconnected, to catch up from the change
+# log. The broadcaster looks for changes at least every EVENT_BROADCAST_POLL
+# seconds, even when it hasn't been told of any.
+EVENT_BROADCAST_BUFFER = 1000
+EVENT_BROADCAST_POLL = 1.0
+
+# Warnings and errors from our own code (slow queries, a failed seed at start
+# up, the broadcaster losing its connection) go to stderr, where runserver and
+# heroku's logs will show them.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'level': 'WARNING',
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'hoop_dev_test': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
+
 REST_FRAMEWORK = {
 # As we get more data it will become useful to paginate
 # lists in order to reduce resource usage.
-    'PAGINATE_BY': 100
+    'PAGINATE_BY': 100,
+# MessagePack is offered alongside JSON for clients which would rather have
+# smaller responses that are quicker to decode - see hoop_dev_test/rest.
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'hoop_dev_test.rest.renderers.MessagePackRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'hoop_dev_test.rest.parsers.MessagePackParser',
+    ),
 }
\ No newline at end of file
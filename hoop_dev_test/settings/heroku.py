@@ -7,7 +7,47 @@ from base import *
 
 # Database
 # https://docs.djangoproject.com/en/1.7/ref/settings/#databases
+#
+# Connections are taken from a pool of up to DB_POOL_SIZE per process, and given
+# back after each request - the gevent workers (see hoop_dev_test/green.py)
+# give each request a connection of its own, so without a pool there would be
+# no way of limiting how many are open - a request which can't get one within
+# DB_POOL_TIMEOUT seconds fails. A DB_POOL_SIZE of 0 turns the pool off, in
+# which case connections are kept for DB_CONN_MAX_AGE seconds instead. Either
+# way, connections which have sat idle for DB_HEALTH_CHECK_AFTER seconds are
+# checked before they're used - see hoop_dev_test/data/connections.py.
 import dj_database_url
 DATABASES = {
     'default': dj_database_url.config()
-}
\ No newline at end of file
+}
+
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+DATABASES['default']['CONN_HEALTH_CHECK_AFTER'] = int(
+    os.environ.get('DB_HEALTH_CHECK_AFTER', 30))
+DATABASES['default']['POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+DATABASES['default']['POOL_TIMEOUT'] = int(
+    os.environ.get('DB_POOL_TIMEOUT', 10))
+if DATABASES['default']['POOL_SIZE']:
+    DATABASES['default']['ENGINE'] = \
+        'hoop_dev_test.data.backends.pooled_postgresql'
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(
+        os.environ.get('DB_CONN_MAX_AGE', 600))
+
+# Search event names using a GIN index - see hoop_dev_test/data/search.py
+EVENT_SEARCH_BACKEND = 'hoop_dev_test.data.search.PostgresSearch'
+
+# Wake the change broadcaster when any dyno commits a change, with LISTEN/NOTIFY
+# - see hoop_dev_test/data/broadcast.py
+EVENT_BROADCAST_BACKEND = 'hoop_dev_test.data.broadcast.PostgresBackend'
+
+# Comma-separated database URLs of replicas (followers) to read from - they're
+# connected to just as the primary is, with pools of their own.
+for i, url in enumerate(os.environ.get('REPLICA_DATABASE_URLS', '').split(',')):
+    if url.strip():
+        alias, replica = 'replica{0}'.format(i), dj_database_url.parse(url)
+        DATABASES[alias] = dict(DATABASES['default'],
+                                TEST={'MIRROR': 'default'})
+        for key in 'NAME', 'USER', 'PASSWORD', 'HOST', 'PORT':
+            DATABASES[alias][key] = replica[key]
+        DATABASE_REPLICAS.append(alias)
@@ -2,13 +2,44 @@
 Extends the base settings to use a local sqlite db
 """
 from base import *
+import dj_database_url
 
 
 # Database
 # https://docs.djangoproject.com/en/1.7/ref/settings/#databases
+# Connections are kept for DB_CONN_MAX_AGE seconds (0 closes them after every
+# request) - see hoop_dev_test/data/connections.py.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
     }
-}
\ No newline at end of file
+}
+
+# Set on every new SQLite connection - write-ahead logging lets reads carry on
+# while something is written, NORMAL is as safe as FULL with WAL (only the
+# last transactions might be lost if the machine itself crashes), and memory
+# mapping the file saves copying pages through SQLite's own cache.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+# Search event names with SQLite's FTS5 - see hoop_dev_test/data/search.py
+EVENT_SEARCH_BACKEND = 'hoop_dev_test.data.search.SQLiteSearch'
+
+# Wake the change broadcaster when this process writes - see
+# hoop_dev_test/data/broadcast.py
+EVENT_BROADCAST_BACKEND = 'hoop_dev_test.data.broadcast.MemoryBackend'
+
+# Comma-separated database URLs of replicas to read from - locally, for
+# instance, sqlite:////path/to/a/copy/of/db.sqlite3
+for i, url in enumerate(os.environ.get('REPLICA_DATABASE_URLS', '').split(',')):
+    if url.strip():
+        alias = 'replica{0}'.format(i)
+        DATABASES[alias] = dj_database_url.parse(
+            url.strip(), conn_max_age=DATABASES['default']['CONN_MAX_AGE'])
+        DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+        DATABASE_REPLICAS.append(alias)
@@ -82,5 +82,22 @@ class TestData(object):
 
     def create_all(self):
         """ Make sure all the examples are in the database """
-        for eg in self._iter:
-            eg.get_or_create()
\ No newline at end of file
+        from hoop_dev_test.data.bulk import ingest
+        ingest(eg.to_dict for eg in self._iter)
+
+
+_seeded = False
+
+
+def ensure_data():
+    """
+    A bit of a cheat - make sure we've added the example events before anyone
+    comes looking for data. This is called once at startup rather than on each
+    request, and remembers that it has done its job so that calling it again is
+    free.
+    """
+    global _seeded
+    if not _seeded:
+        if not Event.objects.exists():
+            TestData().create_all()
+        _seeded = True
@@ -3,14 +3,28 @@ WSGI config for hoop_dev_test project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
 
+The example events are seeded here, once, as the application starts - if the
+database hasn't been synced yet this is skipped (and logged), and
+`manage.py seed` can be used once it has.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/1.7/howto/deployment/wsgi/
 """
 
+import logging
 import os
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hoop_dev_test.settings.local")
 
 from django.core.wsgi import get_wsgi_application
+from django.db import DatabaseError
 from dj_static import Cling
 
-application = Cling(get_wsgi_application())
\ No newline at end of file
+application = Cling(get_wsgi_application())
+
+from hoop_dev_test.test_data import ensure_data
+try:
+    ensure_data()
+except DatabaseError:
+    logging.getLogger(__name__).exception(
+        "Couldn't seed the example events - run `manage.py seed` once the "
+        "database has been synced")